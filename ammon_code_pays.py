@@ -1,32 +1,100 @@
+import json
+import os
 from pathlib import Path
 
-import openpyxl
+from text_normalize import compact
+
+# Incrémenter si le format de la table compilée change
+CACHE_VERSION = 1
+
+# Libellés courants absents (ou écrits autrement) dans l'onglet Pays
+ALIASES = {
+    'FRANCAIS': 'FRA', 'FRANCAISE': 'FRA', 'FRANCE METROPOLITAINE': 'FRA',
+    'ANGLETERRE': 'GBR', 'GRANDE BRETAGNE': 'GBR', 'UK': 'GBR', 'ROYAUME UNI': 'GBR',
+    'ETATS UNIS': 'USA', 'ETATS UNIS D AMERIQUE': 'USA', 'USA': 'USA', 'AMERIQUE': 'USA',
+    'HOLLANDE': 'NLD', 'PAYS BAS': 'NLD',
+    'COREE DU SUD': 'KOR', 'RUSSIE': 'RUS',
+    'ALLEMAND': 'DEU', 'ALLEMANDE': 'DEU', 'BELGE': 'BEL', 'SUISSE': 'CHE',
+    'ESPAGNOL': 'ESP', 'ESPAGNOLE': 'ESP', 'ITALIEN': 'ITA', 'ITALIENNE': 'ITA',
+    'PORTUGAIS': 'PRT', 'PORTUGAISE': 'PRT', 'MAROCAIN': 'MAR', 'MAROCAINE': 'MAR',
+    'ALGERIEN': 'DZA', 'ALGERIENNE': 'DZA', 'TUNISIEN': 'TUN', 'TUNISIENNE': 'TUN',
+}
+
+# Codes ISO alpha-2 les plus fréquents sur les bulletins
+ISO_ALPHA2 = {
+    'FR': 'FRA', 'BE': 'BEL', 'CH': 'CHE', 'LU': 'LUX', 'DE': 'DEU', 'ES': 'ESP', 'IT': 'ITA',
+    'PT': 'PRT', 'GB': 'GBR', 'NL': 'NLD', 'US': 'USA', 'CA': 'CAN', 'MA': 'MAR', 'DZ': 'DZA',
+    'TN': 'TUN', 'SN': 'SEN', 'CI': 'CIV', 'CM': 'CMR', 'MC': 'MCO', 'PL': 'POL', 'RO': 'ROU',
+}
 
 
 class PaysCode:
 
-    def __init__(self, template_path=None):
+    def __init__(self, template_path=None, cache_path="./cache/pays_codes.json"):
         self.template_path = template_path
+        self.cache_path = Path(cache_path) if cache_path else None
         self.pays_codes = self._load_pays_codes()
+        self._memo = {}  # Map: {libellé brut: code} pour les appels répétés d'un lot
+
+    def _template_signature(self):
+        st = Path(self.template_path).stat()
+        return [str(Path(self.template_path).resolve()), st.st_size, st.st_mtime_ns]
 
     def _load_pays_codes(self):
-        """Charge les codes pays depuis l'onglet Pays du template"""
-        pays_map = {'FRANCE': 'FRA', 'France': 'FRA'}
+        """Charge la table compilée, ou la reconstruit depuis l'onglet Pays du template"""
+        has_template = bool(self.template_path and Path(self.template_path).exists())
+        signature = self._template_signature() if has_template else None
+
+        if self.cache_path and signature:
+            try:
+                cached = json.loads(self.cache_path.read_text(encoding='utf-8'))
+                if cached.get('version') == CACHE_VERSION and cached.get('template') == signature:
+                    return cached['codes']
+            except (OSError, ValueError):
+                pass
+
+        pays_map = self._compile(has_template)
+
+        if self.cache_path and signature:
+            try:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.cache_path.with_suffix('.tmp')
+                tmp.write_text(json.dumps({'version': CACHE_VERSION, 'template': signature, 'codes': pays_map}), encoding='utf-8')
+                os.replace(tmp, self.cache_path)
+            except OSError:
+                pass
+
+        return pays_map
+
+    def _compile(self, has_template):
+        """Construit la table {clé repliée: code} (libellés, codes ISO, alias)"""
+        pays_map = {'FRANCE': 'FRA'}
 
-        if self.template_path and Path(self.template_path).exists():
+        if has_template:
             try:
-                wb = openpyxl.load_workbook(self.template_path)
+                # Import différé : inutile quand la table compilée est à jour
+                import openpyxl
+                wb = openpyxl.load_workbook(self.template_path, read_only=True)
                 if 'Pays' in wb.sheetnames:
-                    ws_pays = wb['Pays']
-                    for row in ws_pays.iter_rows(min_row=2, values_only=True):
-                        if row[0] and row[1]:  # Code et Libellé
-                            code = str(row[0]).strip()
-                            libelle = str(row[1]).strip()
-                            pays_map[libelle] = code
-                            pays_map[libelle.upper()] = code
-            except:
+                    rows = wb['Pays'].iter_rows(values_only=True)
+                    header = [str(h or '').upper() for h in next(rows, ())]
+                    # Colonnes PAY_CNOM / PAY_CCODE (le libellé est en premier)
+                    nom_idx = header.index('PAY_CNOM') if 'PAY_CNOM' in header else 0
+                    code_idx = header.index('PAY_CCODE') if 'PAY_CCODE' in header else 1
+                    for row in rows:
+                        if len(row) > max(nom_idx, code_idx) and row[nom_idx] and row[code_idx]:
+                            code = str(row[code_idx]).strip().upper()
+                            pays_map[compact(row[nom_idx])] = code
+                            pays_map.setdefault(compact(code), code)
+                wb.close()
+            except Exception:
                 pass
 
+        codes = set(pays_map.values())
+        for alias, code in {**ISO_ALPHA2, **ALIASES}.items():
+            if code in codes or not has_template:
+                pays_map.setdefault(compact(alias), code)
+
         return pays_map
 
     def get_pays_code(self, pays_libelle):
@@ -34,13 +102,8 @@ class PaysCode:
         if not pays_libelle:
             return 'FRA'
 
-        pays_libelle = pays_libelle.strip()
-
-        if pays_libelle in self.pays_codes:
-            return self.pays_codes[pays_libelle]
-
-        for key, value in self.pays_codes.items():
-            if key.upper() == pays_libelle.upper():
-                return value
-
-        return 'FRA'  # Par défaut
+        code = self._memo.get(pays_libelle)
+        if code is None:
+            code = self.pays_codes.get(compact(pays_libelle), 'FRA')  # Par défaut
+            self._memo[pays_libelle] = code
+        return code
@@ -0,0 +1,149 @@
+"""
+Spécification déclarative des colonnes d'import Ammon (Entreprises et Personnes).
+
+Chaque colonne est décrite une seule fois ; la spécification est préparée en
+une liste d'accesseurs qui construit la ligne complète en un seul appel.
+"""
+
+import csv
+from dataclasses import dataclass
+from operator import attrgetter
+from pathlib import Path
+
+from text_normalize import to_charset
+
+# Format attendu par l'import CSV d'Ammon Campus (Excel français)
+CSV_DELIMITER = ';'
+CSV_ENCODING = 'cp1252'
+
+
+@dataclass(frozen=True)
+class Column:
+    header: str
+    source: str = None      # Chemin d'attribut, ex: 'entreprise.siret'
+    value: object = ''      # Valeur constante si pas de source
+    transform: str = None   # 'upper' ou 'pays'
+
+
+def field(header, source, transform=None):
+    return Column(header, source=source, transform=transform)
+
+
+def const(header, value=''):
+    return Column(header, value=value)
+
+
+ENTREPRISE_COLUMNS = [
+    field('cRefExt', 'entreprise.ref_ext'),
+    const('iDesactive', 0),
+    field('SOC_cRaisonSociale', 'entreprise.nom'),
+    const('SOC_cType', 'E'),
+    const('SOC_iEstSiege', -1),
+    const('SOC_cCateg', 'SGE'),
+    field('SOC_cSIRET', 'entreprise.siret'),
+    field('SOC_cNACE', 'entreprise.code_nafa'),
+    const('ADR_IESTADRCOURRIER', -1),
+    const('ADR_cAdresseNature', 'PR'),
+    field('ADR_cAdresse1', 'entreprise.adresse'),
+    const('ADR_cAdresse2'),
+    const('ADR_cAdresse3'),
+    const('ADR_cAdresse4'),
+    field('ADR_cCodePostal', 'entreprise.code_postal'),
+    field('ADR_cVille', 'entreprise.ville'),
+    field('ADR_cPays', 'entreprise.pays', 'pays'),
+    const('ADR_cSiteWeb'),
+    field('ADR_cTel', 'entreprise.telephone'),
+    field('ADR_cEmail', 'entreprise.email'),
+    const('LIE_cCode'),
+    const('LIE_cLibelle'),
+    const('LIE_cRefext'),
+    const('org_cAgrementAnimateur'),
+]
+
+# En-têtes basés sur Import_Personnes.csv
+PERSONNE_COLUMNS = [
+    field('cRefExt', 'stagiaire.ref_ext'),
+    field('SOC_cRefExt', 'entreprise.ref_ext'),           # Lien avec l'entreprise
+    const('SOC_cRefExtService'),
+    const('PER_CCODESTRUCTURE_RATTACHEMENT', 'CLIENT'),
+    const('PER_cNumeroSS'),
+    field('PER_cCivilite', 'stagiaire.civilite_ammon'),
+    field('PER_cSexe', 'stagiaire.sexe'),
+    field('PER_cNom', 'stagiaire.nom', 'upper'),
+    field('PER_cPrenom', 'stagiaire.prenom'),
+    const('PER_cNomJeun'),
+    field('PER_xDateNaiss', 'stagiaire.date_naissance'),
+    const('PER_cCommuneNaiss'),
+    const('PER_cDeptNaiss'),
+    field('PER_cPaysNaiss', 'stagiaire.pays', 'pays'),
+    const('PER_cSitFam'),
+    field('PER_cNationalite', 'stagiaire.pays', 'pays'),
+    const('PER_cNIvForm'),
+    const('PER_cCateg', 'INT,STA'),
+    const('iDesactive', 0),
+    const('PER_BNPAI_MAIL', 0),
+    const('PER_BBL_COMM_MAIL', 0),
+    const('psl_cTel'),
+    field('psl_cTelPort', 'stagiaire.portable'),          # Pro
+    field('psl_cEmail', 'stagiaire.email'),               # Pro
+    const('ADR_cAdresseNature', 'PERS'),                  # Personnelle
+    field('ADR_cAdresse1', 'stagiaire.adresse'),
+    const('ADR_cAdresse2'),
+    const('ADR_cAdresse3'),
+    const('ADR_cAdresse4'),
+    field('ADR_cCodePostal', 'stagiaire.code_postal'),
+    field('ADR_cVille', 'stagiaire.ville'),
+    field('ADR_cPays', 'stagiaire.pays', 'pays'),
+    const('ADR_cSiteWeb'),
+    const('ADR_CTEL'),
+    field('ADR_CTELPORT', 'stagiaire.portable'),
+    field('ADR_CEMAIL', 'stagiaire.email'),
+]
+
+
+def headers(columns):
+    return [c.header for c in columns]
+
+
+def compile_row_builder(columns):
+    """Prépare la spécification en une fonction build(inscription, get_pays_code) -> list"""
+    pays_sources = []  # Un seul appel par source, même si plusieurs colonnes l'utilisent
+    getters = []
+    for c in columns:
+        if c.source is None:
+            getters.append(lambda inscription, pays, value=c.value: value)
+        elif c.transform == 'upper':
+            getters.append(lambda inscription, pays, get=attrgetter(c.source): get(inscription).upper())
+        elif c.transform == 'pays':
+            if c.source not in pays_sources:
+                pays_sources.append(c.source)
+            getters.append(lambda inscription, pays, i=pays_sources.index(c.source): pays[i])
+        elif c.transform:
+            raise ValueError(f"Transformation inconnue: {c.transform}")
+        else:
+            getters.append(lambda inscription, pays, get=attrgetter(c.source): get(inscription))
+    pays_getters = [attrgetter(source) for source in pays_sources]
+
+    def build_row(inscription, get_pays_code):
+        pays = [get_pays_code(get(inscription)) for get in pays_getters]
+        return [getter(inscription, pays) for getter in getters]
+
+    return build_row
+
+
+def write_csv(output_path, header, rows, encoding=CSV_ENCODING):
+    """Écrit un fichier CSV au format d'import Ammon ; retourne le nombre de lignes
+
+    Les caractères absents de l'encodage sont translittérés (ș -> s, Ł -> L) ; une valeur
+    sans équivalent lève une ValueError qui désigne la ligne, plutôt qu'un « ? » silencieux.
+    """
+    count = 0
+    with open(Path(output_path), 'w', newline='', encoding=encoding) as f:
+        writer = csv.writer(f, delimiter=CSV_DELIMITER, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(header)
+        for count, row in enumerate(rows, 1):
+            try:
+                writer.writerow([to_charset(value, encoding) if isinstance(value, str) else value for value in row])
+            except ValueError as e:
+                raise ValueError(f"{Path(output_path).name}, ligne {count}: {e}") from e
+    return count
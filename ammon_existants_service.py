@@ -1,58 +1,233 @@
-from typing import Any
-
-import pandas as pd
+import hashlib
+import os
+import pickle
 import re
 from pathlib import Path
 
+from ammon_columns import CSV_DELIMITER, CSV_ENCODING
+from ammon_person_matcher import PersonMatcher, NEW
+from ammon_reference_store import ReferenceStore
+
+# Seules colonnes lues dans les exports Ammon et nos fichiers d'import
+USED_COLUMNS = {'SOC_cSIRET', 'PER_cNom', 'PER_cPrenom', 'cRefExt'}
+
+
 class ExistantsService:
-    def __init__(self, folder_path="./existants"):
+    def __init__(self, folder_path="./existants", generated_path=None, include_generated=True,
+                 fuzzy=True, match_threshold=0.92, review_threshold=0.80):
         self.folder_path = Path(folder_path)
-        self.siret_to_ref = {}      # Map: {SIRET: RefExt}
-        self.nom_prenom_to_ref = {} # Map: {NOM+PRENOM: RefExt}
+        self.generated_path = Path(generated_path) if generated_path else None
+        # En mode replay, on ignore ce que nos propres imports ont déjà émis
+        self.include_generated = include_generated
+        self.fuzzy = fuzzy
+        self.match_threshold = match_threshold
+        self.review_threshold = review_threshold
+        # Avant la base de référence, qui crée le dossier
+        if not self.folder_path.exists():
+            print(f"⚠️ Dossier {self.folder_path} non trouvé.")
+        self.store = ReferenceStore(self.folder_path / "reference.sqlite")
+        self._matcher = None
         self._load_existants()
+        self._print_totals()
 
     def _load_existants(self):
-        """Charge les fichiers d'export Ammon en mémoire"""
-        if not self.folder_path.exists():
-            print(f"⚠️ Dossier {self.folder_path} non trouvé.")
-            return
+        """Intègre les nouveaux exports Ammon (et nos imports générés) dans la base de référence"""
+        sources = [
+            # 1. Exports Ammon (complets ou deltas)
+            (self.folder_path, r"\d+-VIE_ENTREPRISE\.xls$", self._process_entreprises, ReferenceStore.ORIGIN_AMMON),
+            (self.folder_path, r"\d+-VIE_PERSONNE\.xls$", self._process_personnes, ReferenceStore.ORIGIN_AMMON),
+        ]
+        if self.generated_path:
+            # 2. Fichiers d'import déjà générés (mêmes colonnes que les exports)
+            sources += [
+                (self.generated_path, r"Import_Entreprise_.*\.(xlsx|csv)$", self._process_entreprises, ReferenceStore.ORIGIN_GENERATED),
+                (self.generated_path, r"Import_Stagiaires_.*\.(xlsx|csv)$", self._process_personnes, ReferenceStore.ORIGIN_GENERATED),
+            ]
+
+        # Fichiers supprimés (dossier de sortie vidé, export retiré) : leurs lignes ne comptent plus
+        imported = 0
+        for source in self.store.imported_sources():
+            if not Path(source).exists():
+                self.store.forget(source)
+                print(f"🗑️ {Path(source).name} supprimé, retiré de la base de référence")
+                imported += 1
+
+        for folder, regex_pattern, process_func, origin in sources:
+            imported += self._load_files(folder, regex_pattern, process_func, origin)
+        return imported
 
-        # 1. Chargement Entreprises
-        self._load_file(r"\d+-VIE_ENTREPRISE\.xls$", self._process_entreprises)
+    def _print_totals(self):
+        print(f"✅ {self.store.count('entreprises')} entreprises et {self.store.count('personnes')} personnes connues")
 
-        # 2. Chargement Personnes
-        self._load_file(r"\d+-VIE_PERSONNE\.xls$", self._process_personnes)
+    def refresh(self) -> bool:
+        """Intègre les exports apparus ou modifiés depuis le dernier chargement (mode surveillance)"""
+        if not self._load_existants():
+            return False
+        self._matcher = None
+        self._print_totals()
+        return True
 
-    def _load_file(self, regex_pattern, process_func):
+    def _load_files(self, folder, regex_pattern, process_func, origin):
+        if not folder.exists():
+            return 0
         pattern = re.compile(regex_pattern)
-        for f in self.folder_path.glob("*.xls"):
-            if pattern.match(f.name):
-                try:
-                    df = pd.read_excel(f)
-                    process_func(df, f.name)
-                except Exception as e:
-                    print(f"❌ Erreur lecture {f.name}: {e}")
-                return
-
-    def _process_entreprises(self, df, filename):
+        files = [f for f in folder.iterdir() if pattern.match(f.name)]
+        imported = 0
+        # Du plus ancien au plus récent : le dernier export l'emporte
+        for f in sorted(files, key=lambda p: (p.stat().st_mtime_ns, p.name)):
+            try:
+                imported += self._import_file(f, process_func, origin)
+            except Exception as e:
+                print(f"❌ Erreur lecture {f.name}: {e}")
+        return imported
+
+    @staticmethod
+    def _file_hash(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _import_file(self, f, process_func, origin):
+        """Importe le fichier s'il est nouveau ou a changé depuis le dernier import ; retourne 1 si importé"""
+        source = str(f.resolve())
+        st = f.stat()
+        known = self.store.get_import(source)
+        if known and known[0] == st.st_size:
+            if known[1] == st.st_mtime_ns:
+                return 0
+            # Fichier touché (copie, re-téléchargement) : on vérifie le contenu
+            sha256 = self._file_hash(f)
+            if known[2] == sha256:
+                self.store.mark_imported(source, st.st_size, st.st_mtime_ns, sha256, 0, origin)
+                return 0
+
+        # pandas n'est chargé que lorsqu'un fichier doit réellement être (ré)intégré
+        import pandas as pd
+
+        if f.suffix.lower() == '.csv':
+            df = pd.read_csv(f, sep=CSV_DELIMITER, encoding=CSV_ENCODING, dtype=str, usecols=lambda c: c in USED_COLUMNS)
+        else:
+            df = pd.read_excel(f, dtype=str, usecols=lambda c: c in USED_COLUMNS)
+        if known:
+            # Fichier modifié : ses anciennes lignes sont remplacées, pas complétées
+            self.store.forget(source)
+        count = process_func(df, source, origin, st.st_mtime)
+        if count is None:
+            return 0
+        self.store.mark_imported(source, st.st_size, st.st_mtime_ns, self._file_hash(f), count, origin)
+        print(f"✅ {count} ligne(s) intégrée(s) depuis {f.name}")
+        return 1
+
+    def _process_entreprises(self, df, source, origin, updated_at):
         if 'SOC_cSIRET' in df.columns and 'cRefExt' in df.columns:
+            df = df.dropna(subset=['SOC_cSIRET', 'cRefExt'])
             df['SOC_cSIRET'] = df['SOC_cSIRET'].astype(str).str.replace(r'\s+', '', regex=True)
-            self.siret_to_ref = pd.Series(df.cRefExt.values, index=df.SOC_cSIRET).to_dict()
-            print(f"✅ {len(self.siret_to_ref)} entreprises chargées ({filename})")
+            rows = list(zip(df.SOC_cSIRET, df.cRefExt))
+            self.store.upsert_entreprises(rows, origin, source, updated_at)
+            return len(rows)
+        return None
 
-    def _process_personnes(self, df, filename):
+    def _process_personnes(self, df, source, origin, updated_at):
         if all(col in df.columns for col in ['PER_cNom', 'PER_cPrenom', 'cRefExt']):
+            df = df.dropna(subset=['cRefExt'])
+            nom = df['PER_cNom'].fillna('').astype(str)
+            prenom = df['PER_cPrenom'].fillna('').astype(str)
             # Création d'une clé normalisée : NOM+PRENOM en majuscules, sans espaces
-            df['key'] = (df['PER_cNom'].astype(str) + df['PER_cPrenom'].astype(str)).str.replace(r'\s+', '', regex=True).str.upper()
-            self.nom_prenom_to_ref = pd.Series(df.cRefExt.values, index=df.key).to_dict()
-            print(f"✅ {len(self.nom_prenom_to_ref)} personnes chargées ({filename})")
+            key = (nom + prenom).str.replace(r'\s+', '', regex=True).str.upper()
+            rows = list(zip(key, nom, prenom, df.cRefExt))
+            self.store.upsert_personnes(rows, origin, source, updated_at)
+            return len(rows)
+        return None
+
+    # --- Recherche approchée des personnes ---
+
+    @property
+    def matcher(self) -> PersonMatcher:
+        return self.warm_matcher()
+
+    def warm_matcher(self) -> PersonMatcher:
+        """Charge l'index de recherche approchée s'il ne l'est pas encore (appelé d'avance en arrière-plan)"""
+        if self._matcher is None:
+            self._matcher = self._load_matcher()
+            self._matcher.match_threshold = self.match_threshold
+            self._matcher.review_threshold = self.review_threshold
+        return self._matcher
+
+    def _load_matcher(self):
+        """Charge l'index de blocage des exports Ammon depuis le disque (reconstruit s'ils ont changé),
+        puis y ajoute les personnes de nos imports générés"""
+        cache_file = self.folder_path / "person_matcher.pkl"
+        # Seuls les exports Ammon comptent : un import généré à chaque lancement n'invalide pas le cache
+        fingerprint = self.store.fingerprint(ReferenceStore.ORIGIN_AMMON)
+        matcher = None
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('fingerprint') == fingerprint:
+                matcher = cached['matcher']
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+        if matcher is None:
+            matcher = PersonMatcher(self.store.iter_personnes(origin=ReferenceStore.ORIGIN_AMMON))
+            try:
+                tmp = cache_file.with_suffix('.tmp')
+                with open(tmp, 'wb') as f:
+                    pickle.dump({'fingerprint': fingerprint, 'matcher': matcher}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache_file)
+            except OSError as e:
+                print(f"⚠️ Index de recherche approchée non enregistré: {e}")
+
+        if self.include_generated:
+            for nom, prenom, ref_ext in self.store.iter_personnes(origin=ReferenceStore.ORIGIN_GENERATED):
+                matcher._add(nom, prenom, ref_ext)
+        return matcher
+
+    def match_personne(self, nom: str, prenom: str):
+        """Retourne (décision, meilleur candidat) : 'existing', 'review' ou 'new'"""
+        if not self.fuzzy or not nom or not prenom:
+            return NEW, None
+        return self.matcher.classify(nom, prenom)
+
+    def record_generated_file(self, path):
+        """Enregistre immédiatement un fichier Import_* (xlsx ou csv) que l'on vient de produire"""
+        if not self.include_generated:
+            # --replay : les fichiers régénérés ne doivent pas devenir des existants
+            return
+        path = Path(path)
+        process_func = self._process_entreprises if path.name.startswith('Import_Entreprise_') else self._process_personnes
+        try:
+            imported = self._import_file(path, process_func, ReferenceStore.ORIGIN_GENERATED)
+            # Les nouveaux stagiaires rejoignent l'index déjà chargé, sans le reconstruire
+            if imported and self._matcher is not None and self.include_generated and process_func == self._process_personnes:
+                for nom, prenom, ref_ext in self.store.iter_personnes(source=str(path.resolve())):
+                    self._matcher._add(nom, prenom, ref_ext)
+        except Exception as e:
+            print(f"⚠️ {path.name} non enregistré dans la base de référence: {e}")
 
     def get_existing_entreprise_ref(self, siret: str) -> str:
         if not siret: return None
-        return self.siret_to_ref.get(str(siret).replace(' ', ''))
+        return self.store.find_entreprise(str(siret).replace(' ', ''), self.include_generated)
 
     def get_existing_personne_ref(self, nom: str, prenom: str) -> str:
         if not nom or not prenom: return None
+        return self.store.find_personne(self._personne_key(nom, prenom), self.include_generated)
+
+    @staticmethod
+    def _personne_key(nom, prenom):
         # Même normalisation qu'au chargement
-        key = (str(nom) + str(prenom)).replace(' ', '').upper()
-        return self.nom_prenom_to_ref.get(key)
\ No newline at end of file
+        return (str(nom) + str(prenom)).replace(' ', '').upper()
+
+    def get_existing_entreprise_refs(self, sirets) -> dict:
+        """Recherche groupée : {siret: ref_ext} des SIRET déjà connus"""
+        keys = {siret: str(siret).replace(' ', '') for siret in sirets if siret}
+        found = self.store.find_entreprises(keys.values(), self.include_generated)
+        return {siret: found[key] for siret, key in keys.items() if key in found}
+
+    def get_existing_personne_refs(self, pairs) -> dict:
+        """Recherche groupée : {(nom, prénom): ref_ext} des personnes déjà connues"""
+        keys = {(nom, prenom): self._personne_key(nom, prenom) for nom, prenom in pairs if nom and prenom}
+        found = self.store.find_personnes(keys.values(), self.include_generated)
+        return {pair: found[key] for pair, key in keys.items() if key in found}
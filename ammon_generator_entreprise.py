@@ -1,82 +1,83 @@
 from datetime import datetime
 from pathlib import Path
 
-from openpyxl import Workbook
-
 from ammon_code_pays import PaysCode
+from ammon_columns import ENTREPRISE_COLUMNS, compile_row_builder, headers, write_csv
 
 
 class EntrepriseExcelGenerator:
     """Générateur de fichier Excel pour l'import dans Ammon Campus"""
 
-    def __init__(self, pays_code: PaysCode =None):
+    # En-têtes selon le template Ammon
+    HEADERS = headers(ENTREPRISE_COLUMNS)
+    _build_row = staticmethod(compile_row_builder(ENTREPRISE_COLUMNS))
+
+    def __init__(self, pays_code: PaysCode =None, verbose=True, progress_every=500):
         self.pays_codes = pays_code
+        self.verbose = verbose                # Une ligne console par entreprise
+        self.progress_every = progress_every  # Sinon, un point d'avancement toutes les N lignes
 
-    def create_entreprises_excel(self, data_list, output_path):
-        """Crée un fichier Excel d'import avec plusieurs entreprises"""
+    def build_row(self, inscription):
+        """Construit la ligne Ammon d'une entreprise"""
+        return self._build_row(inscription, self.pays_codes.get_pays_code)
 
-        # Créer un nouveau workbook avec les en-têtes
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Entreprise"
-
-        # En-têtes selon le template Ammon
-        headers = [
-            'cRefExt', 'iDesactive', 'SOC_cRaisonSociale', 'SOC_cType',
-            'SOC_iEstSiege', 'SOC_cCateg', 'SOC_cSIRET', 'SOC_cNACE',
-            'ADR_IESTADRCOURRIER', 'ADR_cAdresseNature', 'ADR_cAdresse1',
-            'ADR_cAdresse2', 'ADR_cAdresse3', 'ADR_cAdresse4', 'ADR_cCodePostal',
-            'ADR_cVille', 'ADR_cPays', 'ADR_cSiteWeb', 'ADR_cTel', 'ADR_cEmail',
-            'LIE_cCode', 'LIE_cLibelle', 'LIE_cRefext', 'org_cAgrementAnimateur'
-        ]
-        ws.append(headers)
-
-        print(f"📊 Génération du fichier Excel avec {len(data_list)} entreprise(s)...\n")
+    def _rows(self, data_list):
+        """Construit les lignes au fil de l'eau en affichant l'avancement"""
+        if hasattr(data_list, '__len__'):
+            print(f"📊 Génération du fichier avec {len(data_list)} entreprise(s)...\n")
+        else:
+            print("📊 Génération du fichier des entreprises (flux)...\n")
+
+        rows = ((self.build_row(ins), ins.entreprise.nom, ins.entreprise.siret) for ins in data_list)
 
         # Ajouter une ligne pour chaque entreprise
-        for i, inscription in enumerate(data_list, 1):
-            ent = inscription.entreprise  # Accès direct à l'objet entreprise
-
-            # Construire la ligne de données
-            row_data = [
-                ent.ref_ext,
-                0,
-                ent.nom,
-                'E',
-                -1,
-                'SGE',
-                ent.siret,
-                ent.code_nafa,
-                -1,
-                'PR',
-                ent.adresse,
-                '',
-                '',
-                '',
-                ent.code_postal,
-                ent.ville,
-                self.pays_codes.get_pays_code(ent.pays),
-                '',
-                ent.telephone,
-                ent.email,
-                '',                                         # LIE_cCode
-                '',                                         # LIE_cLibelle
-                '',                                         # LIE_cRefext
-                ''                                          # org_cAgrementAnimateur
-            ]
-
-            ws.append(row_data)
+        for i, (row, nom, siret) in enumerate(rows, 1):
+            yield row
 
             # Afficher un résumé de chaque ligne ajoutée
-            entreprise_nom = ent.nom if ent.nom else 'N/A'
-            siret_display = ent.siret if ent.siret else 'N/A'
-            print(f"   {i}. {entreprise_nom} (SIRET: {siret_display})")
+            if self.verbose:
+                entreprise_nom = nom if nom else 'N/A'
+                siret_display = siret if siret else 'N/A'
+                print(f"   {i}. {entreprise_nom} (SIRET: {siret_display})")
+            elif self.progress_every and i % self.progress_every == 0:
+                print(f"   … {i} entreprise(s)")
+
+    def create_entreprises_excel(self, data_list, output_path, streaming=False):
+        """Crée un fichier Excel d'import avec plusieurs entreprises
+
+        data_list peut être un itérable quelconque ; en mode streaming, les lignes
+        sont écrites au fil de l'eau dans une feuille write-only d'openpyxl.
+        """
+        from openpyxl import Workbook
+
+        # Créer un nouveau workbook avec les en-têtes
+        wb = Workbook(write_only=streaming)
+        if streaming:
+            ws = wb.create_sheet("Entreprise")
+        else:
+            ws = wb.active
+            ws.title = "Entreprise"
+        ws.append(self.HEADERS)
+
+        count = 0
+        for count, row in enumerate(self._rows(data_list), 1):
+            ws.append(row)
 
         # Sauvegarder le fichier
         output_file = Path(output_path)
         wb.save(output_file)
 
         print(f"\n💾 Fichier Excel créé: {output_file}")
-        print(f"   📈 {len(data_list)} entreprise(s) dans le fichier")
+        print(f"   📈 {count} entreprise(s) dans le fichier")
+
+        return output_file
+
+    def create_entreprises_csv(self, data_list, output_path, **_):
+        """Crée un fichier CSV d'import (séparateur ';', encodage Windows) avec plusieurs entreprises"""
+        output_file = Path(output_path)
+        count = write_csv(output_file, self.HEADERS, self._rows(data_list))
+
+        print(f"\n💾 Fichier CSV créé: {output_file}")
+        print(f"   📈 {count} entreprise(s) dans le fichier")
 
         return output_file
@@ -1,82 +1,67 @@
 from datetime import datetime
 from pathlib import Path
-from openpyxl import Workbook
 from ammon_code_pays import PaysCode
+from ammon_columns import PERSONNE_COLUMNS, compile_row_builder, headers, write_csv
 
 class PersonneExcelGenerator:
     """Générateur de fichier Excel pour l'import des stagiaires dans Ammon Campus"""
 
-    def __init__(self, pays_code: PaysCode = None):
+    # En-têtes basés sur Import_Personnes.csv
+    HEADERS = headers(PERSONNE_COLUMNS)
+    _build_row = staticmethod(compile_row_builder(PERSONNE_COLUMNS))
+
+    def __init__(self, pays_code: PaysCode = None, verbose=True, progress_every=500):
         self.pays_codes = pays_code
+        self.verbose = verbose                # Une ligne console par stagiaire
+        self.progress_every = progress_every  # Sinon, un point d'avancement toutes les N lignes
+
+    def build_row(self, inscription):
+        """Construit la ligne Ammon d'un stagiaire"""
+        return self._build_row(inscription, self.pays_codes.get_pays_code)
+
+    def _rows(self, data_list):
+        """Construit les lignes au fil de l'eau en affichant l'avancement"""
+        if hasattr(data_list, '__len__'):
+            print(f"👤 Génération du fichier avec {len(data_list)} stagiaire(s)...\n")
+        else:
+            print("👤 Génération du fichier des stagiaires (flux)...\n")
+
+        rows = ((self.build_row(ins), ins.stagiaire.prenom, ins.stagiaire.nom) for ins in data_list)
 
-    def create_personnes_excel(self, data_list, output_path):
-        """Crée un fichier Excel d'import pour les stagiaires"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Personnes"
+        for i, (row, prenom, nom) in enumerate(rows, 1):
+            yield row
+            if self.verbose:
+                print(f"   {i}. {prenom} {nom.upper()}")
+            elif self.progress_every and i % self.progress_every == 0:
+                print(f"   … {i} stagiaire(s)")
 
-        # En-têtes basés sur Import_Personnes.csv
-        headers = [
-            'cRefExt', 'SOC_cRefExt', 'SOC_cRefExtService', 'PER_CCODESTRUCTURE_RATTACHEMENT',
-            'PER_cNumeroSS', 'PER_cCivilite', 'PER_cSexe', 'PER_cNom', 'PER_cPrenom',
-            'PER_cNomJeun', 'PER_xDateNaiss', 'PER_cCommuneNaiss', 'PER_cDeptNaiss',
-            'PER_cPaysNaiss', 'PER_cSitFam', 'PER_cNationalite', 'PER_cNIvForm',
-            'PER_cCateg', 'iDesactive', 'PER_BNPAI_MAIL', 'PER_BBL_COMM_MAIL',
-            'psl_cTel', 'psl_cTelPort', 'psl_cEmail', 'ADR_cAdresseNature',
-            'ADR_cAdresse1', 'ADR_cAdresse2', 'ADR_cAdresse3', 'ADR_cAdresse4',
-            'ADR_cCodePostal', 'ADR_cVille', 'ADR_cPays', 'ADR_cSiteWeb',
-            'ADR_CTEL', 'ADR_CTELPORT', 'ADR_CEMAIL'
-        ]
-        ws.append(headers)
+    def create_personnes_excel(self, data_list, output_path, streaming=False):
+        """Crée un fichier Excel d'import pour les stagiaires
 
-        print(f"👤 Génération du fichier Excel avec {len(data_list)} stagiaire(s)...\n")
+        data_list peut être un itérable quelconque ; en mode streaming, les lignes
+        sont écrites au fil de l'eau dans une feuille write-only d'openpyxl.
+        """
+        from openpyxl import Workbook
 
-        for i, inscription in enumerate(data_list, 1):
-            stg = inscription.stagiaire
-            ent = inscription.entreprise
+        wb = Workbook(write_only=streaming)
+        if streaming:
+            ws = wb.create_sheet("Personnes")
+        else:
+            ws = wb.active
+            ws.title = "Personnes"
+        ws.append(self.HEADERS)
 
-            row_data = [
-                stg.ref_ext,                    # cRefExt
-                ent.ref_ext,                    # SOC_cRefExt (Lien avec l'entreprise)
-                '',                             # SOC_cRefExtService
-                'CLIENT',                       # PER_CCODESTRUCTURE_RATTACHEMENT
-                '',                             # PER_cNumeroSS
-                stg.civilite_ammon,             # PER_cCivilite
-                stg.sexe,                       # PER_cSexe
-                stg.nom.upper(),                # PER_cNom
-                stg.prenom,                     # PER_cPrenom
-                '',                             # PER_cNomJeun
-                stg.date_naissance,             # PER_xDateNaiss
-                '',                             # PER_cCommuneNaiss
-                '',                             # PER_cDeptNaiss
-                self.pays_codes.get_pays_code(stg.pays), # PER_cPaysNaiss
-                '',                             # PER_cSitFam
-                self.pays_codes.get_pays_code(stg.pays), # PER_cNationalite
-                '',                             # PER_cNIvForm
-                'INT,STA',                      # PER_cCateg
-                0,                              # iDesactive
-                0,                              # PER_BNPAI_MAIL
-                0,                              # PER_BBL_COMM_MAIL
-                '',                             # psl_cTel
-                stg.portable,                   # psl_cTelPort (Pro)
-                stg.email,                      # psl_cEmail (Pro)
-                'PERS',                         # ADR_cAdresseNature (Personnelle)
-                stg.adresse,                    # ADR_cAdresse1
-                '',                             # ADR_cAdresse2
-                '',                             # ADR_cAdresse3
-                '',                             # ADR_cAdresse4
-                stg.code_postal,                # ADR_cCodePostal
-                stg.ville,                      # ADR_cVille
-                self.pays_codes.get_pays_code(stg.pays), # ADR_cPays
-                '',                             # ADR_cSiteWeb
-                '',                             # ADR_CTEL
-                stg.portable,                   # ADR_CTELPORT
-                stg.email                       # ADR_CEMAIL
-            ]
-            ws.append(row_data)
-            print(f"   {i}. {stg.prenom} {stg.nom.upper()}")
+        for row in self._rows(data_list):
+            ws.append(row)
 
         output_file = Path(output_path)
         wb.save(output_file)
         print(f"\n💾 Fichier Excel Stagiaires créé: {output_file}")
         return output_file
+
+    def create_personnes_csv(self, data_list, output_path, **_):
+        """Crée un fichier CSV d'import (séparateur ';', encodage Windows) pour les stagiaires"""
+        output_file = Path(output_path)
+        write_csv(output_file, self.HEADERS, self._rows(data_list))
+        print(f"\n💾 Fichier CSV Stagiaires créé: {output_file}")
+        return output_file
@@ -0,0 +1,159 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from text_normalize import fold
+
+# Décisions retournées par PersonMatcher.classify
+EXISTING = 'existing'
+REVIEW = 'review'
+NEW = 'new'
+
+_PHONETIC_RULES = [
+    ('SCH', 'S'), ('CH', 'S'), ('SC', 'S'), ('PH', 'F'), ('GN', 'N'), ('QU', 'K'), ('CK', 'K'),
+    ('C', 'K'), ('Q', 'K'), ('W', 'V'), ('Z', 'S'), ('Y', 'I'), ('H', ''),
+]
+
+
+@lru_cache(maxsize=65536)
+def phonetic_key(token: str) -> str:
+    """Clé phonétique simplifiée (français) d'un mot déjà replié"""
+    if not token:
+        return ''
+    for src, dst in _PHONETIC_RULES:
+        token = token.replace(src, dst)
+    if not token:
+        return ''
+    # Voyelles supprimées sauf la première lettre, lettres doublées fusionnées
+    key = token[0] + re.sub(r'[AEIOU]', '', token[1:])
+    key = re.sub(r'(.)\1+', r'\1', key)
+    # Finales muettes
+    key = re.sub(r'(?<=.)[STXD]$', '', key)
+    return key[:6]
+
+
+def _trigrams(text: str):
+    text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass(frozen=True)
+class PersonMatch:
+    ref_ext: str
+    nom: str
+    prenom: str
+    score: float
+
+
+class PersonMatcher:
+    """Recherche approchée de personnes existantes via des clés de blocage (repli, phonétique, n-grammes)"""
+
+    # Un trigramme partagé par trop de personnes n'est pas discriminant
+    MAX_TRIGRAM_POSTINGS = 2000
+
+    def __init__(self, persons, match_threshold=0.92, review_threshold=0.80):
+        """persons : itérable de (nom, prénom, ref_ext)"""
+        self.match_threshold = match_threshold
+        self.review_threshold = review_threshold
+        self.persons = []                  # [(nom, prénom, ref_ext, nom complet trié)]
+        self.blocks = defaultdict(list)    # Map: {clé de blocage: [index]}
+        self.trigrams = defaultdict(list)  # Map: {trigramme: [index]}
+        for nom, prenom, ref_ext in persons:
+            self._add(nom, prenom, ref_ext)
+
+    @staticmethod
+    def _tokens(nom, prenom):
+        return fold(nom).split(), fold(prenom).split()
+
+    @staticmethod
+    def _block_keys(nom_tokens, prenom_tokens):
+        keys = {'F:' + ''.join(sorted(nom_tokens + prenom_tokens))}
+        if nom_tokens and prenom_tokens:
+            # Paire (nom, premier prénom) sans ordre : couvre l'inversion nom/prénom
+            first = phonetic_key(prenom_tokens[0])
+            keys.add('P:' + '|'.join(sorted((phonetic_key(''.join(nom_tokens)), first))))
+            for token in nom_tokens:
+                keys.add('P:' + '|'.join(sorted((phonetic_key(token), first))))
+        return keys
+
+    def _add(self, nom, prenom, ref_ext):
+        index = len(self.persons)
+        nom_tokens, prenom_tokens = self._tokens(nom, prenom)
+        sorted_name = ' '.join(sorted(nom_tokens + prenom_tokens))
+        self.persons.append((nom, prenom, ref_ext, sorted_name))
+        for key in self._block_keys(nom_tokens, prenom_tokens):
+            self.blocks[key].append(index)
+        for gram in _trigrams(sorted_name.replace(' ', '')):
+            self.trigrams[gram].append(index)
+
+    def find_candidates(self, nom, prenom, limit=5):
+        """Retourne les personnes les plus proches, triées par score décroissant"""
+        nom_tokens, prenom_tokens = self._tokens(nom, prenom)
+        sorted_name = ' '.join(sorted(nom_tokens + prenom_tokens))
+        if not sorted_name:
+            return []
+        compact = sorted_name.replace(' ', '')
+
+        candidates = set()
+        for key in self._block_keys(nom_tokens, prenom_tokens):
+            candidates.update(self.blocks.get(key, ()))
+
+        # Repli n-grammes : utile quand la faute d'OCR casse aussi la clé phonétique
+        if not candidates:
+            counts = defaultdict(int)
+            grams = _trigrams(compact)
+            for gram in grams:
+                postings = self.trigrams.get(gram, ())
+                if len(postings) <= self.MAX_TRIGRAM_POSTINGS:
+                    for index in postings:
+                        counts[index] += 1
+            needed = max(2, len(grams) // 2)
+            candidates = {index for index, count in counts.items() if count >= needed}
+
+        # Un seul SequenceMatcher : la requête est analysée une fois (seq2)
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(sorted_name)
+        scored = []
+        for index in candidates:
+            other = self.persons[index][3]
+            if other.replace(' ', '') == compact:
+                score = 1.0
+            else:
+                matcher.set_seq1(other)
+                if matcher.real_quick_ratio() < self.review_threshold or matcher.quick_ratio() < self.review_threshold:
+                    continue
+                score = matcher.ratio()
+            scored.append((score, index))
+
+        scored = sorted(scored, reverse=True)[:limit]
+        return [PersonMatch(self.persons[i][2], self.persons[i][0], self.persons[i][1], round(score, 3))
+                for score, i in scored]
+
+    @classmethod
+    def _identity(cls, nom, prenom):
+        """(nom complet replié, clés phonétiques du nom et du prénom), sans ordre nom/prénom"""
+        nom_tokens, prenom_tokens = cls._tokens(nom, prenom)
+        parts = sorted((''.join(nom_tokens), ''.join(prenom_tokens)))
+        return ''.join(sorted(nom_tokens + prenom_tokens)), tuple(sorted(phonetic_key(part) for part in parts))
+
+    def classify(self, nom, prenom):
+        """Retourne (décision, meilleur candidat) : EXISTING, REVIEW ou NEW
+
+        Seule une personne identique après repli (accents, tirets, inversion nom/prénom) ou de même
+        prononciation (score d'au moins match_threshold) est reconnue d'office ; toute autre
+        ressemblance, même à une lettre près (LEFEVRE / LEFEBVRE), est à vérifier.
+        """
+        candidates = self.find_candidates(nom, prenom)
+        if not candidates:
+            return NEW, None
+        folded, phonetic = self._identity(nom, prenom)
+        for candidate in candidates:
+            other_folded, other_phonetic = self._identity(candidate.nom, candidate.prenom)
+            if other_folded == folded or (other_phonetic == phonetic and candidate.score >= self.match_threshold):
+                return EXISTING, candidate
+        best = candidates[0]
+        if best.score >= self.review_threshold:
+            return REVIEW, best
+        return NEW, best
@@ -0,0 +1,194 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+# Incrémenter si le schéma ou la normalisation des clés change
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entreprises (
+    siret       TEXT PRIMARY KEY,
+    ref_ext     TEXT NOT NULL,
+    origin      TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS personnes (
+    key         TEXT PRIMARY KEY,
+    nom         TEXT,
+    prenom      TEXT,
+    ref_ext     TEXT NOT NULL,
+    origin      TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    source      TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    sha256      TEXT NOT NULL,
+    rows        INTEGER NOT NULL,
+    origin      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_personnes_nom ON personnes(nom);
+"""
+
+
+class ReferenceStore:
+    """Base SQLite locale des entreprises et personnes connues d'Ammon"""
+
+    ORIGIN_AMMON = 'ammon'          # Exports Ammon (VIE_ENTREPRISE / VIE_PERSONNE)
+    ORIGIN_GENERATED = 'generated'  # Fichiers Import_*.xlsx produits par ce script
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    def _init_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS entreprises; DROP TABLE IF EXISTS personnes; DROP TABLE IF EXISTS imports;"
+            )
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    # --- Suivi des fichiers importés ---
+
+    def get_import(self, source):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM imports WHERE source = ?", (source,)
+            ).fetchone()
+        return row
+
+    def mark_imported(self, source, size, mtime_ns, sha256, rows, origin=ORIGIN_AMMON):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO imports (source, size, mtime_ns, sha256, rows, origin) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, size, mtime_ns, sha256, rows, origin)
+            )
+
+    def imported_sources(self):
+        """Chemins de tous les fichiers déjà intégrés"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT source FROM imports")]
+
+    def forget(self, source):
+        """Retire les lignes d'un fichier et son suivi (fichier supprimé, ou avant sa réintégration)"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM entreprises WHERE source = ?", (source,))
+            self.conn.execute("DELETE FROM personnes WHERE source = ?", (source,))
+            self.conn.execute("DELETE FROM imports WHERE source = ?", (source,))
+
+    # --- Upserts (la donnée la plus récente l'emporte) ---
+
+    def upsert_entreprises(self, rows, origin, source, updated_at):
+        """rows : itérable de (siret, ref_ext)"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """INSERT INTO entreprises (siret, ref_ext, origin, source, updated_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(siret) DO UPDATE SET
+                       ref_ext = excluded.ref_ext, origin = excluded.origin,
+                       source = excluded.source, updated_at = excluded.updated_at
+                   WHERE excluded.updated_at >= entreprises.updated_at""",
+                ((siret, ref, origin, source, updated_at) for siret, ref in rows)
+            )
+
+    def upsert_personnes(self, rows, origin, source, updated_at):
+        """rows : itérable de (clé, nom, prénom, ref_ext)"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """INSERT INTO personnes (key, nom, prenom, ref_ext, origin, source, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       nom = excluded.nom, prenom = excluded.prenom, ref_ext = excluded.ref_ext,
+                       origin = excluded.origin, source = excluded.source, updated_at = excluded.updated_at
+                   WHERE excluded.updated_at >= personnes.updated_at""",
+                ((key, nom, prenom, ref, origin, source, updated_at) for key, nom, prenom, ref in rows)
+            )
+
+    # --- Recherches ---
+
+    def _origins(self, include_generated):
+        if include_generated:
+            return (self.ORIGIN_AMMON, self.ORIGIN_GENERATED)
+        return (self.ORIGIN_AMMON, self.ORIGIN_AMMON)
+
+    def find_entreprise(self, siret, include_generated=True):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT ref_ext FROM entreprises WHERE siret = ? AND origin IN (?, ?)",
+                (siret, *self._origins(include_generated))
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_personne(self, key, include_generated=True):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT ref_ext FROM personnes WHERE key = ? AND origin IN (?, ?)",
+                (key, *self._origins(include_generated))
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_entreprises(self, sirets, include_generated=True):
+        """Recherche groupée : {siret: ref_ext} des SIRET connus"""
+        return self._find_many('entreprises', 'siret', sirets, include_generated)
+
+    def find_personnes(self, keys, include_generated=True):
+        """Recherche groupée : {clé: ref_ext} des personnes connues"""
+        return self._find_many('personnes', 'key', keys, include_generated)
+
+    def _find_many(self, table, column, values, include_generated, chunk=500):
+        values = list(dict.fromkeys(values))
+        found = {}
+        with self._lock:
+            # Par paquets : SQLite limite le nombre de paramètres d'une requête
+            for start in range(0, len(values), chunk):
+                part = values[start:start + chunk]
+                found.update(self.conn.execute(
+                    f"SELECT {column}, ref_ext FROM {table} WHERE {column} IN ({', '.join('?' * len(part))}) "
+                    "AND origin IN (?, ?)",
+                    (*part, *self._origins(include_generated))
+                ).fetchall())
+        return found
+
+    def iter_personnes(self, include_generated=True, origin=None, source=None):
+        """Itère sur (nom, prénom, ref_ext) des personnes connues (d'une seule origine ou d'un seul fichier)"""
+        query = "SELECT nom, prenom, ref_ext FROM personnes WHERE origin IN (?, ?)"
+        params = list(self._origins(include_generated))
+        if origin:
+            query += " AND origin = ?"
+            params.append(origin)
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return rows
+
+    def fingerprint(self, origin=None):
+        """Empreinte de l'état de la base (change à chaque fichier intégré de cette origine)"""
+        h = hashlib.sha256(str(SCHEMA_VERSION).encode())
+        query = "SELECT source, size, mtime_ns, sha256 FROM imports"
+        params = ()
+        if origin:
+            query += " WHERE origin = ?"
+            params = (origin,)
+        with self._lock:
+            for row in self.conn.execute(query + " ORDER BY source", params):
+                h.update(repr(row).encode('utf-8'))
+        return h.hexdigest()
+
+    def count(self, table):
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+class BatchJournal:
+    """Journal JSONL (append-only) des extractions d'un lot, pour reprendre un traitement interrompu"""
+
+    def __init__(self, journal_path):
+        self.path = Path(journal_path)
+        self.completed = {}  # Map: {chemin PDF: annotation JSON}
+        self.errors = {}     # Map: {chemin PDF: dernière erreur}, pour les fichiers jamais extraits
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _key(pdf_file):
+        return str(Path(pdf_file).resolve())
+
+    def _load(self):
+        """Relit le journal ; la dernière entrée d'un fichier fait foi"""
+        content = self.path.read_text(encoding='utf-8')
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ligne tronquée par un arrêt brutal
+            if record.get('status') == 'ok':
+                self.completed[record['file']] = record['annotation']
+                self.errors.pop(record['file'], None)
+            else:
+                self.completed.pop(record.get('file'), None)
+                self.errors[record.get('file')] = record.get('error')
+
+        # Une ligne tronquée ne doit pas être prolongée par le prochain enregistrement
+        if content and not content.endswith('\n'):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+
+    def get_annotation(self, pdf_file):
+        """Retourne l'annotation déjà extraite pour ce PDF, ou None"""
+        return self.completed.get(self._key(pdf_file))
+
+    def record_success(self, pdf_file, annotation, method=None):
+        """method : chemin d'extraction suivi (lecture locale, cache ou OCR), pour la traçabilité"""
+        record = {'file': self._key(pdf_file), 'status': 'ok', 'annotation': annotation}
+        if method:
+            record['method'] = method
+        self._append(record)
+
+    def record_error(self, pdf_file, error):
+        self._append({'file': self._key(pdf_file), 'status': 'error', 'error': str(error)})
+
+    def _append(self, record):
+        record['at'] = datetime.now().isoformat(timespec='seconds')
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if record['status'] == 'ok':
+                self.completed[record['file']] = record['annotation']
+                self.errors.pop(record['file'], None)
+            else:
+                self.errors[record['file']] = record['error']
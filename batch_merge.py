@@ -0,0 +1,95 @@
+import re
+from collections import Counter
+from dataclasses import fields
+
+from text_normalize import compact
+
+
+def entreprise_key(entreprise):
+    """SIRET réduit à ses chiffres"""
+    return re.sub(r'\D', '', str(entreprise.siret or ''))
+
+
+def personne_key(stagiaire):
+    """NOM|PRÉNOM repliés (accents, tirets, espaces)"""
+    return f"{compact(stagiaire.nom)}|{compact(stagiaire.prenom)}"
+
+
+def fill_missing(target, other):
+    """Complète les champs vides de target avec ceux de other ; retourne le nombre de champs complétés"""
+    filled = 0
+    for f in fields(target):
+        if f.name in ('ref_ext', 'statuts'):
+            continue
+        if not getattr(target, f.name) and getattr(other, f.name):
+            setattr(target, f.name, getattr(other, f.name))
+            if f.name in other.statuts:
+                target.statuts[f.name] = other.statuts[f.name]
+            filled += 1
+    return filled
+
+
+class BatchMerger:
+    """Index des entités d'un lot : une entreprise par SIRET, un stagiaire par nom/prénom (et date de naissance)"""
+
+    def __init__(self):
+        self.entreprises = {}  # Map: {SIRET: Entreprise retenue}
+        self.personnes = {}    # Map: {NOM|PRÉNOM: [Inscription retenue, ...]} (homonymes nés à des dates différentes)
+        self.generated = set()  # SIRET dont la ligne entreprise a été retenue
+        self.stats = Counter()  # Lignes supprimées (entreprises, personnes) et champs complétés
+
+    def merge(self, entreprises, personnes):
+        """Retourne (entreprises, personnes) sans doublons, dans l'ordre des premières apparitions"""
+        unique_entreprises = [inscription for inscription in entreprises if self.add_entreprise(inscription)]
+        unique_personnes = [inscription for inscription in personnes if self.add_personne(inscription)]
+        return unique_entreprises, unique_personnes
+
+    def add_entreprise(self, inscription):
+        """Indexe une entreprise à générer ; retourne False si elle est déjà dans le lot (ligne à ne pas écrire)"""
+        key = entreprise_key(inscription.entreprise)
+        first = self._merge_entreprise(inscription)
+        # En flux, l'entreprise a pu être indexée par un stagiaire sans être générée (fiche incomplète) :
+        # sa première ligne entreprise est écrite, complétée par ce bulletin
+        if first or key not in self.generated:
+            self.generated.add(key)
+            return True
+        self.stats['entreprises'] += 1
+        return False
+
+    def add_personne(self, inscription):
+        """Indexe un stagiaire à générer ; retourne False s'il est déjà dans le lot (ligne à ne pas écrire)"""
+        # Tous les stagiaires d'une même entreprise pointent vers la même fiche (et la même ref_ext)
+        self._merge_entreprise(inscription)
+        if self._merge_personne(inscription):
+            return True
+        self.stats['personnes'] += 1
+        return False
+
+    def _merge_entreprise(self, inscription):
+        """Rattache l'inscription à l'entreprise déjà vue ; retourne True à la première apparition"""
+        key = entreprise_key(inscription.entreprise)
+        if not key:
+            return True
+        canonical = self.entreprises.get(key)
+        if canonical is None:
+            self.entreprises[key] = inscription.entreprise
+            return True
+        if canonical is not inscription.entreprise:
+            self.stats['champs_completes'] += fill_missing(canonical, inscription.entreprise)
+            inscription.entreprise = canonical
+        return False
+
+    def _merge_personne(self, inscription):
+        stg = inscription.stagiaire
+        sightings = self.personnes.setdefault(personne_key(stg), [])
+        for canonical in sightings:
+            dates = canonical.stagiaire.date_naissance, stg.date_naissance
+            if all(dates) and dates[0] != dates[1]:
+                continue
+            self.stats['champs_completes'] += fill_missing(canonical.stagiaire, stg)
+            # Une entreprise identifiée (SIRET) l'emporte sur une entreprise incomplète
+            if not entreprise_key(canonical.entreprise) and entreprise_key(inscription.entreprise):
+                canonical.entreprise = inscription.entreprise
+            return False
+        sightings.append(inscription)
+        return True
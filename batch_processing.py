@@ -0,0 +1,292 @@
+"""
+API de traitement par lot, utilisable sans la ligne de commande.
+
+    for file_result in process_batch(paths, client=client, existants=existants):
+        ...
+
+process_batch est un générateur : chaque PDF est rendu (inscriptions, décisions
+face aux existants, erreur, durée) dès que son extraction est terminée, avec un
+nombre borné de fichiers en cours, quelle que soit la taille du lot.
+"""
+
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from ammon_person_matcher import EXISTING, REVIEW, PersonMatch
+from batch_journal import BatchJournal
+from inscription_extractor import ENTREPRISE_KEYS, STAGIAIRE_KEYS, InscriptionExtractor
+from models import Inscription
+from run_metrics import RunMetrics
+from sirene_index import enrich_entreprise
+
+
+@dataclass
+class InscriptionDecision:
+    """Inscription extraite et décisions prises face aux existants Ammon"""
+    inscription: Inscription
+    source: str                              # Nom du PDF, avec la page pour un PDF multi-bulletins
+    entreprise_ref: Optional[str] = None     # Fiche entreprise existante (la ref_ext de l'inscription y pointe)
+    personne_ref: Optional[str] = None       # Fiche stagiaire existante (exacte ou approchée)
+    match: Optional[PersonMatch] = None      # Meilleur candidat de la recherche approchée
+    review: bool = False                     # Doublon possible, généré mais à vérifier
+    new_entreprise: bool = False             # Entreprise à générer
+    new_personne: bool = False               # Stagiaire à générer
+    anomalies: list = field(default_factory=list)  # (Fiche, Champ, Valeur, Statut) des fiches à générer
+
+
+@dataclass
+class FileResult:
+    """Résultat d'un PDF du lot"""
+    pdf_file: Path
+    decisions: list = field(default_factory=list)
+    error: Optional[Exception] = None
+    seconds: float = 0.0
+    method: Optional[str] = None  # form / text / cache / ocr / journal (mixed pour un PDF multi-bulletins)
+
+    @property
+    def inscriptions(self):
+        return [decision.inscription for decision in self.decisions]
+
+
+@dataclass
+class BatchResult:
+    """Inscriptions à générer pour un lot de PDFs"""
+    entreprises: list = field(default_factory=list)
+    personnes: list = field(default_factory=list)
+    to_review: list = field(default_factory=list)
+    to_check: list = field(default_factory=list)  # Champs non valides des fiches générées
+    failed: list = field(default_factory=list)
+
+    def extend(self, other):
+        self.entreprises += other.entreprises
+        self.personnes += other.personnes
+        self.to_review += other.to_review
+        self.to_check += other.to_check
+        self.failed += other.failed
+
+    def add_decision(self, decision):
+        if decision.new_entreprise:
+            self.entreprises.append(decision.inscription)
+        if decision.new_personne:
+            self.personnes.append(decision.inscription)
+        if decision.review:
+            self.to_review.append((decision.source, decision.inscription.stagiaire, decision.match))
+        self.to_check += [(decision.source, *anomaly) for anomaly in decision.anomalies]
+
+    def add(self, file_result):
+        if file_result.error:
+            self.failed.append(file_result.pdf_file)
+        for decision in file_result.decisions:
+            self.add_decision(decision)
+
+    @property
+    def has_data(self):
+        return bool(self.entreprises or self.personnes)
+
+
+def check_inscription(pdf_file, inscription, existants=None, refs=None, sirene=None):
+    """Compare l'inscription aux existants Ammon ; sans existants, tout est à générer
+
+    refs : (ref entreprise, ref stagiaire) déjà recherchées en bloc pour tout le lot (merge_journals)
+    sirene : SireneIndex qui vérifie le SIRET et complète la fiche entreprise
+    """
+    ent = inscription.entreprise
+    stg = inscription.stagiaire
+    name = Path(pdf_file).name
+    source = name if inscription.source_page is None else f"{name} (p. {inscription.source_page})"
+    decision = InscriptionDecision(inscription, source)
+
+    # --- 1. Entreprise ---
+    if sirene:
+        enrich_entreprise(ent, sirene)
+    if ent.is_valid:
+        if refs:
+            decision.entreprise_ref = refs[0]
+        elif existants:
+            decision.entreprise_ref = existants.get_existing_entreprise_ref(ent.siret)
+        if decision.entreprise_ref:
+            # Le stagiaire est rattaché à la fiche existante dans Ammon
+            ent.ref_ext = decision.entreprise_ref
+        else:
+            decision.new_entreprise = True
+
+    # --- 2. Stagiaire ---
+    if stg.is_valid:
+        if refs:
+            decision.personne_ref = refs[1]
+        elif existants:
+            decision.personne_ref = existants.get_existing_personne_ref(stg.nom, stg.prenom)
+        if not decision.personne_ref:
+            # Recherche approchée (accents, tirets, inversion nom/prénom, fautes d'OCR)
+            status, decision.match = existants.match_personne(stg.nom, stg.prenom) if existants else (None, None)
+            if status == EXISTING:
+                decision.personne_ref = decision.match.ref_ext
+            else:
+                decision.review = status == REVIEW
+                decision.new_personne = True
+
+    # --- 3. Champs à vérifier (fiches générées uniquement) ---
+    for fiche, record, keys, generated in (('Entreprise', ent, ENTREPRISE_KEYS, decision.new_entreprise),
+                                           ('Stagiaire', stg, STAGIAIRE_KEYS, decision.new_personne)):
+        if generated:
+            decision.anomalies += [(fiche, keys[name], getattr(record, name), statut)
+                                   for name, statut in record.anomalies.items()]
+    return decision
+
+
+def extract_file(pdf_file, journal=None, metrics=None, **extractor_options):
+    """Extrait les inscriptions d'un PDF (une seule, sauf PDF multi-bulletins) ; les erreurs sont rendues, pas levées"""
+    metrics = metrics or RunMetrics()
+    pdf_file = Path(pdf_file)
+    result = FileResult(pdf_file)
+    start = time.perf_counter()
+    try:
+        # Reprise : le fichier a déjà été extrait lors d'un lancement précédent
+        annotation = journal.get_annotation(pdf_file) if journal else None
+        if annotation is not None:
+            metrics.incr('journal_hits')
+            with metrics.stage('json_parsing'):
+                inscriptions = InscriptionExtractor.build_inscriptions(annotation, extractor_options.get('communes'))
+            result.method = 'journal'
+        else:
+            extractor = InscriptionExtractor(pdf_file, metrics=metrics, **extractor_options)
+            inscriptions = extractor.extract_all()
+            result.method = extractor.method
+            if journal:
+                journal.record_success(pdf_file, extractor.annotation, method=extractor.method)
+        result.decisions = [InscriptionDecision(inscription, pdf_file.name) for inscription in inscriptions]
+    except Exception as e:
+        metrics.incr('files_failed')
+        if journal:
+            journal.record_error(pdf_file, e)
+        result.error = e
+    finally:
+        result.seconds = time.perf_counter() - start
+        metrics.record_file(pdf_file.name, result.seconds)
+    return result
+
+
+def process_batch(paths, client=None, existants=None, journal=None, workers=4, metrics=None,
+                  ordered=True, window=None, sirene=None, **extractor_options):
+    """Extrait les PDFs en parallèle et rend un FileResult par fichier, dès qu'il est prêt
+
+    paths peut être un itérable paresseux : au plus `window` fichiers (2 × workers par défaut)
+    sont en cours à la fois. ordered=False rend les fichiers dans l'ordre où ils se terminent.
+    existants peut être None (aucune comparaison) ou un Future encore en cours de chargement :
+    les premiers appels OCR partent sans l'attendre. sirene (SireneIndex) vérifie les SIRET et
+    complète les fiches entreprises. Les autres options sont celles
+    d'InscriptionExtractor (scheduler, cache, optimizer, local...).
+    """
+    metrics = metrics or RunMetrics()
+    workers = max(1, workers)
+    window = max(1, window or 2 * workers)
+    paths = iter(paths)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extraction')
+    pending = deque()
+
+    def submit():
+        for pdf_file in paths:
+            pending.append(executor.submit(extract_file, pdf_file, journal, metrics, client=client, **extractor_options))
+            if len(pending) >= window:
+                return
+
+    try:
+        submit()
+        if isinstance(existants, Future):
+            with metrics.stage('existants_wait'):
+                existants = existants.result()
+
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                wait(pending, return_when=FIRST_COMPLETED)
+                future = next(f for f in pending if f.done())
+                pending.remove(future)
+            file_result = future.result()
+            submit()
+
+            if not file_result.error:
+                try:
+                    with metrics.stage('existants_lookup'):
+                        file_result.decisions = [check_inscription(file_result.pdf_file, decision.inscription, existants,
+                                                                   sirene=sirene)
+                                                 for decision in file_result.decisions]
+                except Exception as e:
+                    file_result.error = e
+            yield file_result
+    finally:
+        # Appelant interrompu (break, close) : les fichiers pas encore commencés sont abandonnés
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def shard_of(pdf_file, count):
+    """Numéro de shard (0 à count - 1) d'un PDF, stable d'une machine à l'autre (nom du fichier seul)"""
+    return zlib.crc32(Path(pdf_file).name.encode('utf-8')) % count
+
+
+def select_shard(paths, index, count):
+    """PDFs du shard index (0 à count - 1) parmi count"""
+    return [path for path in paths if shard_of(path, count) == index]
+
+
+def merge_journals(journal_paths, existants=None, metrics=None, sirene=None, communes=None):
+    """Relit les journaux des shards et rend un FileResult par PDF, dans un ordre indépendant des shards
+
+    Les PDFs sont triés par nom ; un PDF présent dans plusieurs journaux garde l'extraction
+    du dernier journal (par nom) qui l'a réussie. Les fichiers en erreur sont rendus avec leur erreur.
+    """
+    metrics = metrics or RunMetrics()
+    annotations, errors = {}, {}
+    for path in sorted(Path(p) for p in journal_paths):
+        journal = BatchJournal(path)
+        for file, error in journal.errors.items():
+            if file not in annotations:
+                errors[file] = error
+        for file, annotation in journal.completed.items():
+            annotations[file] = annotation
+            errors.pop(file, None)
+
+    results, inscriptions = [], {}
+    for file in sorted({**annotations, **errors}, key=lambda f: (Path(f).name, f)):
+        result = FileResult(Path(file), method='journal')
+        results.append(result)
+        if file in errors:
+            result.error = RuntimeError(errors[file])
+            continue
+        try:
+            with metrics.stage('json_parsing'):
+                inscriptions[file] = InscriptionExtractor.build_inscriptions(annotations[file], communes)
+        except Exception as e:
+            result.error = e
+
+    entreprise_refs, personne_refs = {}, {}
+    if existants:
+        # Une recherche groupée pour tous les SIRET et tous les stagiaires du lot
+        # (tous les SIRET : un nom manquant peut encore être complété par l'index SIRENE)
+        every = [inscription for batch in inscriptions.values() for inscription in batch]
+        with metrics.stage('existants_join'):
+            entreprise_refs = existants.get_existing_entreprise_refs(
+                {ins.entreprise.siret for ins in every if ins.entreprise.siret})
+            personne_refs = existants.get_existing_personne_refs(
+                {(ins.stagiaire.nom, ins.stagiaire.prenom) for ins in every if ins.stagiaire.nom and ins.stagiaire.prenom})
+
+    for result in results:
+        file = str(result.pdf_file)
+        if file in inscriptions:
+            try:
+                with metrics.stage('existants_lookup'):
+                    result.decisions = [
+                        check_inscription(file, ins, existants,
+                                          (entreprise_refs.get(ins.entreprise.siret),
+                                           personne_refs.get((ins.stagiaire.nom, ins.stagiaire.prenom))), sirene)
+                        for ins in inscriptions[file]]
+            except Exception as e:
+                result.error = e
+        yield result
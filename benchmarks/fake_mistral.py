@@ -0,0 +1,165 @@
+"""
+Faux serveur Mistral local pour les benchmarks : répond aux endpoints OCR et
+Files utilisés par InscriptionExtractor, sans clé API ni réseau.
+
+Les annotations renvoyées proviennent d'un fichier enregistré (liste de JSON
+document_annotation) ou sont générées ; la latence, les erreurs 500 et les
+réponses 429 sont configurables.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from synthetic import synthetic_annotation
+
+FILE_URL = re.compile(r'^/v1/files/([^/]+)(/url)?$')
+
+
+class FakeMistralServer(ThreadingHTTPServer):
+    """Serveur HTTP imitant /v1/ocr et /v1/files ; à utiliser comme context manager"""
+    daemon_threads = True
+
+    def __init__(self, annotations=None, latency_ms=(0, 0), error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, seed=0, annotation_options=None):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.annotations = annotations or []
+        self.annotation_options = annotation_options or {}  # Paramètres de synthetic_annotation
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self.first_request_at = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        """Charge des annotations enregistrées (liste JSON de chaînes ou d'objets)"""
+        recorded = json.loads(Path(path).read_text(encoding='utf-8'))
+        annotations = [a if isinstance(a, str) else json.dumps(a, ensure_ascii=False) for a in recorded]
+        return cls(annotations=annotations, **kwargs)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def next_outcome(self):
+        """Tire le sort de la prochaine requête OCR : (statut, latence en s, numéro de requête)"""
+        with self._lock:
+            if self.first_request_at is None:
+                self.first_request_at = time.perf_counter()
+            self.stats['ocr_requests'] += 1
+            number = self.stats['ocr_requests']
+            low, high = self.latency_ms
+            latency = self._random.uniform(low, high) / 1000
+            draw = self._random.random()
+        if draw < self.throttle_rate:
+            return 429, 0.0, number
+        if draw < self.throttle_rate + self.error_rate:
+            return 500, latency, number
+        return 200, latency, number
+
+    def annotation_for(self, number):
+        if self.annotations:
+            return self.annotations[(number - 1) % len(self.annotations)]
+        return json.dumps(synthetic_annotation(number, **self.annotation_options), ensure_ascii=False)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        with self.server._lock:
+            self.server.stats['bytes_received'] += len(body)
+        return body
+
+    def do_POST(self):
+        body = self._read_body()
+        server = self.server
+
+        if self.path == '/v1/files':
+            with server._lock:
+                server.stats['uploads'] += 1
+            self._send_json(200, {
+                "id": str(uuid.uuid4()), "object": "file", "bytes": len(body), "created_at": int(time.time()),
+                "filename": "bulletin.pdf", "purpose": "ocr", "sample_type": "ocr_input", "source": "upload",
+            })
+            return
+
+        if self.path != '/v1/ocr':
+            self._send_json(404, {"detail": "Not Found"})
+            return
+
+        status, latency, number = server.next_outcome()
+        if latency:
+            time.sleep(latency)
+        with server._lock:
+            server.stats[f'status_{status}'] += 1
+
+        if status == 429:
+            self._send_json(429, {"message": "Requests rate limit exceeded"},
+                            headers={'Retry-After': str(server.retry_after)})
+        elif status != 200:
+            self._send_json(status, {"message": "Service unavailable"})
+        else:
+            pages = json.loads(body or b'{}').get('pages') or [0]
+            self._send_json(200, {
+                "pages": [{"index": p, "markdown": "", "images": [], "dimensions": None} for p in pages],
+                "model": "mistral-ocr-latest",
+                "usage_info": {"pages_processed": len(pages), "doc_size_bytes": len(body)},
+                "document_annotation": server.annotation_for(number),
+            })
+
+    def do_GET(self):
+        match = FILE_URL.match(urlsplit(self.path).path)
+        if match and match.group(2):
+            self._send_json(200, {"url": f"{self.server.url}/files/{match.group(1)}"})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_DELETE(self):
+        match = FILE_URL.match(urlsplit(self.path).path)
+        if match and not match.group(2):
+            self._send_json(200, {"id": match.group(1), "object": "file", "deleted": True})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout du traitement d'un lot, sans appel à l'API Mistral.
+
+Génère des exports Ammon et des bulletins PDF synthétiques, démarre un faux
+serveur OCR local (latence, erreurs et 429 configurables) puis chronomètre
+chaque étape : chargement des existants, codes pays, extraction du lot par
+batch_processing.process_batch (OCR, construction des modèles, comparaison aux
+existants) et génération des fichiers d'import.
+
+Usage: python3 benchmarks/pipeline_bench.py [--pdfs 200] [--personnes 50000] [--output bench.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fake_mistral import FakeMistralServer  # noqa: E402
+from synthetic import write_exports, write_pdfs  # noqa: E402
+from run_metrics import RunMetrics, percentile  # noqa: E402
+
+
+class StageTimer:
+    """Chronomètre des étapes nommées (secondes, dans l'ordre d'exécution)"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 4)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark de bout en bout avec un faux serveur OCR local')
+    parser.add_argument('--pdfs', type=int, default=100, help='Nombre de bulletins PDF synthétiques')
+    parser.add_argument('--pages', type=int, default=1, help='Pages par PDF')
+    parser.add_argument('--scan-dpi', type=int, default=0, help='Ajoute une image scannée à cette résolution sur chaque page')
+    parser.add_argument('--digital-rate', type=float, default=0.0, help='Part des bulletins remplis sur ordinateur (lus sans OCR)')
+    parser.add_argument('--no-local', action='store_true', help='Envoie aussi les formulaires remplis à l\'OCR')
+    parser.add_argument('--entreprises', type=int, default=5000, help='Taille de l\'export VIE_ENTREPRISE')
+    parser.add_argument('--personnes', type=int, default=20000, help='Taille de l\'export VIE_PERSONNE')
+    parser.add_argument('--overlap', type=float, default=0.2, help='Part des bulletins désignant un existant')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='Appels OCR simultanés')
+    parser.add_argument('--max-workers', type=int, help='Plafond d\'appels OCR simultanés (défaut : --workers)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Nouveaux essais après une erreur transitoire ou un 429')
+    parser.add_argument('--no-retry', action='store_true', help='Appels OCR directs, sans ordonnanceur (ni retries ni AIMD)')
+    parser.add_argument('--latency-ms', type=float, nargs=2, default=(50, 150), metavar=('MIN', 'MAX'),
+                        help='Latence simulée de l\'OCR')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Part de réponses 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Part de réponses 429')
+    parser.add_argument('--annotations', help='Fichier JSON d\'annotations enregistrées à rejouer')
+    parser.add_argument('--format', '-f', choices=['xlsx', 'csv'], default='xlsx', help='Format des fichiers d\'import')
+    parser.add_argument('--stream', action='store_true', help='Génération Excel en flux')
+    parser.add_argument('--no-optimize', action='store_true', help='Envoie les PDFs sans les réduire')
+    parser.add_argument('--no-fuzzy', action='store_true', help='Sans recherche approchée des stagiaires')
+    parser.add_argument('--template', '-t', default=str(ROOT / 'Template_Import_Entreprises.xlsx'))
+    parser.add_argument('--workdir', help='Dossier de travail (conservé) ; temporaire par défaut')
+    parser.add_argument('--output', '-o', help='Fichier JSON de résultats (sinon affiché)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Affiche la sortie habituelle du traitement')
+    return parser
+
+
+def run(args, workdir):
+    # Imports du projet après la configuration de sys.path
+    import main
+    from ammon_code_pays import PaysCode
+    from ammon_existants_service import ExistantsService
+    from batch_processing import process_batch
+    from form_extractor import FormExtractor
+    from ocr_scheduler import OcrScheduler
+    from pdf_optimizer import PdfOptimizer
+
+    timer = StageTimer()
+    existants_dir = workdir / 'existants'
+    output_dir = workdir / 'output'
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with timer.stage('synthetic_exports'):
+        write_exports(existants_dir, args.entreprises, args.personnes)
+    annotation_options = dict(known_personnes=args.personnes, known_entreprises=args.entreprises, overlap=args.overlap)
+    with timer.stage('synthetic_pdfs'):
+        pdf_files = write_pdfs(workdir / 'input', args.pdfs, pages=args.pages, scan_dpi=args.scan_dpi,
+                               digital_rate=args.digital_rate, annotation_options=annotation_options)
+
+    server_options = dict(
+        latency_ms=tuple(args.latency_ms), error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        annotation_options=annotation_options,
+    )
+    if args.annotations:
+        server = FakeMistralServer.from_recording(args.annotations, **server_options)
+    else:
+        server = FakeMistralServer(**server_options)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with server, quiet:
+        os.environ['MISTRAL_API_KEY'] = 'bench'
+        os.environ['MISTRAL_SERVER_URL'] = server.url
+        with timer.stage('client'):
+            client = main.create_client()
+
+        existants_options = dict(generated_path=output_dir, fuzzy=not args.no_fuzzy)
+        with timer.stage('existants_load_cold'):
+            existants = ExistantsService(existants_dir, **existants_options)
+            if existants.fuzzy:
+                existants.warm_matcher()
+        with timer.stage('existants_load_warm'):
+            existants = ExistantsService(existants_dir, **existants_options)
+            if existants.fuzzy:
+                existants.warm_matcher()
+
+        pays_cache = workdir / 'cache' / 'pays_codes.json'
+        with timer.stage('pays_code_load_cold'):
+            PaysCode(template_path=args.template, cache_path=pays_cache)
+        with timer.stage('pays_code_load_warm'):
+            pays_code = PaysCode(template_path=args.template, cache_path=pays_cache)
+
+        metrics = RunMetrics()
+        optimizer = None if args.no_optimize else PdfOptimizer()
+        scheduler = None
+        workers = args.workers
+        if not args.no_retry:
+            scheduler = OcrScheduler(concurrency=args.workers, max_concurrency=max(args.workers, args.max_workers or args.workers),
+                                     max_retries=args.max_retries, metrics=metrics)
+            workers = scheduler.max_concurrency
+        local = None if args.no_local else FormExtractor()
+        methods = Counter()
+        failed = []
+
+        def observed(file_results):
+            for file_result in file_results:
+                methods[file_result.method or 'error'] += 1
+                if file_result.error:
+                    failed.append((file_result.pdf_file.name, repr(file_result.error)))
+                yield file_result
+
+        # Même chemin que main.py : extraction concurrente, modèles et comparaison aux existants
+        with timer.stage('extraction'):
+            file_results = process_batch(pdf_files, client=client, existants=existants, workers=workers,
+                                         metrics=metrics, optimizer=optimizer, scheduler=scheduler, local=local)
+            result = main.collect_results(observed(file_results))
+
+        generation_args = argparse.Namespace(quiet=True, format=args.format, stream=args.stream)
+        with timer.stage('generation'):
+            main.generate_imports(result, output_dir, datetime.now().strftime('%Y%m%d_%H%M%S'),
+                                  pays_code, existants, generation_args)
+
+    latencies = list(metrics.file_latencies.values())
+    pipeline = [name for name in timer.stages if not name.startswith('synthetic_') and not name.endswith('_warm')
+                and name != 'pays_code_load_cold']
+    total = sum(timer.stages[name] for name in pipeline)
+    return {
+        'revision': git_revision(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'workdir', 'verbose')},
+        'stages': timer.stages,
+        'extraction_stages': {name: round(seconds, 4) for name, seconds in metrics.stages.items()},
+        'total_s': round(total, 4),
+        'ocr': {
+            'files': len(pdf_files),
+            'failed': len(failed),
+            'errors': failed[:20],
+            'files_per_s': round(len(pdf_files) / timer.stages['extraction'], 2) if timer.stages['extraction'] else None,
+            'latency_p50_s': round(percentile(latencies, 50), 4) if latencies else None,
+            'latency_p95_s': round(percentile(latencies, 95), 4) if latencies else None,
+            'latency_mean_s': round(statistics.mean(latencies), 4) if latencies else None,
+            'bytes_sent': metrics.counters['bytes_sent'],
+            'paths': dict(methods),
+        },
+        'result': {
+            'entreprises': len(result.entreprises),
+            'personnes': len(result.personnes),
+            'to_review': len(result.to_review),
+        },
+        'scheduler': dict(metrics.counters, **metrics.gauges) if scheduler else None,
+        'server': dict(server.stats),
+    }
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.workdir:
+        workdir = Path(args.workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        results = run(args, workdir)
+    else:
+        with tempfile.TemporaryDirectory(prefix='ammon_bench_') as tmp:
+            results = run(args, Path(tmp))
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
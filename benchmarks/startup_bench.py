@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark de démarrage de la CLI : temps d'import, chemin d'erreur et délai
+jusqu'au premier appel OCR (vers un faux serveur Mistral local).
+
+Usage: python3 benchmarks/startup_bench.py [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Un PDF minimal d'une page (sans dépendance pour le générer)
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+class FirstRequestServer(ThreadingHTTPServer):
+    """Faux serveur OCR qui note l'instant de la première requête reçue"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.first_request_at = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.server.first_request_at is None:
+            self.server.first_request_at = time.perf_counter()
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            "pages": [{"index": 0, "markdown": "", "images": [], "dimensions": None}],
+            "model": "mistral-ocr-latest",
+            "usage_info": {"pages_processed": 1, "doc_size_bytes": len(MINIMAL_PDF)},
+            "document_annotation": json.dumps({"Nom du stagiaire": "BENCH", "Prénom du stagiaire": "Test"}),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _run(cmd, cwd, env=None):
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return start, time.perf_counter()
+
+
+def measure_import(runs):
+    """Temps d'un `import main` à froid (processus neuf)"""
+    times = []
+    for _ in range(runs):
+        start, end = _run([sys.executable, '-c', 'import main'], cwd=ROOT)
+        times.append(end - start)
+    return times
+
+
+def measure_error_path(runs):
+    """Temps d'un lancement qui échoue immédiatement (chemin inexistant)"""
+    times = []
+    for _ in range(runs):
+        start, end = _run([sys.executable, str(ROOT / 'main.py'), '-i', '/chemin/inexistant'], cwd=ROOT)
+        times.append(end - start)
+    return times
+
+
+def measure_first_request(runs):
+    """Délai entre le lancement et la première requête OCR reçue, pour un seul PDF"""
+    times = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            (tmp / 'bulletin.pdf').write_bytes(MINIMAL_PDF)
+            server = FirstRequestServer()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            env = dict(os.environ, MISTRAL_API_KEY='bench', MISTRAL_SERVER_URL=server.url)
+            cmd = [
+                sys.executable, str(ROOT / 'main.py'), '-i', str(tmp / 'bulletin.pdf'), '-o', str(tmp / 'out'),
+                '-t', str(ROOT / 'Template_Import_Entreprises.xlsx'), '--no-cache', '--no-fuzzy', '-q',
+            ]
+            # Dossier de travail temporaire : pas d'existants ni de cache partagés
+            start, _ = _run(cmd, cwd=tmp, env=env)
+            server.shutdown()
+            if server.first_request_at is not None:
+                times.append(server.first_request_at - start)
+    return times
+
+
+def summarize(times):
+    if not times:
+        return None
+    return {
+        'runs': len(times),
+        'median_s': round(statistics.median(times), 4),
+        'min_s': round(min(times), 4),
+        'max_s': round(max(times), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de démarrage de main.py')
+    parser.add_argument('--runs', type=int, default=5, help='Nombre de lancements par mesure')
+    parser.add_argument('--output', help='Fichier JSON de résultats (sinon affiché)')
+    args = parser.parse_args()
+
+    results = {
+        'python': sys.version.split()[0],
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'import_main': summarize(measure_import(args.runs)),
+        'error_path': summarize(measure_error_path(args.runs)),
+        'time_to_first_request': summarize(measure_first_request(args.runs)),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Données synthétiques pour les benchmarks : bulletins PDF, exports Ammon
+VIE_ENTREPRISE / VIE_PERSONNE et annotations OCR correspondantes.
+
+Tout est déterministe : la personne n° i et l'entreprise n° j sont les mêmes
+d'un lancement à l'autre, ce qui permet de provoquer des « existants » connus.
+"""
+
+import random
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+NOMS = [
+    'MARTIN', 'BERNARD', 'THOMAS', 'PETIT', 'ROBERT', 'RICHARD', 'DURAND', 'DUBOIS', 'MOREAU', 'LAURENT',
+    'SIMON', 'MICHEL', 'LEFEBVRE', 'LEROY', 'ROUX', 'DAVID', 'BERTRAND', 'MOREL', 'FOURNIER', 'GIRARD',
+    'BONNET', 'DUPONT', 'LAMBERT', 'FONTAINE', 'ROUSSEAU', 'VINCENT', 'MULLER', 'LEFEVRE', 'FAURE', 'ANDRE',
+    'MERCIER', 'BLANC', 'GUERIN', 'BOYER', 'GARNIER', 'CHEVALIER', 'FRANCOIS', 'LEGRAND', 'GAUTHIER', 'GARCIA',
+]
+PRENOMS = [
+    'Marie', 'Jean', 'Pierre', 'Michel', 'André', 'Philippe', 'Nathalie', 'Isabelle', 'Sylvie', 'Catherine',
+    'Lucas', 'Léa', 'Hugo', 'Chloé', 'Louis', 'Emma', 'Gabriel', 'Manon', 'Arthur', 'Camille',
+    'Jules', 'Inès', 'Adam', 'Sarah', 'Raphaël', 'Jade', 'Nathan', 'Louise', 'Théo', 'Zoé',
+    'Tom', 'Lina', 'Noah', 'Alice', 'Ethan', 'Anaïs', 'Paul', 'Clara', 'Mathis', 'Julie',
+]
+VILLES = [('75001', 'Paris'), ('69001', 'Lyon'), ('13001', 'Marseille'), ('31000', 'Toulouse'), ('33000', 'Bordeaux'),
+          ('59000', 'Lille'), ('44000', 'Nantes'), ('67000', 'Strasbourg'), ('35000', 'Rennes'), ('97400', 'Saint-Denis')]
+PAYS = ['France'] * 17 + ['Belgique', 'Suisse', 'Maroc']
+
+
+def _luhn_complete(prefix):
+    """Ajoute le chiffre de contrôle de Luhn (SIREN / SIRET valides)"""
+    total = 0
+    for i, digit in enumerate(reversed(prefix)):
+        d = int(digit) * (2 if i % 2 == 0 else 1)
+        total += d - 9 if d > 9 else d
+    return prefix + str((10 - total % 10) % 10)
+
+
+def synthetic_person(i):
+    """Personne n° i : (nom, prénom), unique jusqu'à 64 000 personnes"""
+    nom = NOMS[i % len(NOMS)]
+    prenom = PRENOMS[(i // len(NOMS)) % len(PRENOMS)]
+    tour = i // (len(NOMS) * len(PRENOMS))
+    if tour:
+        nom = f"{nom}-{NOMS[tour % len(NOMS)]}"
+    return nom, prenom
+
+
+def synthetic_siret(j):
+    siren = _luhn_complete(f"{30000000 + j:08d}")
+    return _luhn_complete(f"{siren}{j % 10000:04d}")
+
+
+def synthetic_entreprise(j):
+    """Entreprise n° j : (raison sociale, SIRET)"""
+    return f"BOULANGERIE {NOMS[j % len(NOMS)]} {j}", synthetic_siret(j)
+
+
+def synthetic_annotation(number, known_personnes=0, known_entreprises=0, overlap=0.0):
+    """Annotation OCR du bulletin n° number ; une part `overlap` désigne des existants"""
+    rng = random.Random(number)
+    if known_personnes and rng.random() < overlap:
+        nom, prenom = synthetic_person(rng.randrange(known_personnes))
+    else:
+        nom, prenom = synthetic_person(known_personnes + number)
+    if known_entreprises and rng.random() < overlap:
+        entreprise, siret = synthetic_entreprise(rng.randrange(known_entreprises))
+    else:
+        entreprise, siret = synthetic_entreprise(known_entreprises + number)
+    cp, ville = rng.choice(VILLES)
+    cp_ent, ville_ent = rng.choice(VILLES)
+    return {
+        "Civilité": rng.choice(['M.', 'Mme']),
+        "Nom du stagiaire": nom,
+        "Prénom du stagiaire": prenom,
+        "Adresse du stagiaire": f"{rng.randint(1, 120)} rue de la Paix",
+        "Code postal du stagiaire": cp,
+        "Ville du stagiaire": ville,
+        "Pays du stagiaire": rng.choice(PAYS),
+        "Portable du stagiaire": f"06 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "Email du stagiaire": f"{prenom.lower()}.{nom.lower()}@example.fr",
+        "Date de naissance": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1970, 2008)}",
+        "nom de l'entreprise": entreprise,
+        "adresse de l'entreprise": f"{rng.randint(1, 120)} avenue du Pain",
+        "Code postal": cp_ent,
+        "Ville": ville_ent,
+        "Pays": 'France',
+        "Date d'entrée dans l'entreprise": f"01/{rng.randint(1, 12):02d}/2024",
+        "Tél": f"04 {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "N° de SIRET": f"{siret[:3]} {siret[3:6]} {siret[6:9]} {siret[9:]}",
+        "Code NAFA": '1071C',
+        "Email": f"contact{number}@example.fr",
+    }
+
+
+@lru_cache(maxsize=None)
+def _scan_image(dpi):
+    """Image JPEG « scannée » d'une page A4 à la résolution demandée"""
+    from PIL import Image, ImageDraw
+
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(dpi)
+    for y in range(dpi, height - dpi, max(1, dpi // 4)):
+        x = dpi
+        while x < width - dpi:
+            w = rng.randint(dpi // 10, dpi // 2)
+            draw.rectangle([x, y, x + w, y + max(1, dpi // 12)], fill=(20, 20, 40))
+            x += w + dpi // 8
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=85)
+    return width, height, output.getvalue()
+
+
+def _pdf_string(text):
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b"(" + escaped.encode('cp1252', errors='replace') + b")"
+
+
+def make_pdf(number, pages=1, scan_dpi=0, filled=None):
+    """PDF A4 de `pages` pages ; avec scan_dpi, chaque page porte une image scannée.
+
+    filled (dict libellé → valeur) produit un formulaire rempli sur ordinateur :
+    champs AcroForm et lignes « Libellé : valeur » sur la première page.
+    """
+    objects = [b"<</Type/Catalog/Pages 2 0 R>>", None]
+    kids = []
+    image_ref = None
+    if scan_dpi:
+        width, height, jpeg = _scan_image(scan_dpi)
+        objects.append(
+            b"<</Type/XObject/Subtype/Image/Width %d/Height %d/ColorSpace/DeviceRGB/BitsPerComponent 8"
+            b"/Filter/DCTDecode/Length %d>>stream\n" % (width, height, len(jpeg)) + jpeg + b"\nendstream"
+        )
+        image_ref = len(objects)
+    objects.append(b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>>")
+    font_ref = len(objects)
+
+    for page in range(pages):
+        content = b"BT /F1 14 Tf 72 770 Td (Bulletin d'inscription %d - page %d) Tj" % (number, page + 1)
+        if filled and page == 0:
+            content += b" /F1 10 Tf"
+            for label, value in filled.items():
+                content += b" 0 -18 Td " + _pdf_string(f"{label} : {value}") + b" Tj"
+        content += b" ET"
+        if image_ref:
+            content = b"q 595 0 0 842 0 0 cm /Im0 Do Q " + content
+        objects.append(b"<</Length %d>>stream\n" % len(content) + content + b"\nendstream")
+        resources = b"/Font<</F1 %d 0 R>>" % font_ref
+        if image_ref:
+            resources += b"/XObject<</Im0 %d 0 R>>" % image_ref
+        objects.append(b"<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]/Resources<<%s>>/Contents %d 0 R>>"
+                       % (resources, len(objects)))
+        kids.append(len(objects))
+
+    if filled:
+        fields = []
+        for label, value in filled.items():
+            objects.append(b"<</FT/Tx/Subtype/Widget/Rect[0 0 0 0]/P %d 0 R/T%s/V%s>>"
+                           % (kids[0], _pdf_string(label), _pdf_string(value)))
+            fields.append(len(objects))
+        objects[0] = b"<</Type/Catalog/Pages 2 0 R/AcroForm<</Fields[%s]>>>>" % b" ".join(b"%d 0 R" % f for f in fields)
+    objects[1] = b"<</Type/Pages/Kids[%s]/Count %d>>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    output = BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for index, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % index + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return output.getvalue()
+
+
+def write_pdfs(folder, count, pages=1, scan_dpi=0, digital_rate=0.0, annotation_options=None):
+    """Écrit `count` bulletins dans folder (une part `digital_rate` remplis sur ordinateur) ; retourne les chemins"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(count)
+    paths = []
+    for number in range(1, count + 1):
+        path = folder / f"bulletin_{number:05d}.pdf"
+        filled = None
+        if digital_rate and rng.random() < digital_rate:
+            filled = synthetic_annotation(number, **(annotation_options or {}))
+        path.write_bytes(make_pdf(number, pages=pages, scan_dpi=scan_dpi, filled=filled))
+        paths.append(path)
+    return paths
+
+
+def _write_sheet(path, header, rows):
+    """Exports Ammon : classeur Excel nommé .xls (pandas détecte le format réel)"""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    with open(path, 'wb') as f:
+        wb.save(f)
+
+
+def write_exports(folder, entreprises, personnes, export_id=1):
+    """Écrit un export VIE_ENTREPRISE et un export VIE_PERSONNE de la taille demandée"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    _write_sheet(
+        folder / f"{export_id}-VIE_ENTREPRISE.xls",
+        ['cRefExt', 'SOC_cRaisonSociale', 'SOC_cSIRET', 'ADR_cVille'],
+        ([f"SOC{j:06d}", *synthetic_entreprise(j), VILLES[j % len(VILLES)][1]] for j in range(entreprises)),
+    )
+    _write_sheet(
+        folder / f"{export_id}-VIE_PERSONNE.xls",
+        ['cRefExt', 'PER_cNom', 'PER_cPrenom', 'SOC_cRefExt'],
+        ([f"PER{i:06d}", *synthetic_person(i), f"SOC{i % max(1, entreprises):06d}"] for i in range(personnes)),
+    )
@@ -0,0 +1,238 @@
+import csv
+import os
+import pickle
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from field_validation import CORRECTED, ENRICHED, FRANCE, INVALID, UNKNOWN
+from text_normalize import fold
+
+# Incrémenter si la structure de l'index compilé change
+CACHE_VERSION = 1
+
+# Abréviations de la Base officielle des codes postaux (libellés en majuscules sans accents)
+ABBREVIATIONS = {'SAINT': 'ST', 'SAINTE': 'STE'}
+# Mentions postales sans rapport avec la commune : CEDEX 08, CS 12345, BP 7...
+POSTAL_NOISE = re.compile(r'\b(CEDEX|CS|BP|TSA)\b(\s*\d+)?')
+
+
+def commune_key(name) -> str:
+    """Nom de commune replié, sans mentions CEDEX/BP, abréviations de la Poste (SAINT -> ST)"""
+    text = POSTAL_NOISE.sub(' ', fold(name))
+    return ' '.join(ABBREVIATIONS.get(token, token) for token in text.split() if not token.isdigit())
+
+
+def _trigrams(text: str):
+    text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _one_digit_apart(a, b):
+    return len(a) == len(b) and sum(x != y for x, y in zip(a, b)) == 1
+
+
+class CommuneIndex:
+    """Index en mémoire de la Base officielle des codes postaux (La Poste / data.gouv.fr)
+
+    Recherche exacte par code postal, par préfixe de nom de commune (liste triée),
+    et correction approchée des noms (trigrammes, puis similarité).
+    """
+
+    # Similarité minimale pour corriger un nom de commune mal lu
+    MATCH_THRESHOLD = 0.80
+    # Au-delà, le memo est vidé (mode service)
+    MAX_MEMO = 100_000
+    # Un trigramme partagé par trop de communes (" ST", "LES"...) n'est pas discriminant
+    MAX_TRIGRAM_POSTINGS = 1000
+
+    def __init__(self, rows):
+        """rows : itérable de (code postal, nom de la commune, libellé d'acheminement, ligne 5)"""
+        self.by_postcode = defaultdict(dict)  # {code postal: {clé de nom: libellé d'acheminement}}
+        self.by_name = defaultdict(dict)      # {clé de nom: {code postal: libellé d'acheminement}}
+        for code_postal, nom, libelle, ligne_5 in rows:
+            code_postal = re.sub(r'\s', '', code_postal).zfill(5)
+            libelle = ' '.join(str(libelle or nom).upper().split())
+            for name in (nom, libelle, ligne_5):
+                key = commune_key(name)
+                if key:
+                    self.by_postcode[code_postal].setdefault(key, libelle)
+                    self.by_name[key].setdefault(code_postal, libelle)
+        self.by_postcode = dict(self.by_postcode)
+        self.by_name = dict(self.by_name)
+        self.names = sorted(self.by_name)  # Recherche par préfixe (dichotomie)
+        self.trigrams = defaultdict(list)
+        for key in self.names:
+            for gram in _trigrams(key):
+                self.trigrams[gram].append(key)
+        self.trigrams = dict(self.trigrams)
+        self._memo = {}  # {(code postal, ville, pays) brut: résultat} pour les adresses répétées d'un lot
+
+    @classmethod
+    def load(cls, csv_path, cache_path="./cache/communes.pkl"):
+        """Charge l'index compilé, ou le reconstruit depuis le CSV de la Poste s'il a changé"""
+        csv_path = Path(csv_path)
+        st = csv_path.stat()
+        signature = [CACHE_VERSION, str(csv_path.resolve()), st.st_size, st.st_mtime_ns]
+        cache_path = Path(cache_path) if cache_path else None
+        if cache_path:
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get('signature') == signature:
+                    return cached['index']
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                pass
+
+        index = cls(cls.read_csv(csv_path))
+        if cache_path:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = cache_path.with_suffix('.tmp')
+                with open(tmp, 'wb') as f:
+                    pickle.dump({'signature': signature, 'index': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache_path)
+            except OSError as e:
+                print(f"⚠️ Index des communes non enregistré: {e}")
+        return index
+
+    @staticmethod
+    def read_csv(csv_path):
+        """Lignes (code postal, commune, libellé d'acheminement, ligne 5) du fichier de la Poste (; ou ,)"""
+        raw = Path(csv_path).read_bytes()
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            text = raw.decode('latin-1')
+        lines = text.splitlines()
+        reader = csv.reader(lines, delimiter=';' if lines and lines[0].count(';') >= lines[0].count(',') else ',')
+        header = [fold(name) for name in next(reader, [])]
+
+        def column(*words):
+            return next((i for i, name in enumerate(header) if all(word in name for word in words)), None)
+
+        code_postal, nom = column('POSTAL'), column('NOM')
+        libelle, ligne_5 = column('ACHEMINEMENT'), column('LIGNE')
+        if code_postal is None or nom is None:
+            raise ValueError(f"{csv_path}: colonnes code postal / nom de la commune introuvables")
+        for row in reader:
+            if len(row) > max(code_postal, nom):
+                yield (row[code_postal], row[nom],
+                       row[libelle] if libelle is not None else '',
+                       row[ligne_5] if ligne_5 is not None and len(row) > ligne_5 else '')
+
+    def __len__(self):
+        return len(self.by_name)
+
+    # --- Recherches ---
+
+    def communes(self, code_postal):
+        """Libellés d'acheminement du code postal"""
+        return sorted(set(self.by_postcode.get(re.sub(r'\s', '', str(code_postal or '')), {}).values()))
+
+    def search(self, prefix, limit=20):
+        """Communes dont le nom commence par prefix : [(clé, {code postal: libellé})]"""
+        prefix = commune_key(prefix)
+        if not prefix:
+            return []
+        found = []
+        for key in self.names[bisect_left(self.names, prefix):]:
+            if not key.startswith(prefix) or len(found) >= limit:
+                break
+            found.append((key, self.by_name[key]))
+        return found
+
+    def closest(self, name, keys=None):
+        """Nom connu le plus proche (clé), parmi keys ou toutes les communes ; None sous le seuil"""
+        key = commune_key(name)
+        if not key:
+            return None
+        if keys is None:
+            # Blocage : seuls les noms partageant le plus de trigrammes sont comparés
+            postings = [self.trigrams.get(gram, ()) for gram in _trigrams(key)]
+            rare = [keys for keys in postings if len(keys) <= self.MAX_TRIGRAM_POSTINGS]
+            counts = Counter()
+            for keys in rare or postings:
+                counts.update(keys)
+            keys = [candidate for candidate, _ in counts.most_common(30)]
+        best, best_score = None, self.MATCH_THRESHOLD
+        for candidate in keys:
+            matcher = SequenceMatcher(None, key, candidate)
+            if matcher.real_quick_ratio() >= best_score and matcher.quick_ratio() >= best_score:
+                score = matcher.ratio()
+                if score >= best_score:
+                    best, best_score = candidate, score
+        return best
+
+    # --- Normalisation d'une adresse ---
+
+    def normalize(self, code_postal, ville, pays=''):
+        """Code postal et ville normalisés : (code postal, ville, {attribut: statut}) ; None hors de France
+
+        Le statut est corrigé (valeur changée), complété (champ vide rempli) ou inconnu
+        (commune introuvable) ; une ville seulement réécrite (casse, CEDEX) n'a pas de statut.
+        Un code CEDEX garde sa mention CEDEX dans la ville, pour que le couple reste cohérent.
+        """
+        memo_key = (code_postal, ville, pays)
+        # Une seule lecture : un autre thread d'extraction peut vider le memo entre-temps
+        result = self._memo.get(memo_key)
+        if result is None and memo_key not in self._memo:
+            result = self._normalize(*memo_key)
+            if len(self._memo) >= self.MAX_MEMO:
+                self._memo.clear()
+            self._memo[memo_key] = result
+        return result
+
+    def _normalize(self, code_postal, ville, pays):
+        if fold(pays) not in FRANCE:
+            return None
+        code_postal = str(code_postal or '').strip()
+        ville = str(ville or '').strip()
+        digits = re.sub(r'\s', '', code_postal)
+        key = commune_key(ville)
+        cedex = ' '.join(m.group(0) for m in POSTAL_NOISE.finditer(fold(ville)))
+        statuts = {}
+
+        communes = self.by_postcode.get(digits)
+        if communes:
+            if not key:
+                labels = set(communes.values())
+                if len(labels) == 1:
+                    statuts['ville'] = ENRICHED
+                    return digits, labels.pop(), statuts
+                return digits, ville, statuts
+            match = key if key in communes else self.closest(key, communes)
+            if match:
+                if match != key:
+                    statuts['ville'] = CORRECTED
+                return digits, communes[match], statuts
+
+        # Code postal inconnu, ou commune absente de ce code postal : on part du nom
+        match = key if key in self.by_name else self.closest(key) if key else None
+        if match is None:
+            if key:
+                statuts['ville'] = UNKNOWN
+            return code_postal, ville, statuts
+        if match != key:
+            statuts['ville'] = CORRECTED
+        postcodes = self.by_name[match]
+        candidates = ([digits] if digits in postcodes else
+                      [] if cedex else  # Code CEDEX : absent de la base, mais pas mal lu pour autant
+                      [cp for cp in postcodes if _one_digit_apart(cp, digits)] if digits else list(postcodes))
+        if not candidates and len(postcodes) == 1 and not re.fullmatch(r'\d{5}', digits):
+            # Code postal mal formé (chiffre manquant...) d'une commune à code postal unique
+            candidates = list(postcodes)
+        if len(candidates) == 1:
+            if candidates[0] != digits:
+                statuts['code_postal'] = CORRECTED if digits else ENRICHED
+            return candidates[0], postcodes[candidates[0]], statuts
+        if communes:
+            # Code postal existant mais d'une autre commune
+            statuts['code_postal'] = INVALID
+        # Plusieurs codes postaux possibles (ou aucun proche) : le code postal est laissé tel quel
+        if len(set(postcodes.values())) != 1:
+            return code_postal, ville, statuts
+        label = postcodes[min(postcodes)]
+        return code_postal, f"{label} {cedex}" if cedex else label, statuts
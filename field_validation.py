@@ -0,0 +1,102 @@
+import re
+from datetime import date, datetime, timedelta
+
+from text_normalize import fold
+
+# Statut d'un champ contrôlé, reporté dans Champs_a_verifier_<horodatage>.csv
+OK, MISSING, INVALID, CORRECTED = 'ok', 'manquant', 'invalide', 'corrigé'
+# Statuts posés par l'index SIRENE (sirene_index.py)
+ENRICHED, UNKNOWN, CLOSED = 'complété', 'inconnu', 'fermé'
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$')
+DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %m %Y', '%Y-%m-%d')
+FRANCE = {'', 'FRANCE', 'FR', 'FRA', 'FRANCAISE', 'FRANCAIS'}
+
+
+def luhn_valid(digits):
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        n = int(char) * (2 if i % 2 else 1)
+        total += n - 9 if n > 9 else n
+    return total % 10 == 0
+
+
+def check_siret(value):
+    """SIRET à 14 chiffres dont la clé de Luhn est correcte ; retourne les chiffres, ou None"""
+    digits = re.sub(r'[\s.\-]', '', str(value))
+    if not re.fullmatch(r'\d{14}', digits):
+        return None
+    # Les établissements de La Poste suivent une règle propre (somme des chiffres multiple de 5)
+    if digits.startswith('356000000'):
+        return digits if sum(map(int, digits)) % 5 == 0 else None
+    return digits if luhn_valid(digits) else None
+
+
+def check_code_postal(value, pays=''):
+    """Code postal français à 5 chiffres ; laissé tel quel pour une adresse à l'étranger"""
+    if fold(pays) not in FRANCE:
+        return str(value).strip()
+    digits = re.sub(r'\s', '', str(value))
+    return digits if re.fullmatch(r'\d{5}', digits) else None
+
+
+def check_date(value, future_years=0):
+    """Date après 1900 et au plus future_years ans après aujourd'hui, ramenée au format JJ/MM/AAAA"""
+    text = re.sub(r'\s*([/.\-])\s*', r'\1', str(value).strip())
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+        if date(1900, 1, 1) <= parsed <= date.today() + timedelta(days=366 * future_years):
+            return parsed.strftime('%d/%m/%Y')
+        return None
+    return None
+
+
+def check_date_entree(value):
+    """Date d'entrée en formation : souvent à venir sur un bulletin d'inscription (jusqu'à 3 ans)"""
+    return check_date(value, future_years=3)
+
+
+def check_email(value):
+    value = str(value).strip()
+    return value if EMAIL.match(value) else None
+
+
+def check_telephone(value):
+    """Numéro français à 10 chiffres (ou +33), ou numéro international en +"""
+    value = str(value).strip()
+    digits = re.sub(r'\D', '', value)
+    if value.startswith('+') or value.startswith('00'):
+        digits = digits[2:] if value.startswith('00') else digits
+        if digits.startswith('33'):
+            return value if len(digits) == 11 else None
+        return value if 8 <= len(digits) <= 15 else None
+    return value if len(digits) == 10 and digits.startswith('0') else None
+
+
+def validate_fields(record, checks, required=()):
+    """Contrôle les champs d'une fiche et normalise les valeurs valides ; retourne {attribut: statut}
+
+    checks : {attribut: validateur(valeur) -> valeur normalisée ou None}
+    required : attributs qui ne doivent pas rester vides (les autres champs vides ne sont pas signalés)
+    """
+    statuts = {}
+    for name in dict.fromkeys([*required, *checks]):
+        value = getattr(record, name)
+        if not str(value or '').strip():
+            if name in required:
+                statuts[name] = MISSING
+            continue
+        validator = checks.get(name)
+        if validator is None:
+            statuts[name] = OK
+            continue
+        normalized = validator(value)
+        if normalized is None:
+            statuts[name] = INVALID
+        else:
+            setattr(record, name, normalized)
+            statuts[name] = OK
+    return statuts
@@ -0,0 +1,98 @@
+import threading
+import time
+from pathlib import Path
+
+
+class FolderWatcher:
+    """Surveille un dossier et signale les PDFs dont l'écriture est terminée"""
+
+    def __init__(self, folder_path, settle_seconds=2.0, poll_interval=1.0):
+        self.folder_path = Path(folder_path)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self._pending = {}     # Map: {chemin: (taille, mtime, instant de la dernière modification)}
+        self._seen = set()     # Fichiers déjà signalés
+        self._wakeup = threading.Event()
+        self._observer = None
+
+    @property
+    def mode(self):
+        return 'événements' if self._observer else 'scrutation'
+
+    def start(self):
+        self.folder_path.mkdir(parents=True, exist_ok=True)
+        try:
+            # FSEvents (Mac) / inotify (Linux) si watchdog est installé
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            Observer = None
+        if Observer is not None:
+            try:
+                handler = FileSystemEventHandler()
+                handler.on_any_event = lambda event: self._wakeup.set()
+                self._observer = Observer()
+                self._observer.schedule(handler, str(self.folder_path), recursive=False)
+                self._observer.start()
+            except Exception:
+                self._observer = None
+        # Les PDFs déjà présents sont traités au démarrage
+        self._wakeup.set()
+
+    def stop(self):
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+
+    def forget(self, path):
+        """Autorise un nouveau signalement (fichier remplacé par une nouvelle version)"""
+        self._seen.discard(Path(path))
+
+    def _scan(self):
+        now = time.monotonic()
+        present = set()
+        for path in self.folder_path.glob('*.pdf'):
+            if path.name.startswith('.') or path in self._seen:
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            present.add(path)
+            signature = (st.st_size, st.st_mtime_ns)
+            previous = self._pending.get(path)
+            if previous is None or previous[:2] != signature:
+                self._pending[path] = (*signature, now)
+
+        # Fichiers disparus avant d'être stables
+        for path in list(self._pending):
+            if path not in present:
+                del self._pending[path]
+
+    def wait_ready(self, timeout):
+        """Attend au plus `timeout` secondes et retourne les PDFs stables depuis settle_seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._scan()
+            now = time.monotonic()
+            ready = sorted(
+                path for path, (size, _, changed_at) in self._pending.items()
+                if size > 0 and now - changed_at >= self.settle_seconds
+            )
+            if ready:
+                for path in ready:
+                    del self._pending[path]
+                    self._seen.add(path)
+                return ready
+
+            remaining = deadline - now
+            if remaining <= 0:
+                return []
+            # En scrutation (ou fichier en cours de copie) on revérifie régulièrement ;
+            # avec les événements système, on dort jusqu'à la prochaine modification
+            if self._pending or not self._observer:
+                wait = min(remaining, self.poll_interval)
+            else:
+                wait = remaining
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
@@ -0,0 +1,133 @@
+import json
+import re
+from io import BytesIO
+
+from text_normalize import fold
+
+# Clés du JSON document_annotation lues par InscriptionExtractor.build_inscription
+STG, ENT = 'stagiaire', 'entreprise'
+TARGETS = {
+    'CIVILITE': {STG: "Civilité"},
+    'NOM': {STG: "Nom du stagiaire", ENT: "nom de l'entreprise"},
+    'RAISON SOCIALE': {ENT: "nom de l'entreprise"},
+    'PRENOM': {STG: "Prénom du stagiaire"},
+    'ADRESSE': {STG: "Adresse du stagiaire", ENT: "adresse de l'entreprise"},
+    'CODE POSTAL': {STG: "Code postal du stagiaire", ENT: "Code postal"},
+    'VILLE': {STG: "Ville du stagiaire", ENT: "Ville"},
+    'PAYS': {STG: "Pays du stagiaire", ENT: "Pays"},
+    'PORTABLE': {STG: "Portable du stagiaire"},
+    'EMAIL': {STG: "Email du stagiaire", ENT: "Email"},
+    'DATE NAISSANCE': {STG: "Date de naissance"},
+    'DATE ENTREE': {ENT: "Date d'entrée dans l'entreprise"},
+    'TEL': {ENT: "Tél"},
+    'SIRET': {ENT: "N° de SIRET"},
+    'CODE NAFA': {ENT: "Code NAFA"},
+}
+# Variantes de libellés rencontrées sur les bulletins et dans les noms de champs
+SYNONYMS = {
+    'CP': 'CODE POSTAL', 'COMMUNE': 'VILLE', 'E MAIL': 'EMAIL', 'MAIL': 'EMAIL', 'COURRIEL': 'EMAIL',
+    'MOBILE': 'PORTABLE', 'TEL PORTABLE': 'PORTABLE', 'TELEPHONE PORTABLE': 'PORTABLE',
+    'TELEPHONE': 'TEL', 'DATE ENTREE DANS': 'DATE ENTREE', 'NUMERO SIRET': 'SIRET',
+    'NAFA': 'CODE NAFA', 'CODE NAF': 'CODE NAFA', 'NAF': 'CODE NAFA', 'CODE APE': 'CODE NAFA', 'APE': 'CODE NAFA',
+    'NOM ENTREPRISE': 'NOM',
+}
+SECTION_WORDS = {
+    'STAGIAIRE': STG, 'STAGIARE': STG, 'APPRENTI': STG, 'SALARIE': STG, 'CANDIDAT': STG,
+    'ENTREPRISE': ENT, 'EMPLOYEUR': ENT, 'SOCIETE': ENT, 'ETABLISSEMENT': ENT,
+}
+FILLER_WORDS = {'DU', 'DE', 'DES', 'D', 'L', 'LA', 'LE', 'N', 'NO', 'NUM', 'DANS', 'VOTRE'}
+# Sans section explicite, les libellés suivent le schéma OCR (« Code postal », « Ville »… = entreprise)
+DEFAULT_SECTION = {'NOM': STG}
+
+# Sans ces champs l'inscription serait incomplète : on passe alors par l'OCR
+REQUIRED_FIELDS = ("Nom du stagiaire", "Prénom du stagiaire", "nom de l'entreprise", "N° de SIRET")
+
+LABEL_LINE = re.compile(r'^\s*([^:]{2,60}?)\s*:\s*(.*?)\s*$')
+
+
+def resolve_label(label, section=None):
+    """Clé d'annotation désignée par un libellé ou nom de champ, ou None ; section = contexte courant"""
+    words = fold(label).split()
+    for word in words:
+        if word in SECTION_WORDS:
+            section = SECTION_WORDS[word]
+    core = ' '.join(w for w in words if w not in SECTION_WORDS and w not in FILLER_WORDS)
+    core = SYNONYMS.get(core, core)
+    targets = TARGETS.get(core)
+    if not targets:
+        return None
+    if section in targets:
+        return targets[section]
+    if len(targets) == 1:
+        return next(iter(targets.values()))
+    return targets[DEFAULT_SECTION.get(core, ENT)]
+
+
+class FormExtractor:
+    """Lecture locale des bulletins remplis sur ordinateur (champs AcroForm, puis couche texte), sans OCR"""
+
+    def extract(self, pdf_bytes, pages=None):
+        """Retourne (annotation JSON, méthode) si les champs obligatoires sont lus, sinon (None, None)"""
+        from pypdf import PdfReader
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        values, method = {}, None
+
+        # Les champs de formulaire valent pour tout le document : pas pour un bulletin parmi d'autres
+        if pages is None:
+            values = self.read_form_fields(reader)
+            method = 'form' if values else None
+
+        if not self._complete(values):
+            indexes = pages if pages is not None else [0]
+            text = '\n'.join(reader.pages[i].extract_text() or '' for i in indexes if i < len(reader.pages))
+            for key, value in self.read_text_layer(text).items():
+                if not values.get(key):
+                    values[key] = value
+                    method = 'text' if method is None else 'form+text'
+
+        if not self._complete(values):
+            return None, None
+        annotation = {key: '' for targets in TARGETS.values() for key in targets.values()}
+        annotation.update(values)
+        return json.dumps(annotation, ensure_ascii=False), method
+
+    @staticmethod
+    def _complete(values):
+        if not all(values.get(key) for key in REQUIRED_FIELDS):
+            return False
+        # Un SIRET mal saisi est laissé à l'OCR, qui lit aussi le reste du bulletin
+        return len(re.sub(r'\D', '', values["N° de SIRET"])) == 14
+
+    @staticmethod
+    def read_form_fields(reader):
+        values = {}
+        for name, field in (reader.get_fields() or {}).items():
+            value = field.get('/V')
+            if isinstance(value, list):
+                value = ' '.join(str(v) for v in value)
+            value = str(value or '').strip().lstrip('/')
+            if not value or value == 'Off':
+                continue
+            key = resolve_label(name) or resolve_label(field.get('/TU', ''))
+            if key and not values.get(key):
+                values[key] = value
+        return values
+
+    @staticmethod
+    def read_text_layer(text):
+        """Lignes « Libellé : valeur » ; un intertitre (« Le stagiaire », « Entreprise ») fixe la section"""
+        values, section = {}, None
+        for line in text.splitlines():
+            match = LABEL_LINE.match(line)
+            if not match:
+                words = fold(line).split()
+                if 0 < len(words) <= 4:
+                    for word in words:
+                        section = SECTION_WORDS.get(word, section)
+                continue
+            label, value = match.groups()
+            key = resolve_label(label, section)
+            if key and value and not values.get(key):
+                values[key] = value
+        return values
@@ -1,159 +1,398 @@
 import base64
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from mistralai import Mistral
+from typing import TYPE_CHECKING
+from field_validation import CORRECTED, INVALID, MISSING, OK
+from form_extractor import FormExtractor
 from models import Inscription, Entreprise, Stagiaire
+from ocr_cache import OcrCache
+from ocr_scheduler import OcrScheduler
+from pdf_optimizer import PdfOptimizer
+from run_metrics import RunMetrics
+
+if TYPE_CHECKING:
+    from mistralai import Mistral
+
+OCR_MODEL = "mistral-ocr-latest"
+
+# Clés du JSON document_annotation, par attribut des modèles
+ENTREPRISE_KEYS = {
+    'nom': "nom de l'entreprise",
+    'adresse': "adresse de l'entreprise",
+    'code_postal': "Code postal",
+    'ville': "Ville",
+    'pays': "Pays",
+    'siret': "N° de SIRET",
+    'code_nafa': "Code NAFA",
+    'telephone': "Tél",
+    'email': "Email",
+    'date_entree': "Date d'entrée dans l'entreprise",
+}
+STAGIAIRE_KEYS = {
+    'civilite': "Civilité",
+    'nom': "Nom du stagiaire",
+    'prenom': "Prénom du stagiaire",
+    'adresse': "Adresse du stagiaire",
+    'code_postal': "Code postal du stagiaire",
+    'ville': "Ville du stagiaire",
+    'pays': "Pays du stagiaire",
+    'portable': "Portable du stagiaire",
+    'email': "Email du stagiaire",
+    'date_naissance': "Date de naissance",
+}
+ANNOTATION_KEYS = [
+    "Civilité", "Nom du stagiaire", "Prénom du stagiaire", "Adresse du stagiaire", "Code postal du stagiaire",
+    "Ville du stagiaire", "Pays du stagiaire", "Portable du stagiaire", "Email du stagiaire", "Date de naissance",
+    "nom de l'entreprise", "adresse de l'entreprise", "Code postal", "Ville", "Pays",
+    "Date d'entrée dans l'entreprise", "Tél", "N° de SIRET", "Code NAFA", "Email",
+]
+# Clés mal orthographiées de l'ancien schéma, encore présentes dans le cache et les journaux
+LEGACY_KEYS = {"Nom du stagiare": "Nom du stagiaire", "Afresse du stagiaire": "Adresse du stagiaire",
+               "Pays du stagiare": "Pays du stagiaire"}
+# Consignes ajoutées au schéma lors d'une relecture ciblée
+FIELD_HINTS = {
+    "N° de SIRET": "14 chiffres, sans espaces",
+    "Code postal": "5 chiffres",
+    "Code postal du stagiaire": "5 chiffres",
+    "Date de naissance": "JJ/MM/AAAA",
+    "Date d'entrée dans l'entreprise": "JJ/MM/AAAA",
+    "Email": "adresse email complète",
+    "Email du stagiaire": "adresse email complète",
+    "Tél": "numéro à 10 chiffres",
+    "Portable du stagiaire": "numéro à 10 chiffres",
+}
+# Clé ajoutée à l'annotation : liste des champs corrigés par une relecture ciblée
+CORRECTED_KEY = "_champs_corriges"
+
+
+def annotation_format(keys, hints=False):
+    """Schéma document_annotation demandant les clés indiquées (avec consignes de format si hints)"""
+    properties = {}
+    for key in keys:
+        properties[key] = {"type": "string"}
+        if hints and key in FIELD_HINTS:
+            properties[key]["description"] = FIELD_HINTS[key]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "response_schema",
+            "schema": {
+                "type": "object",
+                "title": "StructuredData",
+                "required": list(keys),
+                "properties": properties,
+            }
+        }
+    }
+
+
+ANNOTATION_FORMAT = annotation_format(ANNOTATION_KEYS)
+
 
 class InscriptionExtractor:
     """Extracteur de données depuis le bulletin d'inscription PDF"""
 
-    def __init__(self, pdf_path, client:Mistral):
+    def __init__(self, pdf_path, client: "Mistral", cache: OcrCache = None, replay=False,
+                 optimizer: PdfOptimizer = None, upload_threshold_kb=1024, metrics: RunMetrics = None,
+                 scheduler: OcrScheduler = None, pages_per_bulletin=None, local: FormExtractor = None,
+                 recheck=True, communes=None):
         self.pdf_path = Path(pdf_path)
         self.client = client
+        self.cache = cache
+        self.replay = replay
+        self.optimizer = optimizer
+        self.upload_threshold_kb = upload_threshold_kb
+        self.metrics = metrics or RunMetrics()
+        self.scheduler = scheduler
+        # None : un seul bulletin, en page 1 ; sinon le PDF est découpé en bulletins de N pages
+        self.pages_per_bulletin = pages_per_bulletin
+        self.local = local
+        self.recheck = recheck  # Relecture ciblée des champs invalides ou manquants après l'OCR
+        self.communes = communes  # Index des codes postaux appliqué à la construction des fiches
+        self.pages = [0]
+        self.annotation = None
+        self.method = None  # Chemin suivi : form / text / form+text (lecture locale), cache ou ocr
+        self.bytes_before = 0
+        self.bytes_sent = 0
+        self._pdf_bytes = None
+        self._document_url = None
+        self._uploaded = None
+        self._force_upload = False
+        self._reduced = False
+        self._deadline_at = None  # Échéance du fichier, fixée au premier appel OCR
+        self._lock = threading.Lock()
 
-    def encode_file(self):
-        with open(self.pdf_path, 'rb') as file:
-            return base64.b64encode(file.read()).decode('utf-8')
-
-    def call_mistral(self):
-        base64_file = self.encode_file()
-        return self.client.ocr.process(
-        model="mistral-ocr-latest",
-        pages=[0],
-        document={
-            "type": "document_url",
-            "document_url": f"data:application/pdf;base64,{base64_file}"
-        },
-        include_image_base64=False,
-        extract_footer=False,
-        extract_header=False,
-        document_annotation_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "response_schema",
-                "schema": {
-                    "type": "object",
-                    "title": "StructuredData",
-                    "required": [
-                        "Civilité",
-                        "Nom du stagiaire",
-                        "Prénom du stagiaire",
-                        "Adresse du stagiaire",
-                        "Code postal du stagiaire",
-                        "Ville du stagiaire",
-                        "Pays du stagiare",
-                        "Portable du stagiaire",
-                        "Email du stagiaire",
-                        "Date de naissance",
-                        "nom de l'entreprise",
-                        "adresse de l'entreprise",
-                        "Code postal",
-                        "Ville",
-                        "Pays",
-                        "Date d'entrée dans l'entreprise",
-                        "Tél",
-                        "N° de SIRET",
-                        "Code NAFA",
-                        "Email"
-                    ],
-                    "properties": {
-                        "Civilité": {
-                            "type": "string"
-                        },
-                        "Nom du stagiare": {
-                            "type": "string"
-                        },
-                        "Prénom du stagiaire": {
-                            "type": "string"
-                        },
-                        "Afresse du stagiaire": {
-                            "type": "string"
-                        },
-                        "Code postal du stagiaire": {
-                            "type": "string"
-                        },
-                        "Ville du stagiaire": {
-                            "type": "string"
-                        },
-                        "Pays du stagiaire": {
-                            "type": "string"
-                        },
-                        "Portable du stagiaire": {
-                            "type": "string"
-                        },
-                        "Email du stagiaire": {
-                            "type": "string"
-                        },
-                        "Date de naissance": {
-                            "type": "string"
-                        },
-                        "nom de l'entreprise": {
-                            "type": "string"
-                        },
-                        "adresse de l'entreprise": {
-                            "type": "string"
-                        },
-                        "Code postal": {
-                            "type": "string"
-                        },
-                        "Ville": {
-                            "type": "string",
-                        },
-                        "Pays": {
-                            "type": "string",
-                        },
-                        "Date d'entrée dans l'entreprise": {
-                            "type": "string",
-                        },
-                        "Tél": {
-                            "type": "string",
-                        },
-                        "N° de SIRET": {
-                            "type": "string",
-                        },
-                        "Code NAFA": {
-                            "type": "string",
-                        },
-                        "Email": {
-                            "type": "string",
-                        },
-                    }
-                }
-            }
-        }
-    )
+    def read_file(self):
+        if self._pdf_bytes is None:
+            self._pdf_bytes = self.pdf_path.read_bytes()
+        return self._pdf_bytes
+
+    def prepare_payload(self):
+        """Réduit le PDF aux pages demandées avant envoi"""
+        pdf_bytes = self.read_file()
+        self.bytes_before = len(pdf_bytes)
+        if self.optimizer:
+            try:
+                with self.metrics.stage('payload_optimize'):
+                    pdf_bytes = self.optimizer.optimize(pdf_bytes, pages=self.pages)
+            except Exception as e:
+                print(f"   ⚠️  Optimisation impossible ({e}), envoi du PDF original")
+        return pdf_bytes
+
+    def _use_upload(self, size):
+        """Au-delà du seuil, l'upload brut (Files API) évite les 33% de surcoût du base64"""
+        return self.upload_threshold_kb is not None and size > self.upload_threshold_kb * 1024
+
+    def _prepare_document(self):
+        """Réduit et envoie le PDF une seule fois, partagé par tous les appels OCR (essais et bulletins)"""
+        with self._lock:
+            if self._document_url is not None:
+                return self._document_url
+
+            payload = self.prepare_payload()
+            # Les pages demandées sont désormais les premières du PDF réduit
+            self._reduced = payload is not self._pdf_bytes
+
+            if self._force_upload or self._use_upload(len(payload)):
+                with self.metrics.stage('upload'):
+                    # Déjà envoyé si seule l'URL signée a échoué lors d'un essai précédent
+                    if self._uploaded is None:
+                        self._uploaded = self.client.files.upload(
+                            file={"file_name": self.pdf_path.name, "content": payload},
+                            purpose="ocr"
+                        )
+                    self._document_url = self.client.files.get_signed_url(file_id=self._uploaded.id).url
+                self.bytes_sent = len(payload)
+                mode = "upload"
+            else:
+                with self.metrics.stage('payload_encode'):
+                    self._document_url = f"data:application/pdf;base64,{base64.b64encode(payload).decode('utf-8')}"
+                self.bytes_sent = len(self._document_url)
+                mode = "inline"
+            self.metrics.incr('bytes_read', self.bytes_before)
+            self.metrics.incr('bytes_sent', self.bytes_sent)
+            self.metrics.incr(f'ocr_requests_{mode}')
+
+            print(f"   📦 {self.pdf_path.name}: {self.bytes_before / 1024:.0f} Ko → {self.bytes_sent / 1024:.0f} Ko envoyés ({mode})")
+            return self._document_url
+
+    def release_document(self):
+        """Supprime le fichier envoyé via l'API Files, une fois tous les appels terminés"""
+        if self._uploaded:
+            try:
+                self.client.files.delete(file_id=self._uploaded.id)
+            except Exception:
+                pass
+        self._uploaded = None
+        self._document_url = None
+
+    def call_mistral(self, pages=None, annotation_format=ANNOTATION_FORMAT):
+        document_url = self._prepare_document()
+        pages = pages or self.pages
+        if self._reduced:
+            pages = [self.pages.index(p) for p in pages]
+
+        with self.metrics.stage('ocr_request'):
+            return self.client.ocr.process(
+            model=OCR_MODEL,
+            pages=pages,
+            document={
+                "type": "document_url",
+                "document_url": document_url
+            },
+            include_image_base64=False,
+            extract_footer=False,
+            extract_header=False,
+            document_annotation_format=annotation_format
+        )
+
+    def get_annotation(self, pages=None):
+        """Retourne le JSON document_annotation (des pages demandées), sans OCR si possible"""
+        annotation, self.method = self._get_annotation(pages)
+        return annotation
+
+    def _get_annotation(self, pages=None):
+        """Retourne (annotation, chemin suivi) : lecture locale, puis cache, puis OCR"""
+        label = self.pdf_path.name
+        if pages is not None:
+            label = f"{label} (p. {pages[0] + 1})"
+
+        if self.local:
+            try:
+                with self.metrics.stage('local_extraction'):
+                    annotation, method = self.local.extract(self.read_file(), pages)
+            except Exception as e:
+                annotation, method = None, None
+                print(f"   ⚠️  Lecture locale impossible ({e})")
+            if annotation is not None:
+                print(f"   ⚡ Formulaire rempli lu localement ({method}): {label}")
+                self.metrics.incr(f'path_{method}')
+                return annotation, method
+
+        key = None
+        if self.cache:
+            # Un bulletin en page 1 garde la clé historique du PDF entier
+            key = self.cache.make_key(self.read_file(), OCR_MODEL, ANNOTATION_FORMAT,
+                                      pages=None if pages in (None, [0]) else pages)
+            with self.metrics.stage('ocr_cache'):
+                cached = self.cache.get(key)
+            if cached is not None:
+                print(f"   💾 Annotation trouvée en cache: {label}")
+                self.metrics.incr('ocr_cache_hits')
+                self.metrics.incr('path_cache')
+                return cached, 'cache'
+
+        if self.replay:
+            raise LookupError(f"{label} absent du cache (mode --replay)")
+
+        annotation = self._ocr(pages, label)
+        if self.recheck:
+            annotation = self.recheck_fields(annotation, pages, label)
+        if self.cache:
+            self.cache.put(key, annotation)
+        self.metrics.incr('path_ocr')
+        return annotation, 'ocr'
+
+    def _ocr(self, pages, label, annotation_format=ANNOTATION_FORMAT):
+        if self.scheduler:
+            response = self.scheduler.call(lambda: self.call_mistral(pages, annotation_format), label=label,
+                                           file_deadline_at=self._file_deadline_at())
+        else:
+            response = self.call_mistral(pages, annotation_format)
+        return response.document_annotation
+
+    def _file_deadline_at(self):
+        """Un seul délai par PDF, partagé par les bulletins et les relectures"""
+        with self._lock:
+            if self._deadline_at is None:
+                self._deadline_at = self.scheduler.file_deadline_at()
+            return self._deadline_at
+
+    def recheck_fields(self, annotation, pages=None, label=''):
+        """Redemande à l'OCR les seuls champs invalides ou manquants ; retourne l'annotation complétée"""
+        raw_data = json.loads(annotation)
+        failing = self.failing_keys(self.build_inscription(annotation, communes=self.communes))
+        if not failing:
+            return annotation
+
+        print(f"   🔎 Relecture ciblée: {', '.join(failing)}")
+        self.metrics.incr('ocr_field_rechecks')
+        try:
+            with self.metrics.stage('ocr_recheck'):
+                answer = json.loads(self._ocr(pages, f"{label} (relecture)", annotation_format(failing, hints=True)))
+        except Exception as e:
+            print(f"   ⚠️  Relecture impossible ({e}), valeurs d'origine conservées")
+            return annotation
+
+        candidate = dict(raw_data)
+        candidate.update({key: answer[key] for key in failing if str(answer.get(key) or '').strip()})
+        still_failing = set(self.failing_keys(self.build_inscription(json.dumps(candidate, ensure_ascii=False),
+                                                                     communes=self.communes)))
+        corrected = []
+        for key in failing:
+            if key not in still_failing:
+                raw_data[key] = candidate[key]
+                corrected.append(key)
+            elif not str(raw_data.get(key) or '').strip():
+                # Une valeur douteuse vaut mieux qu'un champ vide : elle reste signalée invalide
+                raw_data[key] = candidate.get(key, '')
+        if corrected:
+            raw_data[CORRECTED_KEY] = raw_data.get(CORRECTED_KEY, []) + corrected
+            print(f"   🩹 {len(corrected)} champ(s) corrigé(s): {', '.join(corrected)}")
+        self.metrics.incr('fields_corrected', len(corrected))
+        return json.dumps(raw_data, ensure_ascii=False)
+
+    @staticmethod
+    def failing_keys(inscription):
+        """Clés d'annotation des champs invalides ou manquants de l'inscription"""
+        keys = []
+        for record, mapping in ((inscription.entreprise, ENTREPRISE_KEYS), (inscription.stagiaire, STAGIAIRE_KEYS)):
+            keys += [mapping[name] for name, statut in record.statuts.items() if statut in (INVALID, MISSING)]
+        return keys
 
     def extract(self):
         """Méthode principale d'extraction"""
         print(f"📄 Extraction des données de: {self.pdf_path.name}")
-        ocr_response = self.call_mistral()
-        raw_data = json.loads(ocr_response.document_annotation)
+        try:
+            self.annotation = self.get_annotation()
+        finally:
+            self.release_document()
+        with self.metrics.stage('json_parsing'):
+            return self.build_inscription(self.annotation, communes=self.communes)
+
+    def page_ranges(self):
+        """Découpe le PDF en plages de pages_per_bulletin pages, une par bulletin"""
+        from pypdf import PdfReader
+
+        count = len(PdfReader(BytesIO(self.read_file())).pages)
+        size = max(1, self.pages_per_bulletin)
+        return [list(range(start, min(start + size, count))) for start in range(0, count, size)]
+
+    def extract_all(self):
+        """Extrait tous les bulletins du PDF ; chacun est marqué de sa page de départ"""
+        if not self.pages_per_bulletin:
+            return [self.extract()]
+
+        ranges = self.page_ranges()
+        print(f"📄 Extraction de {len(ranges)} bulletin(s) depuis: {self.pdf_path.name}")
+        # Toutes les pages sont réduites et envoyées une seule fois, puis extraites bulletin par bulletin
+        self.pages = [p for pages in ranges for p in pages]
+        self._force_upload = len(ranges) > 1 and not self.replay
+        workers = self.scheduler.max_concurrency if self.scheduler else 4
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as executor:
+                results = list(executor.map(self._get_annotation, ranges))
+        finally:
+            self.release_document()
+
+        self.annotation = [{'page': pages[0] + 1, 'annotation': annotation, 'method': method}
+                           for pages, (annotation, method) in zip(ranges, results)]
+        methods = {method for _, method in results}
+        self.method = methods.pop() if len(methods) == 1 else 'mixed'
+        with self.metrics.stage('json_parsing'):
+            return self.build_inscriptions(self.annotation, self.communes)
+
+    @classmethod
+    def build_inscriptions(cls, annotation, communes=None):
+        """Construit les Inscriptions d'un journal ou d'un cache : JSON unique ou liste {page, annotation}"""
+        if isinstance(annotation, list):
+            return [cls.build_inscription(item['annotation'], source_page=item['page'], communes=communes)
+                    for item in annotation]
+        return [cls.build_inscription(annotation, communes=communes)]
+
+    @staticmethod
+    def annotation_record(annotation):
+        """Lit le JSON document_annotation : ({attribut: valeur} entreprise, stagiaire, clés corrigées)"""
+        raw_data = json.loads(annotation)
+        for old, new in LEGACY_KEYS.items():
+            if raw_data.get(old) and not raw_data.get(new):
+                raw_data[new] = raw_data[old]
+        entreprise = {name: raw_data.get(key, "") for name, key in ENTREPRISE_KEYS.items()}
+        stagiaire = {name: raw_data.get(key, "") for name, key in STAGIAIRE_KEYS.items()}
+        return entreprise, stagiaire, set(raw_data.get(CORRECTED_KEY, []))
+
+    @staticmethod
+    def corrected_fields(corrected):
+        """Attributs entreprise et stagiaire correspondant aux clés corrigées par une relecture ciblée"""
+        return ([name for name, key in ENTREPRISE_KEYS.items() if key in corrected],
+                [name for name, key in STAGIAIRE_KEYS.items() if key in corrected])
+
+    @classmethod
+    def build_inscription(cls, annotation, source_page=None, communes=None):
+        """Construit l'Inscription à partir du JSON document_annotation"""
+        entreprise_data, stagiaire_data, corrected = cls.annotation_record(annotation)
 
         # Mapping du JSON vers les objets
-        entreprise = Entreprise(
-            nom=raw_data.get("nom de l'entreprise", ""),
-            adresse=raw_data.get("adresse de l'entreprise", ""),
-            code_postal=raw_data.get("Code postal", ""),
-            ville=raw_data.get("Ville", ""),
-            pays=raw_data.get("Pays", ""),
-            siret=raw_data.get("N° de SIRET", ""),
-            code_nafa=raw_data.get("Code NAFA", ""),
-            telephone=raw_data.get("Tél", ""),
-            email=raw_data.get("Email", ""),
-            date_entree=raw_data.get("Date d'entrée dans l'entreprise", "")
-        )
+        entreprise = Entreprise(**entreprise_data, communes=communes)
+        stagiaire = Stagiaire(**stagiaire_data, communes=communes)
 
-        stagiaire = Stagiaire(
-            civilite=raw_data.get("Civilité", ""),
-            nom=raw_data.get("Nom du stagiaire", ""),
-            prenom=raw_data.get("Prénom du stagiaire", ""),
-            adresse=raw_data.get("Adresse du stagiaire", ""),
-            code_postal=raw_data.get("Code postal du stagiaire", ""),
-            ville=raw_data.get("Ville du stagiaire", ""),
-            pays=raw_data.get("Pays du stagiare", ""),
-            portable=raw_data.get("Portable du stagiaire", ""),
-            email=raw_data.get("Email du stagiaire", ""),
-            date_naissance=raw_data.get("Date de naissance", "")
-        )
+        # Champs corrigés par une relecture ciblée (valides à l'issue de celle-ci)
+        for record, names in zip((entreprise, stagiaire), cls.corrected_fields(corrected)):
+            for name in names:
+                if record.statuts.get(name) == OK:
+                    record.statuts[name] = CORRECTED
 
-        return Inscription(entreprise=entreprise, stagiaire=stagiaire)
+        return Inscription(entreprise=entreprise, stagiaire=stagiaire, source_page=source_page)
@@ -3,42 +3,124 @@
 Script d'extraction des données d'inscription depuis un PDF
 et génération du fichier Excel d'import pour Ammon Campus
 
-Usage: python3 main.py <fichier_pdf> [--output <dossier_sortie>]
+Usage: python3 main.py <fichier_pdf> [--output <dossier_sortie>] [--workers N] [--profile]
+       python3 main.py --watch <dossier_depot> [--output <dossier_sortie>]
 """
 
 import sys
 import argparse
+import csv
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue
 from pathlib import Path
 from datetime import datetime
-from mistralai import Mistral
-from dotenv import load_dotenv
 import os
 
 from ammon_code_pays import PaysCode
 from ammon_generator_entreprise import EntrepriseExcelGenerator
 from ammon_generator_personne import PersonneExcelGenerator
-from inscription_extractor import InscriptionExtractor
 from ammon_existants_service import ExistantsService
+from ocr_cache import OcrCache
+from batch_journal import BatchJournal
+from pdf_optimizer import PdfOptimizer
+from form_extractor import FormExtractor
+from batch_merge import BatchMerger
+from batch_processing import BatchResult, merge_journals, process_batch, select_shard
+from ocr_scheduler import OcrScheduler
+from folder_watcher import FolderWatcher
+from run_metrics import RunMetrics, SamplingProfiler
+from sirene_index import SireneIndex
+from commune_index import CommuneIndex
 
 
-def main():
+def parse_shard(value):
+    """'I/N' -> (I, N), avec 1 <= I <= N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"format attendu I/N (ex: 2/4), reçu: {value}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"le numéro de shard doit être compris entre 1 et {count}")
+    return index, count
+
+
+def shard_journals(paths):
+    """Journaux à combiner : fichiers indiqués, ou shard_*.jsonl des dossiers indiqués"""
+    journals = []
+    for path in map(Path, paths):
+        journals += sorted(path.glob('shard_*.jsonl')) if path.is_dir() else [path]
+    return journals
+
+
+def build_parser():
     parser = argparse.ArgumentParser(
         description='Extrait les données d\'inscription depuis des PDFs et génère un fichier Excel pour Ammon Campus'
     )
     parser.add_argument('--pdf_input', '-i', default='./input', help='Chemin vers un fichier PDF ou un dossier contenant des PDFs')
     parser.add_argument('--output', '-o', default='./output', help='Dossier de sortie pour le fichier Excel')
     parser.add_argument('--template', '-t', default='./Template_Import_Entreprises.xlsx', help='Chemin vers le template Excel Ammon')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='Nombre maximum d\'appels OCR simultanés')
+    parser.add_argument('--max-workers', type=int, help='Autorise la concurrence adaptative à dépasser --workers jusqu\'à ce plafond si l\'API suit (défaut : --workers)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Nouveaux essais d\'un appel OCR après une erreur transitoire ou un 429')
+    parser.add_argument('--file-deadline', type=float, default=600, help='Délai maximal (s) pour extraire un PDF, essais compris (0 = aucun)')
+    parser.add_argument('--deadline', type=float, default=0, help='Délai maximal (s) du lot : au-delà, les PDFs restants sont laissés pour --resume (0 = aucun)')
+    parser.add_argument('--max-dpi', type=int, default=200, help='Résolution maximale des images scannées envoyées à l\'OCR (0 = inchangée)')
+    parser.add_argument('--grayscale', action='store_true', help='Convertit les images scannées en niveaux de gris avant envoi')
+    parser.add_argument('--no-optimize', action='store_true', help='Envoie le PDF original sans le réduire')
+    parser.add_argument('--upload-threshold-kb', type=int, default=1024, help='Au-delà de cette taille, le PDF est envoyé via l\'API Files plutôt qu\'en base64')
+    parser.add_argument('--no-local', action='store_true', help='Envoie tous les PDFs à l\'OCR, même les formulaires remplis sur ordinateur')
+    parser.add_argument('--no-recheck', action='store_true', help='Ne redemande pas à l\'OCR les champs invalides ou manquants')
+    parser.add_argument('--split', action='store_true', help='Chaque PDF contient plusieurs bulletins (pile scannée) : un bulletin par page, ou par --pages-per-bulletin pages')
+    parser.add_argument('--pages-per-bulletin', type=int, default=1, help='Avec --split, nombre de pages de chaque bulletin')
+    parser.add_argument('--format', '-f', choices=['xlsx', 'csv'], default='xlsx', help='Format des fichiers d\'import générés')
+    parser.add_argument('--stream', action='store_true', help="Écrit les fichiers d'import pendant l'OCR, en flux (feuilles write-only), pour les gros lots")
+    parser.add_argument('--quiet', '-q', action='store_true', help='N\'affiche pas une ligne par entreprise/stagiaire générés')
+    parser.add_argument('--fuzzy-threshold', type=float, default=0.92, help='Score minimal d\'un stagiaire de même prononciation pour le considérer comme existant')
+    parser.add_argument('--review-threshold', type=float, default=0.80, help='Score à partir duquel un stagiaire approché est signalé comme doublon possible')
+    parser.add_argument('--no-fuzzy', action='store_true', help='Désactive la recherche approchée des stagiaires existants')
+    parser.add_argument('--cache-dir', default='./cache/ocr', help='Dossier du cache des annotations OCR')
+    parser.add_argument('--no-cache', action='store_true', help='Désactive le cache des annotations OCR')
+    parser.add_argument('--replay', action='store_true', help='Régénère les fichiers Excel uniquement depuis le cache, sans appel API')
+    parser.add_argument('--cache-max-mb', type=float, default=500, help='Taille maximale du cache (Mo)')
+    parser.add_argument('--cache-max-days', type=float, default=180, help='Âge maximal des entrées du cache (jours)')
+    parser.add_argument('--sirene-dir', default='./sirene', help='Index SIRENE local (python3 sirene_index.py build) : vérifie les SIRET et complète les fiches entreprises')
+    parser.add_argument('--no-sirene', action='store_true', help='N\'utilise pas l\'index SIRENE même s\'il est présent')
+    parser.add_argument('--communes', default='./existants/laposte_hexasmal.csv', help='Base officielle des codes postaux (La Poste) : corrige codes postaux et communes des adresses françaises')
+    parser.add_argument('--no-communes', action='store_true', help='N\'utilise pas la base des codes postaux même si elle est présente')
+    parser.add_argument('--resume', metavar='JOURNAL', help='Reprend un lot interrompu depuis son journal (seuls les PDFs manquants ou en erreur sont retraités)')
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N', help='Rattrapage réparti : ne traite que le shard I sur N du dossier et écrit son journal (shard_IofN_*.jsonl), sans fichiers d\'import')
+    parser.add_argument('--merge', nargs='+', metavar='JOURNAL', help='Combine les journaux des shards (fichiers ou dossiers) et génère les fichiers d\'import, sans OCR')
+    parser.add_argument('--watch', metavar='DOSSIER', help='Mode service : surveille ce dossier et traite les PDFs au fil de leur arrivée')
+    parser.add_argument('--flush-interval', type=float, default=300, help='Mode service : délai maximal (s) avant écriture des fichiers d\'import')
+    parser.add_argument('--flush-size', type=int, default=200, help='Mode service : nombre d\'inscriptions déclenchant l\'écriture des fichiers d\'import')
+    parser.add_argument('--profile', nargs='?', const='sample', choices=['sample', 'cprofile'], help='Enregistre un profil du lancement dans le dossier de sortie (sample : piles de tous les threads ; cprofile : thread principal)')
+    parser.add_argument('--settle', type=float, default=2.0, help='Mode service : délai (s) sans modification avant de considérer un PDF complet')
+    return parser
 
-    args = parser.parse_args()
 
-    # Déterminer s'il s'agit d'un fichier ou d'un dossier
-    input_path = Path(args.pdf_input)
+def create_client():
+    """Crée le client Mistral (imports différés : le SDK est long à charger)"""
+    from dotenv import load_dotenv
+    from mistralai import Mistral
+
+    load_dotenv()
+    api_key = os.getenv('MISTRAL_API_KEY')
+    # MISTRAL_SERVER_URL permet de viser un serveur local (benchmarks)
+    server_url = os.getenv('MISTRAL_SERVER_URL')
+    if server_url:
+        return Mistral(api_key=api_key, server_url=server_url)
+    return Mistral(api_key=api_key)
 
+
+def collect_pdf_files(input_path):
+    """Liste les PDFs à traiter (fichier unique ou dossier) ; quitte en cas d'erreur"""
     if not input_path.exists():
         print(f"❌ Erreur: Le chemin {input_path} n'existe pas")
         sys.exit(1)
 
-    # Collecter les fichiers PDF à traiter
     pdf_files = []
     if input_path.is_file():
         if input_path.suffix.lower() == '.pdf':
@@ -51,75 +133,522 @@ def main():
         if not pdf_files:
             print(f"❌ Erreur: Aucun fichier PDF trouvé dans {input_path}")
             sys.exit(1)
+    return pdf_files
 
-    print(f"📁 {len(pdf_files)} fichier(s) PDF à traiter\n")
 
-    load_dotenv()
-    api_key = os.getenv('MISTRAL_API_KEY')
-    client = Mistral(api_key=api_key)
+def report_decision(decision):
+    """Affiche les décisions prises pour une inscription"""
+    ent = decision.inscription.entreprise
+    stg = decision.inscription.stagiaire
+    ent.display_summary()
+    if decision.entreprise_ref:
+        print(f"   ℹ️  L'entreprise existe déjà (Ref: {decision.entreprise_ref}).")
+
+    match = decision.match
+    if decision.personne_ref and match and match.ref_ext == decision.personne_ref:
+        print(f"   🚫 Le stagiaire {stg.prenom} {stg.nom} correspond à {match.prenom} {match.nom} "
+              f"(Ref: {match.ref_ext}, score {match.score:.2f}). Ignoré.")
+    elif decision.personne_ref:
+        print(f"   🚫 Le stagiaire {stg.prenom} {stg.nom} existe déjà (Ref: {decision.personne_ref}). Ignoré.")
+    elif decision.review:
+        print(f"   ⚠️  Doublon possible: {stg.prenom} {stg.nom} ≈ {match.prenom} {match.nom} "
+              f"(Ref: {match.ref_ext}, score {match.score:.2f})")
+
+    fiches = {}
+    for fiche, champ, _, statut in decision.anomalies:
+        fiches.setdefault(fiche, []).append(f"{champ} ({statut})")
+    for fiche, champs in fiches.items():
+        print(f"   ⚠️  {fiche}, champs à vérifier: {', '.join(champs)}")
+
+
+def process_pdfs(pdf_files, existants, journal, workers, extractor_options, metrics=None, sink=None, sirene=None):
+    """Extrait les PDFs (OCR concurrent) et les compare aux existants, dans l'ordre des fichiers
+
+    existants peut être un Future encore en cours de chargement. sink.add(entreprises, personnes)
+    reçoit les inscriptions à générer dès qu'elles sont validées.
+    """
+    file_results = process_batch(pdf_files, existants=existants, journal=journal, workers=workers,
+                                 metrics=metrics, sirene=sirene, **extractor_options)
+    return collect_results(file_results, sink)
+
+
+def collect_results(file_results, sink=None):
+    """Affiche les résultats des PDFs et les range dans le lot à générer"""
+    result = BatchResult()
+    for file_result in file_results:
+        print(f"📄 Traitement: {file_result.pdf_file.name}")
+        if file_result.error:
+            print(f"   ❌ Erreur lors du traitement: {file_result.error}")
+            result.failed.append(file_result.pdf_file)
+            continue
+
+        for decision in file_result.decisions:
+            if decision.inscription.source_page is not None:
+                print(f"   📑 Bulletin page {decision.inscription.source_page}")
+            report_decision(decision)
+            result.add_decision(decision)
+            if sink:
+                sink.add([decision.inscription] if decision.new_entreprise else [],
+                         [decision.inscription] if decision.new_personne else [])
+    return result
+
+
+def write_review_file(to_review, output_path):
+    """Écrit la liste des doublons possibles à vérifier manuellement"""
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Fichier', 'Nom', 'Prénom', 'Candidat Nom', 'Candidat Prénom', 'Candidat cRefExt', 'Score'])
+        for filename, stg, match in to_review:
+            writer.writerow([filename, stg.nom, stg.prenom, match.nom, match.prenom, match.ref_ext, f"{match.score:.2f}"])
+    print(f"⚠️  {len(to_review)} doublon(s) possible(s) à vérifier: {output_path}")
+
+
+def write_check_file(to_check, output_path):
+    """Écrit le statut des champs manquants, invalides ou corrigés des fiches générées"""
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Fichier', 'Fiche', 'Champ', 'Valeur', 'Statut'])
+        writer.writerows(to_check)
+    print(f"🔎 {len(to_check)} champ(s) à vérifier: {output_path}")
+
+
+def generate_imports(result, output_dir, timestamp, pays_code, existants, args, metrics=None):
+    """Écrit les fichiers d'import Entreprises / Stagiaires du lot"""
+    metrics = metrics or RunMetrics()
+    if result.to_review:
+        write_review_file(result.to_review, output_dir / f"Doublons_a_verifier_{timestamp}.csv")
+    if result.to_check:
+        write_check_file(result.to_check, output_dir / f"Champs_a_verifier_{timestamp}.csv")
 
-    existants = ExistantsService(folder_path="./existants")
+    if not result.has_data:
+        return []
 
-    # Listes dissociées pour la génération
-    entreprises_to_gen = []
-    personnes_to_gen = []
+    # Une seule ligne par SIRET et par stagiaire, même s'ils apparaissent sur plusieurs bulletins du lot
+    merger = BatchMerger()
+    with metrics.stage('batch_merge'):
+        entreprises, personnes = merger.merge(result.entreprises, result.personnes)
+    if merger.stats['entreprises'] or merger.stats['personnes']:
+        print(f"\n🔗 Doublons du lot fusionnés: {merger.stats['entreprises']} entreprise(s), "
+              f"{merger.stats['personnes']} stagiaire(s) ({merger.stats['champs_completes']} champ(s) complété(s))")
+    for name, count in merger.stats.items():
+        metrics.incr(f'merged_{name}', count)
 
-    for pdf_file in pdf_files:
-        print(f"📄 Traitement: {pdf_file.name}")
+    print(f"\n✅ {len(entreprises)} entreprise(s) et {len(personnes)} stagiaire(s) à générer\n")
+
+    verbose = not args.quiet
+    jobs = []
+
+    # Génération Entreprises (uniquement les nouvelles)
+    if entreprises:
+        ent_output = output_dir / f"Import_Entreprise_{timestamp}.{args.format}"
+        generator = EntrepriseExcelGenerator(pays_code=pays_code, verbose=verbose)
+        create = generator.create_entreprises_csv if args.format == 'csv' else generator.create_entreprises_excel
+        jobs.append(('generation_entreprises', create, entreprises, ent_output))
+
+    # Génération Stagiaires (uniquement les nouveaux, rattachés soit au nouveau soit à l'existant)
+    if personnes:
+        personne_output = output_dir / f"Import_Stagiaires_{timestamp}.{args.format}"
+        stg_gen = PersonneExcelGenerator(pays_code=pays_code, verbose=verbose)
+        create = stg_gen.create_personnes_csv if args.format == 'csv' else stg_gen.create_personnes_excel
+        jobs.append(('generation_personnes', create, personnes, personne_output))
+
+    def run_job(stage, create, data, output):
+        with metrics.stage(stage):
+            return create(data, output, streaming=args.stream)
+
+    # Les deux classeurs sont écrits en parallèle
+    outputs = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(run_job, *job) for job in jobs]
+        for future in futures:
+            outputs.append(future.result())
+            existants.record_generated_file(outputs[-1])
+    return outputs
+
+
+class StreamingImports:
+    """Écrit les fichiers d'import pendant l'OCR (--stream) : chaque ligne part dès que l'inscription est validée
+
+    Les doublons du lot sont écartés au fil de l'eau ; une ligne déjà écrite n'est plus
+    complétée par un bulletin ultérieur (le premier bulletin fait foi).
+    """
+
+    def __init__(self, output_dir, timestamp, pays_code, args, metrics):
+        self.output_dir = output_dir
+        self.timestamp = timestamp
+        self.pays_code = pays_code  # Future : le template est chargé en parallèle
+        self.args = args
+        self.metrics = metrics
+        self.merger = BatchMerger()
+        self.counts = {'entreprises': 0, 'personnes': 0}
+        self._queues = {}
+        self._threads = []
+        self._outputs = {}
+        self._errors = []
+
+    def add(self, entreprises, personnes):
+        for inscription in entreprises:
+            if self.merger.add_entreprise(inscription):
+                self._put('entreprises', inscription)
+        for inscription in personnes:
+            if self.merger.add_personne(inscription):
+                self._put('personnes', inscription)
+
+    def _put(self, kind, inscription):
+        if kind not in self._queues:
+            # Le fichier n'est créé qu'à la première ligne
+            self._queues[kind] = SimpleQueue()
+            thread = threading.Thread(target=self._write, args=(kind,), name=f"import-{kind}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.counts[kind] += 1
+        self._queues[kind].put(inscription)
+
+    def _rows(self, kind):
+        queue = self._queues[kind]
+        while (inscription := queue.get()) is not None:
+            yield inscription
+
+    def _write(self, kind):
+        verbose = not self.args.quiet
         try:
-            extractor = InscriptionExtractor(pdf_file, client=client)
-            inscription = extractor.extract()
-            ent = inscription.entreprise
-            stg = inscription.stagiaire
-            ent.display_summary()
-
-            # --- 1. Gestion de l'Entreprise ---
-            if ent.is_valid:
-                existing_ent_ref = existants.get_existing_entreprise_ref(ent.siret)
-                if existing_ent_ref:
-                    print(f"   ℹ️  L'entreprise existe déjà (Ref: {existing_ent_ref}).")
-                    # On met à jour la ref_ext du stagiaire pour pointer vers l'existant
-                    # Important pour que le stagiaire soit rattaché à la bonne fiche dans Ammon
-                    ent.ref_ext = existing_ent_ref
+            with self.metrics.stage(f'generation_{kind}'):
+                pays_code = self.pays_code.result()
+                if kind == 'entreprises':
+                    output = self.output_dir / f"Import_Entreprise_{self.timestamp}.{self.args.format}"
+                    generator = EntrepriseExcelGenerator(pays_code=pays_code, verbose=verbose)
+                    create = generator.create_entreprises_csv if self.args.format == 'csv' else generator.create_entreprises_excel
                 else:
-                    entreprises_to_gen.append(inscription)
+                    output = self.output_dir / f"Import_Stagiaires_{self.timestamp}.{self.args.format}"
+                    generator = PersonneExcelGenerator(pays_code=pays_code, verbose=verbose)
+                    create = generator.create_personnes_csv if self.args.format == 'csv' else generator.create_personnes_excel
+                self._outputs[kind] = create(self._rows(kind), output, streaming=True)
+        except Exception as e:
+            self._errors.append(e)
+            # Vide la file pour ne pas bloquer le lot
+            for _ in self._rows(kind):
+                pass
 
-            # --- 2. Gestion du Stagiaire ---
-            if stg.is_valid:
-                existing_stg_ref = existants.get_existing_personne_ref(stg.nom, stg.prenom)
-                if existing_stg_ref:
-                    print(f"   🚫 Le stagiaire {stg.prenom} {stg.nom} existe déjà (Ref: {existing_stg_ref}). Ignoré.")
-                else:
-                    personnes_to_gen.append(inscription)
+    def close(self, existants):
+        """Termine l'écriture des fichiers et les enregistre dans la base de référence ; retourne leurs chemins"""
+        for queue in self._queues.values():
+            queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        stats = self.merger.stats
+        if stats['entreprises'] or stats['personnes']:
+            print(f"\n🔗 Doublons du lot écartés: {stats['entreprises']} entreprise(s), {stats['personnes']} stagiaire(s)")
+        for name, count in stats.items():
+            self.metrics.incr(f'merged_{name}', count)
+        outputs = [self._outputs[kind] for kind in ('entreprises', 'personnes') if kind in self._outputs]
+        for output in outputs:
+            existants.record_generated_file(output)
+        return outputs
 
-        except Exception as e:
-            print(f"   ❌ Erreur lors du traitement: {e}")
-            continue
 
-    if not entreprises_to_gen and not personnes_to_gen:
+def load_references(args, metrics):
+    """Lance le chargement des existants (et de l'index approché) et des codes pays en arrière-plan"""
+    def load_existants():
+        with metrics.stage('existants_load'):
+            existants = ExistantsService(
+                folder_path="./existants",
+                generated_path=args.output,
+                include_generated=not args.replay,
+                fuzzy=not args.no_fuzzy,
+                match_threshold=args.fuzzy_threshold,
+                review_threshold=args.review_threshold,
+            )
+            if existants.fuzzy:
+                existants.warm_matcher()
+        return existants
+
+    def load_pays_code():
+        with metrics.stage('pays_code_load'):
+            return PaysCode(template_path=args.template)
+
+    loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix='references')
+    futures = loader.submit(load_existants), loader.submit(load_pays_code)
+    loader.shutdown(wait=False)
+    return futures
+
+
+def open_sirene(args):
+    """Index SIRENE local s'il a été construit (None sinon, ou avec --no-sirene)"""
+    if args.no_sirene or not SireneIndex.exists(args.sirene_dir):
+        return None
+    try:
+        sirene = SireneIndex(args.sirene_dir)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Index SIRENE ignoré: {e}")
+        return None
+    print(f"🏢 Index SIRENE: {len(sirene)} établissement(s) ({sirene.meta['built_at']})\n")
+    return sirene
+
+
+def open_communes(args, metrics):
+    """Index des codes postaux si la base de la Poste est présente (None sinon, ou avec --no-communes)"""
+    if args.no_communes or not Path(args.communes).is_file():
+        return None
+    try:
+        with metrics.stage('communes_load'):
+            communes = CommuneIndex.load(args.communes)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Base des codes postaux ignorée: {e}")
+        return None
+    print(f"📮 Base des codes postaux: {len(communes)} commune(s)\n")
+    return communes
+
+
+def move_to(pdf_file, folder):
+    """Range un PDF traité du dossier surveillé (traites/ ou erreurs/)"""
+    folder.mkdir(parents=True, exist_ok=True)
+    target = folder / pdf_file.name
+    if target.exists():
+        target = folder / f"{pdf_file.stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{pdf_file.suffix}"
+    shutil.move(str(pdf_file), str(target))
+
+
+def run_merge(args, output_dir, timestamp, metrics):
+    """Combine les journaux des shards : comparaison aux existants, fusion des doublons et génération"""
+    existants, pays_code = load_references(args, metrics)
+    with metrics.stage('merge'):
+        result = collect_results(merge_journals(args.merge, existants.result(), metrics, open_sirene(args),
+                                                open_communes(args, metrics)))
+
+    if result.failed:
+        print(f"\n🔁 {len(result.failed)} fichier(s) en erreur dans les shards, à relancer avec --resume sur leur journal")
+
+    if not result.has_data:
         print("\nℹ️ Aucune nouvelle donnée à générer (tout existe déjà).")
         sys.exit(0)
 
-    print(f"\n✅ {len(entreprises_to_gen)} entreprise(s) et {len(personnes_to_gen)} stagiaire(s) à générer\n")
+    # Les doublons entre shards (même SIRET, même stagiaire) sont fusionnés ici
+    with metrics.stage('generation'):
+        generate_imports(result, output_dir, timestamp, pays_code.result(), existants.result(), args, metrics)
+    print("✨ Traitement terminé avec succès!")
+
+
+def run_watch(args, existants, pays_code, extractor_options, output_dir, metrics, workers, sirene=None):
+    """Mode service : reste chargé et traite les PDFs déposés dans le dossier surveillé"""
+    watch_dir = Path(args.watch)
+    done_dir = watch_dir / 'traites'
+    error_dir = watch_dir / 'erreurs'
+    watcher = FolderWatcher(watch_dir, settle_seconds=args.settle)
+    watcher.start()
+
+    journal = BatchJournal(output_dir / f"journal_watch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    pending = BatchResult()
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal pending, last_flush
+        if pending.has_data or pending.to_review or pending.to_check:
+            generate_imports(pending, output_dir, datetime.now().strftime('%Y%m%d_%H%M%S'), pays_code, existants, args, metrics)
+            print("✨ Fichiers d'import écrits\n")
+        pending = BatchResult()
+        last_flush = time.monotonic()
+
+    print(f"👀 Surveillance de {watch_dir} ({watcher.mode}), Ctrl-C pour arrêter\n")
+    try:
+        while True:
+            remaining = max(0.0, args.flush_interval - (time.monotonic() - last_flush))
+            pdf_files = watcher.wait_ready(timeout=min(remaining, 30) if pending.has_data else 30)
+
+            # Nouveaux exports déposés dans existants/ : intégrés sans redémarrer
+            with metrics.stage('existants_refresh'):
+                existants.refresh()
+
+            if pdf_files:
+                print(f"📁 {len(pdf_files)} nouveau(x) fichier(s) PDF\n")
+                result = process_pdfs(pdf_files, existants, journal, workers, extractor_options, metrics, sirene=sirene)
+                pending.extend(result)
+                for pdf_file in pdf_files:
+                    try:
+                        move_to(pdf_file, error_dir if pdf_file in result.failed else done_dir)
+                        watcher.forget(pdf_file)
+                    except OSError as e:
+                        print(f"   ⚠️  Impossible de ranger {pdf_file.name}: {e}")
+
+            count = len(pending.entreprises) + len(pending.personnes)
+            if count >= args.flush_size or (count and time.monotonic() - last_flush >= args.flush_interval):
+                flush()
+    except KeyboardInterrupt:
+        print("\n⏹️  Arrêt demandé")
+    finally:
+        watcher.stop()
+        flush()
+
+
+def main():
+    args = build_parser().parse_args()
+
+    if args.watch and (args.replay or args.resume):
+        print("❌ Erreur: --watch est incompatible avec --replay et --resume")
+        sys.exit(1)
+
+    if args.merge and (args.watch or args.shard or args.resume or args.replay):
+        print("❌ Erreur: --merge est incompatible avec --watch, --shard, --resume et --replay")
+        sys.exit(1)
+
+    if args.shard and (args.watch or args.stream):
+        print("❌ Erreur: --shard est incompatible avec --watch et --stream")
+        sys.exit(1)
+
+    # Déterminer s'il s'agit d'un fichier ou d'un dossier
+    pdf_files = []
+    if args.merge:
+        args.merge = shard_journals(args.merge)
+        missing = [path for path in args.merge if not path.is_file()]
+        if missing or not args.merge:
+            print(f"❌ Erreur: journal de shard introuvable: {missing[0] if missing else ', '.join(map(str, args.merge)) or '-'}")
+            sys.exit(1)
+        print(f"🧩 {len(args.merge)} journal(aux) de shard à combiner\n")
+    elif not args.watch:
+        pdf_files = collect_pdf_files(Path(args.pdf_input))
+        if args.shard:
+            index, count = args.shard
+            total = len(pdf_files)
+            pdf_files = select_shard(pdf_files, index - 1, count)
+            print(f"📁 {len(pdf_files)} fichier(s) PDF à traiter (shard {index}/{count} sur {total})\n")
+        else:
+            print(f"📁 {len(pdf_files)} fichier(s) PDF à traiter\n")
+
+    if args.replay and args.no_cache:
+        print("❌ Erreur: --replay nécessite le cache (incompatible avec --no-cache)")
+        sys.exit(1)
 
-    # Génération des fichiers
+    # Horodatage commun aux fichiers du lancement (journal, imports, métriques, profil)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-    pays_code = PaysCode(template_path=args.template)
+    metrics = RunMetrics()
+    profiler = None
+    if args.profile == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif args.profile == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
 
-    # Génération Entreprises (uniquement les nouvelles)
-    if entreprises_to_gen:
-        ent_output = output_dir / f"Import_Entreprise_{timestamp}.xlsx"
-        generator = EntrepriseExcelGenerator(pays_code=pays_code)
-        generator.create_entreprises_excel(entreprises_to_gen, ent_output)
+    try:
+        run(args, pdf_files, output_dir, timestamp, metrics)
+    finally:
+        metrics_path = metrics.write(output_dir / f"metrics_{timestamp}.json")
+        print(f"⏱️  Métriques du lancement: {metrics_path}")
+        if args.profile == 'cprofile':
+            profiler.disable()
+            profile_path = output_dir / f"profile_{timestamp}.prof"
+            profiler.dump_stats(profile_path)
+            print(f"🔬 Profil cProfile: {profile_path} (python3 -m pstats {profile_path})")
+        elif args.profile == 'sample':
+            profiler.stop()
+            profile_path = output_dir / f"profile_{timestamp}.folded"
+            profiler.write(profile_path)
+            print(f"🔬 Profil échantillonné: {profile_path} (format flamegraph « collapsed »)")
 
-    # Génération Stagiaires (uniquement les nouveaux, rattachés soit au nouveau soit à l'existant)
-    if personnes_to_gen:
-        personne_output = output_dir / f"Import_Stagiaires_{timestamp}.xlsx"
-        stg_gen = PersonneExcelGenerator(pays_code=pays_code)
-        stg_gen.create_personnes_excel(personnes_to_gen, personne_output)
+
+def run(args, pdf_files, output_dir, timestamp, metrics):
+    """Traite le lot (ou le dossier surveillé) une fois les arguments validés"""
+    if args.merge:
+        run_merge(args, output_dir, timestamp, metrics)
+        return
+
+    cache = None
+    if not args.no_cache:
+        cache = OcrCache(args.cache_dir, max_size_mb=args.cache_max_mb, max_age_days=args.cache_max_days)
+        evicted = cache.evict()
+        if evicted:
+            print(f"🧹 {evicted} entrée(s) supprimée(s) du cache OCR")
+
+    # Existants et codes pays se chargent pendant la création du client et les premiers appels OCR
+    # (un shard n'en a pas besoin : la comparaison aux existants se fait lors du --merge)
+    existants, pays_code = load_references(args, metrics) if not args.shard else (None, None)
+    sirene = open_sirene(args) if not args.shard else None
+
+    # En mode replay, aucun appel API : pas besoin de client Mistral
+    client = None
+    if not args.replay:
+        with metrics.stage('client_init'):
+            client = create_client()
+
+    # Retries, concurrence adaptative et disjoncteur autour des appels OCR
+    scheduler = None
+    workers = args.workers
+    if client:
+        max_workers = max(args.workers, args.max_workers or args.workers)
+        scheduler = OcrScheduler(
+            concurrency=args.workers,
+            max_concurrency=max_workers,
+            max_retries=args.max_retries,
+            file_deadline=args.file_deadline or None,
+            # En mode service, seul le délai par fichier s'applique
+            deadline=None if args.watch else args.deadline or None,
+            metrics=metrics,
+        )
+        workers = scheduler.max_concurrency
+
+    extractor_options = dict(
+        client=client,
+        scheduler=scheduler,
+        cache=cache,
+        replay=args.replay,
+        optimizer=None if args.no_optimize else PdfOptimizer(max_dpi=args.max_dpi, grayscale=args.grayscale),
+        upload_threshold_kb=args.upload_threshold_kb,
+        pages_per_bulletin=args.pages_per_bulletin if args.split else None,
+        local=None if args.no_local else FormExtractor(),
+        recheck=not args.no_recheck,
+        communes=open_communes(args, metrics),
+    )
+
+    if args.watch:
+        run_watch(args, existants.result(), pays_code.result(), extractor_options, output_dir, metrics, workers, sirene)
+        return
+
+    # Journal du lot : chaque extraction y est consignée dès qu'elle se termine
+    journal_name = f"shard_{args.shard[0]}of{args.shard[1]}_{timestamp}.jsonl" if args.shard else f"journal_{timestamp}.jsonl"
+    journal = BatchJournal(args.resume or output_dir / journal_name)
+    if args.resume:
+        done = sum(1 for f in pdf_files if journal.get_annotation(f) is not None)
+        print(f"📒 Reprise depuis {journal.path}: {done}/{len(pdf_files)} fichier(s) déjà traité(s)\n")
+
+    # Avec --stream, les fichiers d'import s'écrivent pendant l'OCR
+    sink = StreamingImports(output_dir, timestamp, pays_code, args, metrics) if args.stream else None
+
+    # Extraction OCR concurrente, les résultats sont consommés dans l'ordre des fichiers
+    with metrics.stage('extraction'):
+        result = process_pdfs(pdf_files, existants, journal, workers, extractor_options, metrics, sink, sirene)
+
+    if result.failed:
+        print(f"\n🔁 {len(result.failed)} fichier(s) en erreur, à relancer avec: --resume {journal.path}")
+
+    if args.shard:
+        print(f"\n🧩 Shard {args.shard[0]}/{args.shard[1]} terminé: {journal.path}")
+        print(f"   Une fois tous les shards terminés: python3 main.py --merge {journal.path.parent}")
+        return
+    existants = existants.result()
+
+    if sink:
+        with metrics.stage('generation'):
+            outputs = sink.close(existants)
+        if result.to_review:
+            write_review_file(result.to_review, output_dir / f"Doublons_a_verifier_{timestamp}.csv")
+        if result.to_check:
+            write_check_file(result.to_check, output_dir / f"Champs_a_verifier_{timestamp}.csv")
+        if outputs:
+            print(f"\n✅ {sink.counts['entreprises']} entreprise(s) et {sink.counts['personnes']} stagiaire(s) générés")
+
+    if not result.has_data:
+        print("\nℹ️ Aucune nouvelle donnée à générer (tout existe déjà).")
+        sys.exit(0)
+
+    # Génération des fichiers (toutes les inscriptions sont connues : les doublons sont fusionnés)
+    if not sink:
+        with metrics.stage('generation'):
+            generate_imports(result, output_dir, timestamp, pays_code.result(), existants, args, metrics)
 
     print("✨ Traitement terminé avec succès!")
 
@@ -1,5 +1,15 @@
-from dataclasses import dataclass, field
+from dataclasses import InitVar, dataclass, field
 from datetime import datetime
+from functools import partial
+from typing import Optional
+
+from field_validation import (OK, check_code_postal, check_date, check_date_entree, check_email, check_siret,
+                              check_telephone, validate_fields)
+
+
+def run_date() -> str:
+    """Date des références externes (AAAAMMJJ)"""
+    return datetime.now().strftime('%Y%m%d')
 
 
 @dataclass
@@ -16,14 +26,29 @@ class Entreprise:
     date_entree: str
     # field(init=False) indique que ce n'est pas un argument du constructeur
     ref_ext: str = field(init=False)
+    # Statut des champs contrôlés : {attribut: ok / manquant / invalide / corrigé}
+    statuts: dict = field(init=False, default_factory=dict, repr=False)
+    # Date commune des références externes d'un lot (par défaut : aujourd'hui)
+    date_ref: InitVar[Optional[str]] = None
+    # Index des codes postaux (commune_index.CommuneIndex) qui normalise code postal et ville
+    communes: InitVar[Optional[object]] = None
+
+    CHECKS = {'siret': check_siret, 'date_entree': check_date_entree, 'email': check_email, 'telephone': check_telephone}
+    REQUIRED = ('nom', 'siret', 'code_postal')
 
-    def __post_init__(self):
-        # 1. Nettoyage du SIRET (on enlève les espaces)
+    def __post_init__(self, date_ref=None, communes=None):
+        # 1. Nettoyage du SIRET (on enlève les espaces), code postal et ville d'après l'index des communes
         if self.siret:
             self.siret = self.siret.replace(' ', '')
+        adresse = _normalize_commune(self, communes)
 
-        # 2. Génération de la référence externe
-        date_str = datetime.now().strftime('%Y%m%d')
+        # 2. Contrôle des champs (les valeurs valides sont normalisées)
+        self.statuts = validate_fields(self, dict(self.CHECKS, code_postal=partial(check_code_postal, pays=self.pays)),
+                                       self.REQUIRED)
+        self.statuts.update(adresse)
+
+        # 3. Génération de la référence externe
+        date_str = date_ref or run_date()
         self.ref_ext = f"ENTRE_{self.siret}_{date_str}" if self.siret else f"ENTRE_{date_str}"
 
     @property
@@ -31,6 +56,11 @@ class Entreprise:
         """Vérifie si les données vitales sont présentes"""
         return bool(self.nom and self.siret)
 
+    @property
+    def anomalies(self) -> dict:
+        """Champs manquants, invalides ou corrigés par une relecture ciblée"""
+        return {name: statut for name, statut in self.statuts.items() if statut != OK}
+
     def display_summary(self):
         """Affiche un résumé de l'état de l'entreprise dans la console"""
         if not self.nom:
@@ -55,14 +85,26 @@ class Stagiaire:
     email: str
     date_naissance: str
     ref_ext: str = field(init=False)
+    statuts: dict = field(init=False, default_factory=dict, repr=False)
+    date_ref: InitVar[Optional[str]] = None
+    communes: InitVar[Optional[object]] = None
+
+    CHECKS = {'date_naissance': check_date, 'email': check_email, 'portable': check_telephone}
+    REQUIRED = ('nom', 'prenom', 'date_naissance')
 
-    def __post_init__(self):
-        # 1. Nettoyage du portable (enlève espaces et points)
+    def __post_init__(self, date_ref=None, communes=None):
+        # 1. Nettoyage du portable (enlève espaces et points), code postal et ville
         if self.portable:
             self.portable = str(self.portable).replace(' ', '').replace('.', '')
+        adresse = _normalize_commune(self, communes)
 
-        # 2. Génération de la référence externe unique
-        timestamp = datetime.now().strftime('%Y%m%d')
+        # 2. Contrôle des champs
+        self.statuts = validate_fields(self, dict(self.CHECKS, code_postal=partial(check_code_postal, pays=self.pays)),
+                                       self.REQUIRED)
+        self.statuts.update(adresse)
+
+        # 3. Génération de la référence externe unique
+        timestamp = date_ref or run_date()
         nom_clean = self.nom.replace(' ', '')[:5].upper()
         self.ref_ext = f"PERS_{nom_clean}_{timestamp}"
 
@@ -71,23 +113,39 @@ class Stagiaire:
         """Vérifie si les données vitales sont présentes"""
         return bool(self.nom and self.prenom)
 
+    @property
+    def anomalies(self) -> dict:
+        """Champs manquants, invalides ou corrigés par une relecture ciblée"""
+        return {name: statut for name, statut in self.statuts.items() if statut != OK}
+
     @property
     def sexe(self) -> str:
         """Déduit le sexe à partir de la civilité"""
-        c = str(self.civilite).upper()
-        if 'MME' in c or 'MLLE' in c:
-            return 'F'
-        return 'M'
+        return 'F' if is_feminine(self.civilite) else 'M'
 
     @property
     def civilite_ammon(self) -> str:
         """Normalise la civilité pour Ammon (M. ou MME)"""
-        c = str(self.civilite).upper()
-        if 'MME' in c or 'MLLE' in c:
-            return 'MME'
-        return 'M.'
+        return 'MME' if is_feminine(self.civilite) else 'M.'
+
+
+def _normalize_commune(record, communes):
+    """Applique l'index des communes au code postal et à la ville ; retourne leurs statuts"""
+    normalized = communes.normalize(record.code_postal, record.ville, record.pays) if communes else None
+    if normalized is None:
+        return {}
+    record.code_postal, record.ville, statuts = normalized
+    return statuts
+
+
+def is_feminine(civilite) -> bool:
+    c = str(civilite).upper()
+    return 'MME' in c or 'MLLE' in c
+
 
 @dataclass
 class Inscription:
     entreprise: Entreprise
     stagiaire: Stagiaire
+    # Page de départ du bulletin dans un PDF multi-bulletins (None : PDF d'un seul bulletin)
+    source_page: Optional[int] = None
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class OcrCache:
+    """Cache disque des annotations OCR, adressé par le contenu du PDF"""
+
+    def __init__(self, folder_path="./cache/ocr", max_size_mb=500, max_age_days=180):
+        self.folder_path = Path(folder_path)
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.folder_path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(pdf_bytes, model, annotation_format, pages=None):
+        """Clé = SHA-256 du PDF + modèle + schéma d'annotation (+ pages, pour un PDF multi-bulletins)"""
+        h = hashlib.sha256(pdf_bytes)
+        h.update(model.encode('utf-8'))
+        h.update(json.dumps(annotation_format, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        if pages is not None:
+            h.update(json.dumps(list(pages)).encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.folder_path / f"{key}.json"
+
+    def get(self, key):
+        """Retourne le JSON brut de document_annotation, ou None si absent/expiré"""
+        path = self._path(key)
+        try:
+            if self.max_age and time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                return None
+            annotation = path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        # On rafraîchit la date d'accès pour l'éviction (LRU)
+        os.utime(path, None)
+        return annotation
+
+    def put(self, key, annotation):
+        """Enregistre l'annotation (écriture atomique, sûre entre threads)"""
+        if annotation is None:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(annotation, encoding='utf-8')
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Supprime les entrées trop anciennes puis les moins récentes au-delà de la taille max"""
+        now = time.time()
+        entries = []
+        removed = 0
+        for path in self.folder_path.glob("*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if self.max_age and now - st.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+        if self.max_size:
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+        return removed
@@ -0,0 +1,198 @@
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from run_metrics import RunMetrics
+
+# Codes HTTP pour lesquels un nouvel essai a une chance d'aboutir
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Le délai maximal (par fichier ou global) est dépassé : le fichier reste à retraiter (--resume)"""
+
+
+def error_status(error):
+    """Code HTTP porté par une erreur du SDK Mistral (None pour une erreur réseau)"""
+    return getattr(error, 'status_code', None)
+
+
+def is_retryable(error):
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Erreurs réseau : coupure, délai de connexion (socket ou httpx, utilisé par le SDK)
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__module__.split('.')[0] in ('httpx', 'httpcore')
+
+
+def retry_after(error):
+    """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP), ou None"""
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'raw_response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class OcrScheduler:
+    """Ordonnanceur des appels OCR : retries avec backoff exponentiel et jitter (Retry-After respecté),
+    délais maximaux par fichier et global, concurrence adaptative AIMD et disjoncteur"""
+
+    def __init__(self, concurrency=4, max_concurrency=8, min_concurrency=1, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, file_deadline=600, deadline=None,
+                 breaker_threshold=5, breaker_cooldown=15, breaker_max_cooldown=300,
+                 metrics: RunMetrics = None, sleep=time.sleep, clock=time.monotonic, seed=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(min(max(concurrency, self.min_concurrency), self.max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.file_deadline = file_deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_cooldown = breaker_max_cooldown
+        self.metrics = metrics or RunMetrics()
+        self.sleep = sleep
+        self.clock = clock
+        self.deadline_at = clock() + deadline if deadline else None
+
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 0 : disjoncteur fermé ; sinon ouvert jusqu'à cet instant, puis semi-ouvert
+        self.trips = 0
+        self._probing = False
+        self._latency = None  # Moyenne glissante de la durée d'un appel réussi
+        self._last_decrease = -math.inf
+        self._random = random.Random(seed)
+        self._cond = threading.Condition()
+        self.lowest_limit = self.limit
+
+    def file_deadline_at(self):
+        """Échéance d'un fichier qui commence maintenant (None sans délai par fichier)"""
+        return self.clock() + self.file_deadline if self.file_deadline else None
+
+    def call(self, func, label='', file_deadline_at=None):
+        """Exécute func() en respectant la concurrence autorisée ; réessaie les erreurs transitoires
+
+        file_deadline_at : échéance partagée par tous les appels d'un même fichier (plages de pages,
+        relecture) ; à défaut, l'appel dispose à lui seul du délai par fichier.
+        """
+        if file_deadline_at is None:
+            file_deadline_at = self.file_deadline_at()
+        attempt = 0
+        while True:
+            probe = self._acquire(file_deadline_at, label)
+            start = self.clock()
+            try:
+                result = func()
+            except Exception as e:
+                retryable = is_retryable(e)
+                status = error_status(e)
+                outcome = 'throttled' if status == 429 else 'failed' if retryable else 'rejected'
+                self._release(probe, outcome, self.clock() - start)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                attempt += 1
+                delay = self._backoff(attempt, retry_after(e))
+                deadline = self._earliest(file_deadline_at)
+                if deadline is not None and self.clock() + delay > deadline:
+                    raise DeadlineExceeded(f"{label}: délai maximal atteint après {attempt} essai(s) ({e})") from e
+                self.metrics.incr('ocr_retries')
+                print(f"   ⏳ {label}: {status or type(e).__name__}, nouvel essai dans {delay:.1f} s "
+                      f"({attempt}/{self.max_retries})")
+                self.sleep(delay)
+            else:
+                self._release(probe, 'ok', self.clock() - start)
+                return result
+
+    def _earliest(self, file_deadline_at):
+        deadlines = [d for d in (file_deadline_at, self.deadline_at) if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def _backoff(self, attempt, requested=None):
+        """Backoff exponentiel « full jitter », jamais inférieur au Retry-After demandé"""
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if requested is not None:
+            # Léger jitter pour que les threads en attente ne repartent pas tous ensemble
+            delay = max(delay, requested + self._random.uniform(0, max(0.1, requested * 0.1)))
+        return delay
+
+    def _acquire(self, file_deadline_at, label):
+        """Attend une place dans la fenêtre de concurrence ; retourne True s'il s'agit d'un appel de test"""
+        with self._cond:
+            while True:
+                now = self.clock()
+                deadline = self._earliest(file_deadline_at)
+                if deadline is not None and now >= deadline:
+                    raise DeadlineExceeded(f"{label}: délai maximal atteint avant l'envoi")
+
+                wait = None
+                if now < self.open_until:
+                    wait = self.open_until - now
+                elif not (self.open_until and self._probing) and self.in_flight < max(1, int(self.limit)):
+                    self.in_flight += 1
+                    # Disjoncteur semi-ouvert : un seul appel de test à la fois
+                    probe = bool(self.open_until)
+                    self._probing = self._probing or probe
+                    return probe
+
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def _release(self, probe, outcome, duration):
+        with self._cond:
+            self.in_flight -= 1
+            now = self.clock()
+            if probe:
+                self._probing = False
+
+            if outcome == 'ok':
+                self.consecutive_failures = 0
+                self._latency = duration if self._latency is None else 0.8 * self._latency + 0.2 * duration
+                if self.open_until:
+                    self.open_until = 0.0
+                    self.trips = 0
+                    print("   ✅ API Mistral rétablie, reprise des appels")
+                # Augmentation additive : +1 appel simultané par fenêtre complète réussie
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome == 'throttled':
+                self.metrics.incr('ocr_throttled')
+                # Diminution multiplicative, au plus une fois par durée d'appel (les 429 arrivent en rafale)
+                if now - self._last_decrease >= max(1.0, self._latency or 0):
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+                if probe:
+                    self._trip(now)
+            elif outcome == 'failed':
+                self.metrics.incr('ocr_transient_errors')
+                self.consecutive_failures += 1
+                if probe or (not self.open_until and self.consecutive_failures >= self.breaker_threshold):
+                    self._trip(now)
+
+            self.lowest_limit = min(self.lowest_limit, self.limit)
+            self.metrics.set_gauge('ocr_concurrency_limit', round(self.limit, 2))
+            self.metrics.set_gauge('ocr_concurrency_limit_lowest', round(self.lowest_limit, 2))
+            self._cond.notify_all()
+
+    def _trip(self, now):
+        """Ouvre le disjoncteur : plus aucun appel pendant la pause (doublée à chaque échec du test)"""
+        cooldown = min(self.breaker_max_cooldown, self.breaker_cooldown * 2 ** self.trips)
+        self.trips += 1
+        self.open_until = now + cooldown
+        self.metrics.incr('ocr_circuit_opened')
+        print(f"   🔌 API Mistral indisponible, appels suspendus pendant {cooldown:.0f} s")
@@ -0,0 +1,63 @@
+from io import BytesIO
+
+
+class PdfOptimizer:
+    """Réduit le PDF avant envoi à l'OCR : pages utiles seulement, images scannées sous-échantillonnées"""
+
+    def __init__(self, max_dpi=200, grayscale=False, jpeg_quality=75):
+        self.max_dpi = max_dpi
+        self.grayscale = grayscale
+        self.jpeg_quality = jpeg_quality
+
+    def optimize(self, pdf_bytes, pages=(0,)):
+        """Retourne un PDF ne contenant que les pages demandées (ou l'original s'il est plus petit)"""
+        from pypdf import PdfReader, PdfWriter
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        writer = PdfWriter()
+        for index in pages:
+            if index < len(reader.pages):
+                writer.add_page(reader.pages[index])
+
+        if self.max_dpi or self.grayscale:
+            for page in writer.pages:
+                self._recompress_images(page)
+
+        for page in writer.pages:
+            page.compress_content_streams()
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+        output = BytesIO()
+        writer.write(output)
+        optimized = output.getvalue()
+        return optimized if len(optimized) < len(pdf_bytes) else pdf_bytes
+
+    def _recompress_images(self, page):
+        """Sous-échantillonne les images au-delà de max_dpi (DPI estimé sur la largeur de la page)"""
+        from PIL import Image
+
+        page_width_inches = float(page.mediabox.width) / 72
+        for image_file in page.images:
+            try:
+                image = image_file.image
+                changed = False
+
+                if self.max_dpi and page_width_inches > 0:
+                    dpi = image.width / page_width_inches
+                    if dpi > self.max_dpi:
+                        ratio = self.max_dpi / dpi
+                        size = (max(1, int(image.width * ratio)), max(1, int(image.height * ratio)))
+                        image = image.resize(size, Image.LANCZOS)
+                        changed = True
+
+                if self.grayscale and image.mode not in ('L', '1'):
+                    image = image.convert('L')
+                    changed = True
+
+                if changed:
+                    if image.mode not in ('L', 'RGB'):
+                        image = image.convert('RGB')
+                    image_file.replace(image, quality=self.jpeg_quality)
+            except Exception:
+                # Image non décodable (filtre exotique) : on la laisse telle quelle
+                continue
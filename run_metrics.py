@@ -0,0 +1,124 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+def percentile(values, pct):
+    """Percentile par rang le plus proche (None si aucune valeur)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class RunMetrics:
+    """Mesures d'un lancement (durées par étape, octets, retries, latence par fichier), sûres entre threads"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.stages = defaultdict(float)  # Map: {étape: secondes cumulées, tous threads confondus}
+        self.calls = Counter()            # Map: {étape: nombre de passages}
+        self.counters = Counter()         # octets envoyés, retries, hits de cache...
+        self.gauges = {}                  # Dernière valeur observée (limite de concurrence...)
+        self.file_latencies = {}          # Map: {nom du PDF: secondes}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] += seconds
+            self.calls[name] += 1
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def record_file(self, name, seconds):
+        with self._lock:
+            self.file_latencies[name] = seconds
+
+    def summary(self):
+        latencies = list(self.file_latencies.values())
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self._start, 4),
+            # Les étapes exécutées en parallèle (OCR, génération) se cumulent : leur somme peut dépasser wall_s
+            'stages': {
+                name: {'total_s': round(seconds, 4), 'calls': self.calls[name]}
+                for name, seconds in self.stages.items()
+            },
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'files': {
+                'count': len(latencies),
+                'latency_p50_s': _round(percentile(latencies, 50)),
+                'latency_p90_s': _round(percentile(latencies, 90)),
+                'latency_p99_s': _round(percentile(latencies, 99)),
+                'latency_max_s': _round(max(latencies, default=None)),
+                'per_file_s': {name: round(s, 4) for name, s in sorted(self.file_latencies.items())},
+            },
+        }
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.summary(), indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        return path
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+class SamplingProfiler:
+    """Échantillonne les piles de tous les threads ; écrit le format « collapsed » des flamegraphs"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()  # Map: {pile "f1;f2;f3": nombre d'échantillons}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Index local des établissements SIRENE (fichier stock public de l'INSEE), trié par SIRET.
+
+    python3 sirene_index.py build StockEtablissement_utf8.csv --unites StockUniteLegale_utf8.csv
+    python3 sirene_index.py update delta_etablissements.csv [--unites delta_unites.csv]
+
+Le CSV n'est jamais chargé en mémoire : il est découpé en paquets triés sur disque,
+fusionnés ensuite en un seul passage. L'index (etablissements.idx : SIRET et position,
+16 octets par établissement ; etablissements.dat : champs texte) est ouvert en
+mémoire partagée (mmap) et interrogé par recherche dichotomique.
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from field_validation import CLOSED, CORRECTED, ENRICHED, INVALID, OK, UNKNOWN, check_siret
+from text_normalize import fold
+
+# Incrémenter si le format des fichiers change
+INDEX_VERSION = 1
+
+ENTRY = struct.Struct('<QQ')  # SIRET, position de l'enregistrement dans le .dat
+FIELDS = ('nom', 'enseigne', 'adresse', 'code_postal', 'ville', 'code_nafa', 'etat')
+NOM = FIELDS.index('nom')
+
+
+@dataclass(frozen=True)
+class Etablissement:
+    siret: str
+    nom: str          # Raison sociale (unité légale)
+    enseigne: str     # Enseigne ou dénomination usuelle de l'établissement
+    adresse: str
+    code_postal: str
+    ville: str
+    code_nafa: str    # Activité au répertoire des métiers (NAFA), à défaut code APE
+    etat: str         # A : actif, F : fermé
+
+    @property
+    def raison_sociale(self):
+        return self.nom or self.enseigne
+
+    @property
+    def is_active(self):
+        return self.etat != 'F'
+
+
+def _clean(value):
+    return re.sub(r'[\t\r\n\x1f]+', ' ', str(value or '')).strip()
+
+
+def etablissement_fields(row):
+    """Champs indexés d'une ligne du stock (ou d'un delta) des établissements"""
+    adresse = ' '.join(filter(None, (_clean(row.get(name)) for name in (
+        'numeroVoieEtablissement', 'indiceRepetitionEtablissement',
+        'typeVoieEtablissement', 'libelleVoieEtablissement'))))
+    return ['',
+            _clean(row.get('denominationUsuelleEtablissement') or row.get('enseigne1Etablissement')),
+            adresse,
+            _clean(row.get('codePostalEtablissement')),
+            _clean(row.get('libelleCommuneEtablissement') or row.get('libelleCommuneEtrangerEtablissement')),
+            _clean(row.get('activitePrincipaleRegistreMetiersEtablissement') or row.get('activitePrincipaleEtablissement')),
+            _clean(row.get('etatAdministratifEtablissement'))]
+
+
+def unite_legale_nom(row):
+    """Raison sociale d'une ligne du stock des unités légales (personne morale ou entrepreneur individuel)"""
+    denomination = _clean(row.get('denominationUniteLegale'))
+    if denomination:
+        return denomination
+    nom = _clean(row.get('nomUsageUniteLegale') or row.get('nomUniteLegale'))
+    return ' '.join(filter(None, (_clean(row.get('prenom1UniteLegale')), nom)))
+
+
+def _external_sort(rows, workdir, prefix, chunk_rows):
+    """Trie des lignes (clé, rang, champs) par paquets écrits sur disque ; retourne l'itérateur fusionné"""
+    chunks = []
+    chunk = []
+
+    def flush():
+        chunk.sort(key=lambda row: (row[0], row[1]))
+        path = Path(workdir) / f"{prefix}_{len(chunks)}.tsv"
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(f"{key}\t{rank}\t{chr(31).join(fields)}\n" for key, rank, fields in chunk)
+        chunks.append(path)
+        chunk.clear()
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            flush()
+    if chunk:
+        flush()
+    return heapq.merge(*(_read_chunk(path) for path in chunks), key=lambda row: (row[0], row[1]))
+
+
+def _read_chunk(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            key, rank, fields = line.rstrip('\n').split('\t')
+            yield key, int(rank), fields.split(chr(31))
+
+
+def _read_csv(path, start_rank=0):
+    with open(path, encoding='utf-8', newline='') as f:
+        for rank, row in enumerate(csv.DictReader(f), start_rank):
+            yield row, rank
+
+
+class SireneIndex:
+    """Index SIRENE en lecture (mmap), recherche en O(log n) par SIRET"""
+
+    def __init__(self, folder_path="./sirene"):
+        self.folder_path = Path(folder_path)
+        self.meta = json.loads((self.folder_path / 'meta.json').read_text(encoding='utf-8'))
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Index SIRENE au format {self.meta.get('version')}, à reconstruire (format {INDEX_VERSION})")
+        self.count = self.meta['count']
+        self._idx = self._map(self.folder_path / 'etablissements.idx')
+        self._dat = self._map(self.folder_path / 'etablissements.dat')
+
+    @staticmethod
+    def exists(folder_path):
+        return (Path(folder_path) / 'meta.json').is_file()
+
+    @staticmethod
+    def _map(path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._idx, i * ENTRY.size)
+
+    def _fields(self, i):
+        start = self._entry(i)[1]
+        end = self._entry(i + 1)[1] if i + 1 < self.count else len(self._dat)
+        return self._dat[start:end].decode('utf-8').split('\t')
+
+    def _position(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ENTRY.unpack_from(self._idx, mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, siret):
+        """Établissement du SIRET, ou None s'il est absent de l'index"""
+        siret = re.sub(r'\D', '', str(siret or ''))
+        if len(siret) != 14:
+            return None
+        i = self._position(int(siret))
+        if i >= self.count or self._entry(i)[0] != int(siret):
+            return None
+        return Etablissement(siret, *self._fields(i))
+
+    def __iter__(self):
+        """Établissements dans l'ordre des SIRET"""
+        for i in range(self.count):
+            yield Etablissement(f"{self._entry(i)[0]:014d}", *self._fields(i))
+
+    def suggest(self, siret, nom='', limit=3):
+        """SIRET existants à une faute d'OCR près (chiffre erroné, inversé, manquant ou en trop)
+
+        Les candidats sont classés par proximité de leur raison sociale avec nom.
+        """
+        digits = re.sub(r'\D', '', str(siret or ''))
+        candidates = set()
+        if len(digits) == 14:
+            for i in range(14):
+                candidates.update(digits[:i] + d + digits[i + 1:] for d in '0123456789')
+            candidates.update(digits[:i] + digits[i + 1] + digits[i] + digits[i + 2:] for i in range(13))
+        elif len(digits) == 13:
+            candidates.update(digits[:i] + d + digits[i:] for i in range(14) for d in '0123456789')
+        elif len(digits) == 15:
+            candidates.update(digits[:i] + digits[i + 1:] for i in range(15))
+        candidates.discard(digits)
+
+        # La clé de Luhn écarte l'essentiel des candidats avant toute lecture de l'index
+        found = [etab for etab in map(self.get, filter(check_siret, sorted(candidates))) if etab]
+        target = fold(nom)
+        found.sort(key=lambda etab: (-SequenceMatcher(None, target, fold(etab.raison_sociale)).ratio(), etab.siret))
+        return found[:limit]
+
+    def close(self):
+        for data in (self._idx, self._dat):
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    # --- Construction et mise à jour ---
+
+    @classmethod
+    def build(cls, etablissements_csv, unites_csv=None, folder_path="./sirene", chunk_rows=500_000):
+        """Construit l'index à partir du stock des établissements (et des unités légales pour la raison sociale)"""
+        return cls._write(folder_path, [etablissements_csv], unites_csv, chunk_rows,
+                          source={'etablissements': str(etablissements_csv), 'unites': str(unites_csv or '')})
+
+    def update(self, etablissements_csv, unites_csv=None, chunk_rows=500_000):
+        """Applique un delta (établissements modifiés ou créés) ; retourne le nouvel index"""
+        meta = dict(self.meta)
+        deltas = meta.get('deltas', []) + [{'etablissements': str(etablissements_csv), 'unites': str(unites_csv or ''),
+                                            'applied_at': time.strftime('%Y-%m-%d %H:%M:%S')}]
+        index = self._write(self.folder_path, [etablissements_csv], unites_csv, chunk_rows,
+                            base=self, source=meta.get('source'), deltas=deltas)
+        self.close()
+        return index
+
+    @classmethod
+    def _write(cls, folder_path, csv_paths, unites_csv, chunk_rows, base=None, source=None, deltas=()):
+        folder_path = Path(folder_path)
+        folder_path.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=folder_path, prefix='build_') as workdir:
+            # Établissements : l'index existant (rang 0) puis les lignes des CSV, la dernière version l'emporte
+            def rows():
+                rank = 1
+                for path in csv_paths:
+                    for row, rank in _read_csv(path, rank):
+                        siret = _clean(row.get('siret'))
+                        if re.fullmatch(r'\d{14}', siret):
+                            yield siret, rank, etablissement_fields(row)
+                    rank += 1
+
+            streams = [_external_sort(rows(), workdir, 'etablissements', chunk_rows)]
+            if base is not None:
+                streams.append((etab.siret, 0, [getattr(etab, name) for name in FIELDS]) for etab in base)
+            records = heapq.merge(*streams, key=lambda row: (row[0], row[1]))
+
+            unites = iter(())
+            if unites_csv:
+                unites = _external_sort(
+                    ((_clean(row.get('siren')), rank, [unite_legale_nom(row)])
+                     for row, rank in _read_csv(unites_csv) if re.fullmatch(r'\d{9}', _clean(row.get('siren')))),
+                    workdir, 'unites', chunk_rows)
+
+            idx_tmp = folder_path / 'etablissements.idx.tmp'
+            dat_tmp = folder_path / 'etablissements.dat.tmp'
+            with open(idx_tmp, 'wb') as idx, open(dat_tmp, 'wb') as dat:
+                count = cls._write_records(records, unites, idx, dat)
+
+        meta = {'version': INDEX_VERSION, 'count': count, 'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'source': source, 'deltas': list(deltas)}
+        meta_tmp = folder_path / 'meta.json.tmp'
+        meta_tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(idx_tmp, folder_path / 'etablissements.idx')
+        os.replace(dat_tmp, folder_path / 'etablissements.dat')
+        os.replace(meta_tmp, folder_path / 'meta.json')
+        return cls(folder_path)
+
+    @staticmethod
+    def _write_records(records, unites, idx, dat):
+        """Écrit les établissements triés, une seule version par SIRET, avec la raison sociale de l'unité légale"""
+        unite = next(unites, None)
+        count = position = 0
+        last = None         # (siret, champs) en attente : une version plus récente peut suivre
+        previous = ('', '')  # (siren, raison sociale) du dernier établissement écrit
+
+        def emit(siret, fields):
+            nonlocal unite, count, position, previous
+            siren = siret[:9]
+            while unite is not None and unite[0] < siren:
+                unite = next(unites, None)
+            if unite is not None and unite[0] == siren:
+                fields[NOM] = unite[2][0]
+            elif not fields[NOM] and previous[0] == siren:
+                # Nouvel établissement d'une entreprise déjà indexée
+                fields[NOM] = previous[1]
+            data = '\t'.join(fields).encode('utf-8')
+            idx.write(ENTRY.pack(int(siret), position))
+            dat.write(data)
+            position += len(data)
+            count += 1
+            previous = (siren, fields[NOM])
+
+        for siret, _, fields in records:
+            if last is not None and last[0] == siret:
+                # Un delta sans unités légales garde la raison sociale connue
+                if not fields[NOM]:
+                    fields[NOM] = last[1][NOM]
+                last = (siret, fields)
+                continue
+            if last is not None:
+                emit(*last)
+            last = (siret, fields)
+        if last is not None:
+            emit(*last)
+        return count
+
+
+def enrich_entreprise(entreprise, index):
+    """Vérifie le SIRET de l'entreprise dans l'index et complète ses champs vides ou invalides
+
+    Retourne l'établissement trouvé. Sinon, le SIRET est marqué inconnu (ou reste invalide),
+    avec le SIRET existant le plus proche en suggestion ; il n'est jamais remplacé d'office.
+    """
+    if not entreprise.siret:
+        return None
+    statut = entreprise.statuts.get('siret', OK)
+    etab = index.get(entreprise.siret) if statut in (OK, CORRECTED) else None
+    if etab is None:
+        statut = UNKNOWN if statut in (OK, CORRECTED) else statut
+        suggestions = index.suggest(entreprise.siret, entreprise.nom, limit=1)
+        if suggestions:
+            statut = f"{statut}, SIRENE suggère {suggestions[0].siret}"
+        entreprise.statuts['siret'] = statut
+        return None
+
+    if not etab.is_active:
+        entreprise.statuts['siret'] = CLOSED
+    for name, value in (('nom', etab.raison_sociale), ('adresse', etab.adresse), ('code_postal', etab.code_postal),
+                        ('ville', etab.ville), ('code_nafa', etab.code_nafa)):
+        if value and (not str(getattr(entreprise, name) or '').strip() or entreprise.statuts.get(name) == INVALID):
+            setattr(entreprise, name, value)
+            entreprise.statuts[name] = ENRICHED
+    return etab
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit ou met à jour l'index SIRENE local")
+    parser.add_argument('action', choices=['build', 'update'])
+    parser.add_argument('etablissements', help='Stock (build) ou delta (update) des établissements, CSV INSEE')
+    parser.add_argument('--unites', help='Stock (ou delta) des unités légales, pour la raison sociale')
+    parser.add_argument('--index', default='./sirene', help='Dossier de l\'index')
+    parser.add_argument('--chunk-rows', type=int, default=500_000, help='Lignes triées en mémoire par paquet')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.action == 'build':
+        index = SireneIndex.build(args.etablissements, args.unites, args.index, args.chunk_rows)
+    else:
+        if not SireneIndex.exists(args.index):
+            print(f"❌ Erreur: aucun index SIRENE dans {args.index} (lancer d'abord build)")
+            sys.exit(1)
+        index = SireneIndex(args.index).update(args.etablissements, args.unites, args.chunk_rows)
+    print(f"✅ Index SIRENE: {len(index)} établissement(s) dans {args.index} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
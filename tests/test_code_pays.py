@@ -0,0 +1,71 @@
+"""Codes pays : onglet Pays du template (colonnes repérées par leur en-tête), alias, codes ISO et table compilée"""
+
+import sys
+from pathlib import Path
+
+import openpyxl
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ammon_code_pays import PaysCode  # noqa: E402
+
+
+def template(tmp_path, header, rows):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.title = 'Pays'
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    path = tmp_path / 'template.xlsx'
+    wb.save(path)
+    return path
+
+
+def test_columns_are_found_by_header(tmp_path):
+    # Code avant libellé : les colonnes ne sont pas lues dans l'ordre par défaut
+    path = template(tmp_path, ['PAY_CCODE', 'PAY_CNOM'], [('BEL', 'Belgique'), ('DEU', 'Allemagne')])
+    pays = PaysCode(path, cache_path=None)
+    assert pays.get_pays_code('Belgique') == 'BEL'
+    assert pays.get_pays_code('  allemagne ') == 'DEU'
+    assert pays.get_pays_code('BEL') == 'BEL'
+    assert 'BELGIQUE' not in pays.pays_codes.values()
+
+
+def test_default_columns_without_header(tmp_path):
+    path = template(tmp_path, ['Libellé', 'Code'], [('Belgique', 'BEL')])
+    assert PaysCode(path, cache_path=None).get_pays_code('Belgique') == 'BEL'
+
+
+def test_aliases_and_iso_codes_of_known_countries(tmp_path):
+    path = template(tmp_path, ['PAY_CNOM', 'PAY_CCODE'], [('Belgique', 'BEL'), ('Royaume-Uni', 'GBR')])
+    pays = PaysCode(path, cache_path=None)
+    assert pays.get_pays_code('be') == 'BEL'
+    assert pays.get_pays_code('Belge') == 'BEL'
+    assert pays.get_pays_code('Angleterre') == 'GBR'
+    # Alias d'un pays absent du template : non retenu
+    assert pays.get_pays_code('Suisse') == 'FRA'
+
+
+def test_defaults_to_france():
+    pays = PaysCode(None, cache_path=None)
+    assert pays.get_pays_code('') == 'FRA'
+    assert pays.get_pays_code(None) == 'FRA'
+    assert pays.get_pays_code('Atlantide') == 'FRA'
+    # Sans template, alias et codes ISO restent disponibles
+    assert pays.get_pays_code('Suisse') == 'CHE'
+
+
+def test_compiled_table_is_reused_until_template_changes(tmp_path):
+    path = template(tmp_path, ['PAY_CNOM', 'PAY_CCODE'], [('Belgique', 'BEL')])
+    cache = tmp_path / 'cache' / 'pays_codes.json'
+    assert PaysCode(path, cache).get_pays_code('Belgique') == 'BEL'
+    assert cache.exists()
+
+    # Table compilée lue telle quelle tant que le template n'a pas changé
+    cache.write_text(cache.read_text(encoding='utf-8').replace('"BEL"', '"XXX"'), encoding='utf-8')
+    assert PaysCode(path, cache).get_pays_code('Belgique') == 'XXX'
+
+    path = template(tmp_path, ['PAY_CNOM', 'PAY_CCODE'], [('Belgique', 'BEL'), ('Italie', 'ITA')])
+    pays = PaysCode(path, cache)
+    assert (pays.get_pays_code('Belgique'), pays.get_pays_code('Italie')) == ('BEL', 'ITA')
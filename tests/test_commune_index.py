@@ -0,0 +1,81 @@
+"""Normalisation code postal / ville : corrections, codes CEDEX, adresses étrangères, memo partagé entre threads"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from commune_index import CommuneIndex, commune_key  # noqa: E402
+from field_validation import CORRECTED, ENRICHED, INVALID, UNKNOWN  # noqa: E402
+
+ROWS = [
+    ('75008', 'PARIS 08', 'PARIS', ''),
+    ('75002', 'PARIS 02', 'PARIS', ''),
+    ('44000', 'NANTES', 'NANTES', ''),
+    ('44100', 'NANTES', 'NANTES', ''),
+    ('69001', 'LYON 01', 'LYON', ''),
+    ('42000', 'SAINT ETIENNE', 'ST ETIENNE', ''),
+    ('13780', 'CUGES LES PINS', 'CUGES LES PINS', ''),
+]
+
+
+def index():
+    return CommuneIndex(ROWS)
+
+
+def test_commune_key():
+    assert commune_key('Saint-Étienne CEDEX 2') == 'ST ETIENNE'
+    assert commune_key('Paris CS 12345') == 'PARIS'
+
+
+def test_known_address_is_rewritten_without_status():
+    assert index().normalize('75 008', 'paris', 'France') == ('75008', 'PARIS', {})
+
+
+def test_misspelled_city_is_corrected():
+    assert index().normalize('13780', 'Cuges les Pims', 'France') == ('13780', 'CUGES LES PINS', {'ville': CORRECTED})
+
+
+def test_missing_city_is_enriched():
+    assert index().normalize('69001', '', '') == ('69001', 'LYON', {'ville': ENRICHED})
+
+
+def test_unknown_city():
+    assert index().normalize('99999', 'Atlantide', 'France') == ('99999', 'Atlantide', {'ville': UNKNOWN})
+
+
+def test_geographic_postcode_drops_cedex_mention():
+    assert index().normalize('75008', 'Paris Cedex 08', 'France') == ('75008', 'PARIS', {})
+
+
+def test_cedex_postcode_keeps_cedex_mention():
+    # 75385 est un code CEDEX, absent de la base : il n'est pas pris pour une faute d'OCR
+    assert index().normalize('75385', 'Paris Cedex 08', 'France') == ('75385', 'PARIS CEDEX 08', {})
+    assert index().normalize('42009', 'St Etienne Cedex 2', 'France') == ('42009', 'ST ETIENNE CEDEX 2', {})
+
+
+def test_one_digit_postcode_error_is_corrected_without_cedex():
+    assert index().normalize('42001', 'Saint-Etienne', 'France') == ('42000', 'ST ETIENNE', {'code_postal': CORRECTED})
+    assert index().normalize('44001', 'Nantes', 'France') == ('44000', 'NANTES', {'code_postal': CORRECTED})
+    # 44000 et 44100 sont tous deux à un chiffre près : ambigu, laissé tel quel
+    assert index().normalize('44200', 'Nantes', 'France') == ('44200', 'NANTES', {})
+
+
+def test_postcode_of_another_commune_is_invalid():
+    # Code postal laissé tel quel, la ville prend le libellé de la Poste
+    assert index().normalize('69001', 'Saint Etienne', 'France') == ('69001', 'ST ETIENNE', {'code_postal': INVALID})
+
+
+def test_foreign_address_is_left_alone():
+    assert index().normalize('1000', 'Bruxelles', 'Belgique') is None
+
+
+def test_memo_is_safe_across_threads():
+    communes = index()
+    communes.MAX_MEMO = 3
+    addresses = [(cp, ville, 'France') for cp, ville, *_ in ROWS] * 50
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda address: communes.normalize(*address), addresses))
+    assert results == [index().normalize(*address) for address in addresses]
+    assert len(communes._memo) <= 3
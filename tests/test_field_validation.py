@@ -0,0 +1,55 @@
+"""Contrôles des champs extraits : SIRET (Luhn, exception La Poste), dates, codes postaux"""
+
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from field_validation import (check_code_postal, check_date, check_date_entree, check_siret,  # noqa: E402
+                              luhn_valid)
+
+
+def test_siret_luhn():
+    assert check_siret('73282932000074') == '73282932000074'
+    assert check_siret('732 829 320 00074') == '73282932000074'
+    assert check_siret('73282932000075') is None
+    assert check_siret('7328293200007') is None
+    assert check_siret('7328293200007A') is None
+
+
+def test_siret_la_poste_uses_sum_of_digits():
+    # Somme des chiffres multiple de 5, alors que la clé de Luhn est fausse
+    assert not luhn_valid('35600000000001')
+    assert check_siret('35600000000001') == '35600000000001'
+    assert check_siret('35600000000002') is None
+
+
+def test_dates_are_normalized():
+    assert check_date('1/2/2005') == '01/02/2005'
+    assert check_date('01.02.2005') == '01/02/2005'
+    assert check_date('01 - 02 - 2005') == '01/02/2005'
+    assert check_date('2005-02-01') == '01/02/2005'
+    assert check_date('31/02/2005') is None
+    assert check_date('31/12/1899') is None
+
+
+def test_birth_date_cannot_be_in_the_future():
+    tomorrow = (date.today() + timedelta(days=1)).strftime('%d/%m/%Y')
+    assert check_date(tomorrow) is None
+
+
+def test_entry_date_may_be_up_to_three_years_ahead():
+    next_year = (date.today() + timedelta(days=365)).strftime('%d/%m/%Y')
+    assert check_date_entree(next_year) == next_year
+    assert check_date_entree((date.today() + timedelta(days=4 * 366)).strftime('%d/%m/%Y')) is None
+
+
+def test_postcodes():
+    assert check_code_postal('75 001', 'France') == '75001'
+    assert check_code_postal('75001', 'fr') == '75001'
+    assert check_code_postal('75001', '') == '75001'
+    assert check_code_postal('7500', 'France') is None
+    assert check_code_postal('750011', 'France') is None
+    # À l'étranger, le code postal est laissé tel quel
+    assert check_code_postal(' B-1000 ', 'Belgique') == 'B-1000'
@@ -0,0 +1,98 @@
+"""Lots découpés en shards : répartition stable des PDFs et fusion des journaux indépendante de leur ordre"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ammon_person_matcher import NEW  # noqa: E402
+from batch_journal import BatchJournal  # noqa: E402
+from batch_processing import merge_journals, select_shard, shard_of  # noqa: E402
+
+PDFS = [f"bulletin_{i:03d}.pdf" for i in range(40)]
+
+
+def annotation(nom, prenom='Julie'):
+    return json.dumps({"nom de l'entreprise": 'Boulangerie Dupont', "N° de SIRET": '73282932000074',
+                       "Nom du stagiaire": nom, "Prénom du stagiaire": prenom, "Date de naissance": '01/02/2005'})
+
+
+def write_journals(tmp_path, pdfs, count, name='shard'):
+    """Un journal par shard, comme le ferait --shard i/count sur autant de machines"""
+    paths = []
+    for index in range(count):
+        journal = BatchJournal(tmp_path / f"{name}_{index}.jsonl")
+        for pdf in select_shard(pdfs, index, count):
+            journal.record_success(pdf, annotation(Path(pdf).stem.upper()), method='ocr')
+        paths.append(journal.path)
+    return paths
+
+
+def summary(results):
+    return [(r.pdf_file.name, str(r.error) if r.error else None,
+             [(d.inscription.stagiaire.nom, d.inscription.entreprise.siret) for d in r.decisions]) for r in results]
+
+
+def test_shard_depends_on_file_name_only():
+    assert shard_of('a/bulletin_001.pdf', 4) == shard_of('/autre/machine/bulletin_001.pdf', 4)
+    assert all(0 <= shard_of(pdf, 3) < 3 for pdf in PDFS)
+
+
+def test_select_shard_partitions_the_batch():
+    shards = [select_shard(PDFS, index, 3) for index in range(3)]
+    assert sorted(pdf for shard in shards for pdf in shard) == sorted(PDFS)
+    assert all(shards)
+
+
+def test_merge_is_independent_of_journal_order_and_shard_count(tmp_path):
+    pdfs = [str(tmp_path / pdf) for pdf in PDFS]
+    three = write_journals(tmp_path, pdfs, 3)
+    expected = summary(merge_journals(three))
+    assert [name for name, _, _ in expected] == sorted(PDFS)
+
+    assert summary(merge_journals(list(reversed(three)))) == expected
+    assert summary(merge_journals(write_journals(tmp_path, pdfs, 5, name='autre'))) == expected
+
+
+def test_last_successful_journal_wins(tmp_path):
+    pdf = tmp_path / 'bulletin.pdf'
+    first = BatchJournal(tmp_path / 'a.jsonl')
+    first.record_success(pdf, annotation('DURAND'))
+    second = BatchJournal(tmp_path / 'b.jsonl')
+    second.record_success(pdf, annotation('MARTIN'))
+    failed = BatchJournal(tmp_path / 'c.jsonl')
+    failed.record_error(pdf, 'HTTP 503')
+    failed.record_error(tmp_path / 'illisible.pdf', 'HTTP 503')
+
+    results = summary(merge_journals([failed.path, second.path, first.path]))
+    assert results == [('bulletin.pdf', None, [('MARTIN', '73282932000074')]),
+                       ('illisible.pdf', 'HTTP 503', [])]
+
+
+class Existants:
+    """Existants minimaux : recherches groupées, comptées"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_existing_entreprise_refs(self, sirets):
+        self.calls += 1
+        return {siret: 'ENT1' for siret in sirets}
+
+    def get_existing_personne_refs(self, pairs):
+        self.calls += 1
+        return {pair: 'PER1' for pair in pairs if pair[0] == 'BULLETIN_001'}
+
+    def match_personne(self, nom, prenom):
+        return NEW, None
+
+
+def test_existants_are_looked_up_once_for_the_whole_batch(tmp_path):
+    existants = Existants()
+    results = list(merge_journals(write_journals(tmp_path, [str(tmp_path / pdf) for pdf in PDFS], 3), existants))
+    assert existants.calls == 2
+    decisions = {r.pdf_file.name: r.decisions[0] for r in results}
+    assert all(d.entreprise_ref == 'ENT1' and not d.new_entreprise for d in decisions.values())
+    assert decisions['bulletin_001.pdf'].personne_ref == 'PER1'
+    assert decisions['bulletin_002.pdf'].new_personne
@@ -0,0 +1,131 @@
+"""Ordonnanceur OCR : retries, Retry-After, concurrence AIMD, disjoncteur et délais (horloge simulée)"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_scheduler import DeadlineExceeded, OcrScheduler  # noqa: E402
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def scheduler(clock, **options):
+    options.setdefault('file_deadline', None)
+    return OcrScheduler(sleep=clock.sleep, clock=clock, seed=1, **options)
+
+
+def failing(*errors, result='ok'):
+    """Fonction qui lève les erreurs données, une par appel, puis rend result"""
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return call
+
+
+def test_transient_errors_are_retried():
+    clock = FakeClock()
+    s = scheduler(clock)
+    assert s.call(failing(ApiError(503), ConnectionError())) == 'ok'
+    assert len(clock.sleeps) == 2
+    assert s.metrics.counters['ocr_retries'] == 2
+
+
+def test_retry_after_is_honoured():
+    clock = FakeClock()
+    s = scheduler(clock)
+    s.call(failing(ApiError(429, {'retry-after': '7'})))
+    assert clock.sleeps[0] >= 7
+
+
+def test_client_errors_are_not_retried():
+    clock = FakeClock()
+    s = scheduler(clock)
+    with pytest.raises(ApiError):
+        s.call(failing(ApiError(400)))
+    assert clock.sleeps == []
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    s = scheduler(clock, max_retries=2)
+    with pytest.raises(ApiError):
+        s.call(failing(*[ApiError(503)] * 5))
+    assert len(clock.sleeps) == 2
+
+
+def test_aimd_grows_on_success_and_halves_on_throttling():
+    clock = FakeClock()
+    s = scheduler(clock, concurrency=4, max_concurrency=8)
+    for _ in range(20):
+        s.call(failing())
+    assert 4 < s.limit <= 8
+
+    s = scheduler(clock, concurrency=8, max_concurrency=8)
+    s.call(failing(ApiError(429)))
+    assert s.lowest_limit == 4.0
+    assert s.metrics.counters['ocr_throttled'] == 1
+
+
+def test_concurrency_never_exceeds_max_concurrency():
+    clock = FakeClock()
+    s = scheduler(clock, concurrency=4, max_concurrency=4)
+    for _ in range(50):
+        s.call(failing())
+    assert s.limit == 4
+
+
+def test_breaker_opens_after_repeated_failures_and_closes_after_probe():
+    clock = FakeClock()
+    s = scheduler(clock, max_retries=0, breaker_threshold=3, breaker_cooldown=15)
+    for _ in range(3):
+        with pytest.raises(ApiError):
+            s.call(failing(ApiError(503)))
+    assert s.open_until == clock.now + 15
+    assert s.metrics.counters['ocr_circuit_opened'] == 1
+
+    clock.now = s.open_until
+    assert s.call(failing()) == 'ok'
+    assert s.open_until == 0.0 and s.trips == 0
+
+
+def test_retry_past_the_file_deadline_is_abandoned():
+    clock = FakeClock()
+    s = scheduler(clock, file_deadline=10)
+    with pytest.raises(DeadlineExceeded):
+        s.call(failing(ApiError(429, {'retry-after': '20'})))
+
+
+def test_file_deadline_is_shared_between_calls():
+    clock = FakeClock()
+    s = scheduler(clock, file_deadline=600)
+    deadline = s.file_deadline_at()
+    assert s.call(failing(), file_deadline_at=deadline) == 'ok'
+    clock.now = 601
+    with pytest.raises(DeadlineExceeded):
+        s.call(failing(), file_deadline_at=deadline)
+    # Sans échéance transmise, l'appel dispose de son propre délai
+    assert s.call(failing()) == 'ok'
@@ -0,0 +1,124 @@
+"""Index SIRENE : construction par paquets, recherche, mise à jour par delta, suggestions et enrichissement"""
+
+import csv
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from field_validation import CLOSED, ENRICHED, OK, UNKNOWN, luhn_valid  # noqa: E402
+from sirene_index import SireneIndex, enrich_entreprise  # noqa: E402
+
+ETAB_COLUMNS = ['siren', 'nic', 'siret', 'activitePrincipaleRegistreMetiersEtablissement', 'numeroVoieEtablissement',
+                'indiceRepetitionEtablissement', 'typeVoieEtablissement', 'libelleVoieEtablissement',
+                'codePostalEtablissement', 'libelleCommuneEtablissement', 'enseigne1Etablissement',
+                'denominationUsuelleEtablissement', 'etatAdministratifEtablissement', 'activitePrincipaleEtablissement']
+
+
+def siret(siren, nic):
+    """SIRET dont le dernier chiffre rend la clé de Luhn correcte"""
+    prefix = f"{siren}{nic}"
+    return next(prefix + d for d in '0123456789' if luhn_valid(prefix + d))
+
+
+BOULANGERIE = siret('123456789', '0001')
+SECOND = siret('123456789', '0002')
+ARTISAN = siret('987654321', '0001')
+
+
+def etablissement(number, rue, code_postal, ville, etat='A', nafa='1071CZ'):
+    return {'siren': number[:9], 'nic': number[9:], 'siret': number, 'numeroVoieEtablissement': '1',
+            'typeVoieEtablissement': 'RUE', 'libelleVoieEtablissement': rue, 'codePostalEtablissement': code_postal,
+            'libelleCommuneEtablissement': ville, 'etatAdministratifEtablissement': etat,
+            'activitePrincipaleRegistreMetiersEtablissement': nafa, 'activitePrincipaleEtablissement': '10.71C'}
+
+
+def write_csv(path, columns, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def build(tmp_path):
+    etabs = write_csv(tmp_path / 'etab.csv', ETAB_COLUMNS, [
+        etablissement(ARTISAN, 'DES LILAS', '69001', 'LYON'),
+        etablissement(SECOND, 'DU PORT', '44000', 'NANTES', etat='F'),
+        etablissement(BOULANGERIE, 'DE LA PAIX', '75002', 'PARIS'),
+    ])
+    unites = write_csv(tmp_path / 'unites.csv', ['siren', 'denominationUniteLegale', 'nomUniteLegale',
+                                                  'prenom1UniteLegale', 'nomUsageUniteLegale'], [
+        {'siren': '123456789', 'denominationUniteLegale': 'BOULANGERIE DUPONT'},
+        {'siren': '987654321', 'nomUniteLegale': 'MARTIN', 'prenom1UniteLegale': 'JULIE'},
+    ])
+    # Paquets de 2 lignes : le tri externe fusionne plusieurs fichiers
+    return SireneIndex.build(etabs, unites, folder_path=tmp_path / 'sirene', chunk_rows=2)
+
+
+def test_build_and_lookup(tmp_path):
+    index = build(tmp_path)
+    assert len(index) == 3
+    assert [etab.siret for etab in index] == sorted([BOULANGERIE, SECOND, ARTISAN])
+
+    etab = index.get(BOULANGERIE)
+    assert (etab.nom, etab.adresse, etab.code_postal, etab.ville, etab.code_nafa) == \
+        ('BOULANGERIE DUPONT', '1 RUE DE LA PAIX', '75002', 'PARIS', '1071CZ')
+    assert index.get(ARTISAN).nom == 'JULIE MARTIN'
+    assert not index.get(SECOND).is_active
+    assert index.get(f"{BOULANGERIE[:3]} {BOULANGERIE[3:]}") == etab
+    assert index.get(siret('111111111', '0001')) is None
+    index.close()
+
+
+def test_update_applies_delta_and_keeps_names(tmp_path):
+    index = build(tmp_path)
+    created = siret('123456789', '0003')
+    delta = write_csv(tmp_path / 'delta.csv', ETAB_COLUMNS, [
+        etablissement(BOULANGERIE, 'NOUVELLE', '75003', 'PARIS'),
+        etablissement(created, 'DU MARCHE', '75004', 'PARIS'),
+    ])
+    index = index.update(delta)
+    assert len(index) == 4
+    assert index.get(BOULANGERIE).adresse == '1 RUE NOUVELLE'
+    # Sans unités légales dans le delta, la raison sociale connue est conservée
+    assert index.get(BOULANGERIE).nom == 'BOULANGERIE DUPONT'
+    assert index.get(created).nom == 'BOULANGERIE DUPONT'
+    assert len(index.meta['deltas']) == 1
+    index.close()
+
+
+def test_suggest_one_digit_ocr_errors(tmp_path):
+    index = build(tmp_path)
+    swapped = BOULANGERIE[:5] + BOULANGERIE[6] + BOULANGERIE[5] + BOULANGERIE[7:]
+    assert BOULANGERIE in [etab.siret for etab in index.suggest(swapped, 'Boulangerie Dupont')]
+    assert BOULANGERIE in [etab.siret for etab in index.suggest(BOULANGERIE[:-1], 'Boulangerie Dupont')]
+    index.close()
+
+
+class Fiche:
+    def __init__(self, siret, **values):
+        self.siret = siret
+        self.nom = values.get('nom', '')
+        self.adresse = values.get('adresse', '')
+        self.code_postal = values.get('code_postal', '')
+        self.ville = values.get('ville', '')
+        self.code_nafa = values.get('code_nafa', '')
+        self.statuts = {'siret': OK}
+
+
+def test_enrich_fills_missing_fields_only(tmp_path):
+    index = build(tmp_path)
+    fiche = Fiche(BOULANGERIE, ville='Paris 2e')
+    enrich_entreprise(fiche, index)
+    assert (fiche.nom, fiche.code_postal, fiche.ville) == ('BOULANGERIE DUPONT', '75002', 'Paris 2e')
+    assert fiche.statuts['nom'] == ENRICHED and 'ville' not in fiche.statuts
+
+    closed = Fiche(SECOND)
+    enrich_entreprise(closed, index)
+    assert closed.statuts['siret'] == CLOSED
+
+    unknown = Fiche(siret('111111111', '0001'))
+    assert enrich_entreprise(unknown, index) is None
+    assert unknown.statuts['siret'].startswith(UNKNOWN)
+    index.close()
@@ -0,0 +1,68 @@
+"""--stream doit produire les mêmes lignes d'import que la génération en fin de lot"""
+
+import sys
+from argparse import Namespace
+from concurrent.futures import Future
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ammon_code_pays import PaysCode  # noqa: E402
+from batch_processing import BatchResult, check_inscription  # noqa: E402
+from main import StreamingImports, generate_imports  # noqa: E402
+from models import Entreprise, Inscription, Stagiaire  # noqa: E402
+from run_metrics import RunMetrics  # noqa: E402
+
+SIRET = '73282932000074'
+TEMPLATE = Path(__file__).resolve().parent.parent / 'Template_Import_Entreprises.xlsx'
+
+
+class NoExistants:
+    def record_generated_file(self, path):
+        pass
+
+
+def inscription(entreprise_nom, nom, prenom):
+    entreprise = Entreprise(entreprise_nom, '1 rue de la Paix', '75002', 'Paris', 'France', SIRET,
+                            '1071CZ', '0102030405', 'contact@acme.fr', '01/09/2024', date_ref='20240901')
+    stagiaire = Stagiaire('M.', nom, prenom, '2 rue des Lilas', '75011', 'Paris', 'France',
+                          '0601020304', f'{prenom.lower()}@mail.fr', '01/01/2005', date_ref='20240901')
+    return Inscription(entreprise, stagiaire)
+
+
+def decisions():
+    # Le premier bulletin n'a pas de raison sociale : l'entreprise n'est pas générée, seul le stagiaire l'est
+    return [check_inscription('a.pdf', inscription('', 'DURAND', 'Paul')),
+            check_inscription('b.pdf', inscription('ACME', 'MARTIN', 'Julie'))]
+
+
+def read_rows(folder):
+    return {path.name.split('_')[1]: path.read_text(encoding='cp1252').splitlines()
+            for path in sorted(Path(folder).glob('Import_*.csv'))}
+
+
+def test_stream_matches_batch_when_company_first_seen_incomplete(tmp_path):
+    args = Namespace(format='csv', quiet=True, stream=False)
+    pays_code = PaysCode(template_path=str(TEMPLATE), cache_path=None)
+
+    batch_dir = tmp_path / 'batch'
+    batch_dir.mkdir()
+    result = BatchResult()
+    for decision in decisions():
+        result.add_decision(decision)
+    generate_imports(result, batch_dir, 'ts', pays_code, NoExistants(), args, RunMetrics())
+
+    stream_dir = tmp_path / 'stream'
+    stream_dir.mkdir()
+    future = Future()
+    future.set_result(pays_code)
+    sink = StreamingImports(stream_dir, 'ts', future, args, RunMetrics())
+    for decision in decisions():
+        sink.add([decision.inscription] if decision.new_entreprise else [],
+                 [decision.inscription] if decision.new_personne else [])
+    sink.close(NoExistants())
+
+    batch_rows, stream_rows = read_rows(batch_dir), read_rows(stream_dir)
+    assert len(batch_rows['Entreprise']) == 2  # En-tête + ACME
+    assert 'ACME' in batch_rows['Entreprise'][1]
+    assert stream_rows == batch_rows
@@ -0,0 +1,50 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def fold(text) -> str:
+    """Majuscules sans accents, ponctuation (tirets, apostrophes, virgules) remplacée par des espaces"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).upper()
+    return re.sub(r'[^A-Z0-9]+', ' ', text).strip()
+
+
+# Lettres sans décomposition Unicode vers l'ASCII
+TRANSLITERATIONS = {'Ł': 'L', 'ł': 'l', 'Đ': 'D', 'đ': 'd', 'ı': 'i', 'Ħ': 'H', 'ħ': 'h'}
+
+
+def to_charset(text, encoding) -> str:
+    """Texte représentable dans encoding : les caractères absents perdent leurs signes diacritiques
+
+    Lève ValueError si un caractère n'a aucun équivalent (idéogrammes...).
+    """
+    try:
+        text.encode(encoding)
+        return text
+    except UnicodeEncodeError:
+        pass
+    chars = []
+    for c in text:
+        try:
+            c.encode(encoding)
+            chars.append(c)
+            continue
+        except UnicodeEncodeError:
+            pass
+        plain = TRANSLITERATIONS.get(c) or ''.join(d for d in unicodedata.normalize('NFKD', c)
+                                                   if not unicodedata.combining(d))
+        try:
+            plain.encode(encoding)
+        except UnicodeEncodeError:
+            plain = ''
+        if not plain:
+            raise ValueError(f"caractère {c!r} sans équivalent en {encoding} dans {text!r}")
+        chars.append(plain)
+    return ''.join(chars)
+
+
+def compact(text) -> str:
+    """Version repliée sans aucun espace, pour les clés de recherche"""
+    return fold(text).replace(' ', '')